@@ -0,0 +1,269 @@
+"""
+Admission control for LLM-bound chat requests.
+
+Every chat request may run the agent (LLM calls, tools). Without a limit a
+traffic burst sends all of them to OpenAI at once, we hit rate limits and
+latency explodes for everyone. The controller admits at most
+ADMISSION_MAX_IN_FLIGHT requests per worker and ADMISSION_MAX_PER_UUID per
+conversation; the rest wait in a bounded priority queue:
+
+    stream (a user is watching) > invoke > batch
+
+When the queue is full, a new request evicts the newest lowest-priority
+waiter if that waiter has a lower priority than itself, otherwise it is
+rejected at once. A waiter not admitted within ADMISSION_QUEUE_TIMEOUT_SECONDS
+is shed as well. The API answers rejected requests with 429 and a
+Retry-After estimated from recent hold times, so admitted requests keep
+their latency instead of everyone getting slower.
+
+In-flight requests, queue depth, wait time and rejections are exported in
+/metrics (chatbot_admission_*).
+"""
+from contextlib import asynccontextmanager, nullcontext
+from collections import Counter
+from dotenv import load_dotenv
+from typing import Optional
+import structlog
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+
+from metrics import ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_DEPTH, ADMISSION_WAIT_SECONDS, ADMISSION_REJECTIONS
+
+logger = structlog.get_logger()
+load_dotenv()
+
+ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "16"))
+ADMISSION_MAX_PER_UUID = int(os.getenv("ADMISSION_MAX_PER_UUID", "2"))
+ADMISSION_QUEUE_SIZE = int(os.getenv("ADMISSION_QUEUE_SIZE", "64"))
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "5"))
+
+# Lower value = admitted first
+PRIORITIES = {"stream": 0, "invoke": 1, "batch": 2}
+# Weight of the newest hold time in the moving average used for Retry-After
+HOLD_SMOOTHING = 0.1
+
+
+class AdmissionRejected(Exception):
+    """
+    A request was not admitted.
+
+    Args:
+        reason: per_uuid / queue_full / evicted / timeout
+        retry_after: Suggested wait before retrying, in seconds
+    """
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"request not admitted ({reason}), retry after {retry_after} s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Ticket:
+    """The slot of an admitted request; release() is idempotent."""
+
+    def __init__(self, controller: "AdmissionController", uuid: str):
+        self._controller = controller
+        self.uuid = uuid
+        self.start = time.perf_counter()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self._controller._release(self)
+
+
+class AdmissionController:
+    """
+    Global and per-uuid caps on in-flight requests with a bounded priority wait queue.
+
+    Args:
+        max_in_flight: Requests running at the same time
+        max_per_uuid: Requests of one conversation running or waiting at the same time
+        queue_size: Requests waiting for a slot
+        queue_timeout: Seconds a request may wait before it is shed
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+        max_per_uuid: int = ADMISSION_MAX_PER_UUID,
+        queue_size: int = ADMISSION_QUEUE_SIZE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_per_uuid = max_per_uuid
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._per_uuid = Counter()
+        # Heap of [priority, sequence, future, uuid, kind]; equal priorities are first come, first served
+        self._waiters = []
+        self._queued = Counter()
+        self._sequence = itertools.count()
+        self._hold_seconds = 1.0
+        self._stats = Counter()
+
+    # ---------- accounting ----------
+    def _set_in_flight(self, value: int):
+        self._in_flight = value
+        ADMISSION_IN_FLIGHT.set(value)
+
+    def _queue_changed(self, kind: str, delta: int):
+        self._queued[kind] += delta
+        ADMISSION_QUEUE_DEPTH.labels(priority=kind).set(self._queued[kind])
+
+    def _forget_uuid(self, uuid: str):
+        self._per_uuid[uuid] -= 1
+        if self._per_uuid[uuid] <= 0:
+            del self._per_uuid[uuid]
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog has likely drained."""
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._hold_seconds * backlog / self.max_in_flight))
+
+    def _reject(self, kind: str, reason: str) -> AdmissionRejected:
+        self._stats[f"rejected_{reason}"] += 1
+        ADMISSION_REJECTIONS.labels(priority=kind, reason=reason).inc()
+        logger.warning("admission_rejected", priority=kind, reason=reason, in_flight=self._in_flight, queued=len(self._waiters))
+        return AdmissionRejected(reason, self.retry_after())
+
+    def _remove_waiter(self, entry):
+        self._waiters.remove(entry)
+        heapq.heapify(self._waiters)
+        self._queue_changed(entry[4], -1)
+
+    # ---------- admission ----------
+    def _admitted(self, uuid: str, kind: str, wait_seconds: float) -> Ticket:
+        self._stats["admitted"] += 1
+        ADMISSION_WAIT_SECONDS.labels(priority=kind).observe(wait_seconds)
+        return Ticket(self, uuid)
+
+    async def acquire(self, uuid: str, kind: str = "invoke") -> Ticket:
+        """
+        Wait for a slot.
+
+        Args:
+            uuid: Conversation thread ID (per-uuid cap)
+            kind: "stream", "invoke" or "batch" (queue priority)
+
+        Returns:
+            Ticket to release() when the request is done
+
+        Raises:
+            AdmissionRejected: The request should be answered with 429
+        """
+        priority = PRIORITIES[kind]
+        if self._per_uuid[uuid] >= self.max_per_uuid:
+            raise self._reject(kind, "per_uuid")
+
+        if self._in_flight < self.max_in_flight and not self._waiters:
+            self._per_uuid[uuid] += 1
+            self._set_in_flight(self._in_flight + 1)
+            return self._admitted(uuid, kind, 0.0)
+
+        if len(self._waiters) >= self.queue_size:
+            # Newest waiter of the lowest priority
+            worst = max(self._waiters, key=lambda entry: (entry[0], entry[1]))
+            if worst[0] <= priority:
+                raise self._reject(kind, "queue_full")
+            self._remove_waiter(worst)
+            self._forget_uuid(worst[3])
+            worst[2].set_exception(self._reject(worst[4], "evicted"))
+
+        self._per_uuid[uuid] += 1
+        entry = [priority, next(self._sequence), asyncio.get_running_loop().create_future(), uuid, kind]
+        heapq.heappush(self._waiters, entry)
+        self._queue_changed(kind, 1)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait({entry[2]}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(entry)
+            raise
+        if not entry[2].done():
+            self._abandon(entry)
+            raise self._reject(kind, "timeout")
+        entry[2].result()  # raises AdmissionRejected when evicted
+        return self._admitted(uuid, kind, time.perf_counter() - start)
+
+    def _abandon(self, entry):
+        """The waiter gave up (timeout or cancelled request)."""
+        future = entry[2]
+        if future.done() and not future.cancelled() and future.exception() is None:
+            # The slot was handed over just now; pass it on
+            self._forget_uuid(entry[3])
+            self._hand_over_slot()
+            return
+        if not future.done():
+            future.cancel()
+            self._remove_waiter(entry)
+            self._forget_uuid(entry[3])
+
+    def _hand_over_slot(self):
+        """Give a freed slot to the best waiter (the in-flight count stays), or free it."""
+        while self._waiters:
+            entry = heapq.heappop(self._waiters)
+            self._queue_changed(entry[4], -1)
+            if not entry[2].done():
+                entry[2].set_result(None)
+                return
+        self._set_in_flight(self._in_flight - 1)
+
+    def _release(self, ticket: Ticket):
+        hold = time.perf_counter() - ticket.start
+        self._hold_seconds += HOLD_SMOOTHING * (hold - self._hold_seconds)
+        self._forget_uuid(ticket.uuid)
+        self._hand_over_slot()
+
+    @asynccontextmanager
+    async def admit(self, uuid: str, kind: str = "invoke"):
+        """Hold a slot for the duration of the block (see acquire)."""
+        ticket = await self.acquire(uuid, kind)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self):
+        """
+        Admission counters.
+
+        Returns:
+            Dict with limits, in_flight, queued per priority, admitted, rejections per reason and avg_hold_ms
+        """
+        return {
+            "max_in_flight": self.max_in_flight,
+            "max_per_uuid": self.max_per_uuid,
+            "queue_size": self.queue_size,
+            "in_flight": self._in_flight,
+            "queued": {kind: self._queued[kind] for kind in PRIORITIES},
+            **{key: value for key, value in sorted(self._stats.items())},
+            "avg_hold_ms": round(self._hold_seconds * 1000, 2),
+        }
+
+
+# ========== SINGLETON CONTROLLER ==============
+_controller = None
+
+
+def get_admission_controller() -> Optional[AdmissionController]:
+    """Get the shared admission controller, or None when ADMISSION_ENABLED is false."""
+    global _controller
+    if not ADMISSION_ENABLED:
+        return None
+    if _controller is None:
+        _controller = AdmissionController()
+    return _controller
+
+
+def admit(uuid: str, kind: str = "invoke"):
+    """Async context manager holding an admission slot (no-op when admission control is off)."""
+    controller = get_admission_controller()
+    return controller.admit(uuid, kind) if controller is not None else nullcontext()
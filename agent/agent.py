@@ -1,21 +1,93 @@
 from langchain.agents import create_agent
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_openai import ChatOpenAI
 from agent.memory.trim_message import trim_messages_middleware
 from agent.memory.checkpointer import get_shared_checkpointer
 from agent.tools.tool import rag_search, product_search, product_filter
+from agent.tools.tool_middleware import ToolConcurrencyMiddleware, get_single_flight_tool_middleware
+from agent.tools.prefetch import get_prefetch_middleware
 from agent.prompt.read_prompt import SYSTEM_PROMPT_TEMPLATE
+from metrics import LLM_CALL_SECONDS, LLM_TTFT_SECONDS, LLM_TOKENS
+import time
 
-# Initialize LLM
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+LLM_MODEL_NAME = "gpt-4o-mini"
 
-# Global agent instance (initialized on import)
+# LLM client and global agent instance, created by initialize_agent() (not at import)
+_llm = None
 agent = None
+_stateless_agent = None
+
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """
+    Record chat model call duration, time to first token (streamed calls only)
+    and token usage.
+    """
+
+    # Called directly in the event loop instead of a thread pool (it only records numbers)
+    run_inline = True
+
+    def __init__(self, model: str):
+        self.model = model
+        self._runs = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._runs[run_id] = [time.perf_counter(), False]
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        run = self._runs.get(run_id)
+        if run is not None and not run[1]:
+            run[1] = True
+            LLM_TTFT_SECONDS.labels(model=self.model).observe(time.perf_counter() - run[0])
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        LLM_CALL_SECONDS.labels(model=self.model).observe(time.perf_counter() - run[0])
+        message = getattr(response.generations[0][0], "message", None) if response.generations else None
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            LLM_TOKENS.labels(model=self.model, kind="input").inc(usage.get("input_tokens", 0))
+            LLM_TOKENS.labels(model=self.model, kind="output").inc(usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._runs.pop(run_id, None)
+
+
+def get_llm():
+    """Get or create the shared chat model."""
+    global _llm
+    if _llm is None:
+        _llm = ChatOpenAI(model=LLM_MODEL_NAME, temperature=0, callbacks=[LLMMetricsCallback(LLM_MODEL_NAME)])
+    return _llm
+
+
+def _build_agent(checkpointer):
+    """Create the ReAct agent with our tools and middleware."""
+    middleware = [trim_messages_middleware, ToolConcurrencyMiddleware()]
+    prefetch = get_prefetch_middleware()
+    if prefetch is not None:
+        # Speculative retrieval alongside the planning call (PREFETCH_ENABLED)
+        middleware.append(prefetch)
+    single_flight = get_single_flight_tool_middleware()
+    if single_flight is not None:
+        # Identical retrieval calls from concurrent conversations share one run
+        middleware.append(single_flight)
+
+    return create_agent(
+        model=get_llm(),
+        tools=[rag_search, product_search, product_filter],
+        checkpointer=checkpointer,
+        system_prompt=SYSTEM_PROMPT_TEMPLATE,
+        middleware=middleware,
+    )
 
 
 async def initialize_agent(use_checkpointer: bool = True):
     """
     Initialize the global agent instance.
-    Automatically called when this module is imported.
+    Called by the API warm-up on startup, or lazily by the first request.
     
     Args:
         use_checkpointer: If True, uses Redis checkpointer for conversation memory.
@@ -32,12 +104,17 @@ async def initialize_agent(use_checkpointer: bool = True):
         checkpointer = await get_shared_checkpointer()
     
     # Create ReAct agent
-    agent = create_agent(
-        model=llm,
-        tools=[rag_search, product_search, product_filter],
-        checkpointer=checkpointer,
-        system_prompt=SYSTEM_PROMPT_TEMPLATE,
-        middleware=[trim_messages_middleware],  # ← Add middleware here
-    )
+    agent = _build_agent(checkpointer)
     
-    return agent
\ No newline at end of file
+    return agent
+
+
+def get_stateless_agent():
+    """
+    Get or create the agent without a checkpointer, for one-off questions
+    (batch answers): no conversation state is read from or written to Redis.
+    """
+    global _stateless_agent
+    if _stateless_agent is None:
+        _stateless_agent = _build_agent(checkpointer=None)
+    return _stateless_agent
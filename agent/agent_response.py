@@ -1,41 +1,249 @@
-from agent.agent import initialize_agent
-from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk
+from agent.agent import initialize_agent, get_stateless_agent
+from agent.cache.semantic_cache import get_semantic_cache, normalize_question
+from agent.cache.single_flight import get_answer_single_flight
+from agent.memory.compaction import schedule_compaction
+from agent.router.intent_router import get_intent_router
+from metrics import REQUEST_SECONDS, STREAM_FIRST_TOKEN_SECONDS
+from langchain_core.messages import HumanMessage, AIMessage, AIMessageChunk, ToolMessage
 from langsmith import uuid7
+import time
 
 
-async def get_agent_answer(user_request: str, uuid: str):
+async def _is_new_thread(agent, config) -> bool:
+    """
+    Whether the thread has no previous messages.
+
+    Only context-free (first-turn) questions are served from or written to the
+    semantic cache; follow-ups like "那價格呢?" depend on the conversation.
+    """
+    if agent.checkpointer is None:
+        return True
+    state = await agent.aget_state(config)
+    return not state.values.get("messages")
+
+
+async def _record_cached_turn(agent, config, user_request: str, answer: str):
+    """Append a cache-served turn to the thread so follow-up questions keep context."""
+    if agent.checkpointer is None:
+        return
+    await agent.aupdate_state(
+        config,
+        {"messages": [HumanMessage(content=user_request), AIMessage(content=answer)]},
+        as_node="model",
+    )
+
+
+async def _lookup_cached_answer(agent, config, user_request: str, new_thread: bool):
+    """
+    Try to serve the request from the semantic cache.
+
+    Returns:
+        Tuple of (cached answer or None, whether the answer may be cached)
+    """
+    cache = get_semantic_cache()
+    if cache is None or not new_thread:
+        return None, False
+    answer = await cache.lookup(user_request)
+    if answer is not None:
+        await _record_cached_turn(agent, config, user_request, answer)
+    return answer, True
+
+
+async def _route_request(agent, config, user_request: str, new_thread: bool):
+    """
+    Run the intent router on a first-turn question.
+
+    Returns:
+        Tuple of (router decision or None, fast-path answer to serve or None)
+    """
+    router = get_intent_router()
+    if router is None or not new_thread:
+        return None, None
+    decision = await router.adecide(user_request)
+    if not router.should_serve(decision):
+        return decision, None
+    await _record_cached_turn(agent, config, user_request, decision["answer"])
+    await router.arecord(decision, served=True)
+    return decision, decision["answer"]
+
+
+def _served_path(decision) -> str:
+    """Metrics label of an answer served without the agent (cache hits carry no router decision)."""
+    return "cache" if decision is None else "router"
+
+
+def _turn_tool_calls(messages):
+    """Tool calls made by the agent after the last user message."""
+    tool_calls = []
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            break
+        if isinstance(message, AIMessage):
+            tool_calls[:0] = [{"name": tool_call["name"], "args": tool_call["args"]} for tool_call in message.tool_calls]
+    return tool_calls
+
+
+async def _after_turn(agent, config, user_request: str, answer: str, cacheable: bool, decision, messages, agent_ms: float):
+    """Cache the answer, log the router decision and schedule compaction once the agent has answered."""
+    if cacheable:
+        await get_semantic_cache().store(user_request, answer)
+    if decision is not None:
+        # A streamed turn without a checkpointer has no message list to compare against
+        tool_calls = _turn_tool_calls(messages) if messages is not None else None
+        await get_intent_router().arecord(decision, False, tool_calls, agent_ms)
+    # Summarize long threads in the background, after the answer is ready
+    schedule_compaction(agent, config)
+
+
+async def _prepare_turn(user_request: str, uuid: str, stateless: bool = False):
+    """
+    Shared front of both answer paths: semantic cache, intent router.
+
+    Args:
+        stateless: Answer with the checkpointer-less agent (no thread state)
+
+    Returns:
+        Tuple of (agent, config, answer served without the agent or None,
+        whether the answer may be cached, router decision, whether the thread is new)
+    """
+    agent = get_stateless_agent() if stateless else await initialize_agent()
+    config = {"configurable": {"thread_id": uuid}}
+    new_thread = await _is_new_thread(agent, config)
+
+    cached_answer, cacheable = await _lookup_cached_answer(agent, config, user_request, new_thread)
+    if cached_answer is not None:
+        return agent, config, cached_answer, cacheable, None, new_thread
+    decision, routed_answer = await _route_request(agent, config, user_request, new_thread)
+    return agent, config, routed_answer, cacheable, decision, new_thread
+
+
+async def get_agent_answer(user_request: str, uuid: str, stateless: bool = False, endpoint: str = "invoke"):
     """
     Get agent answer for a user request.
     
     Args:
         user_request: User's question/message
         uuid: User's unique ID for conversation thread
+        stateless: Answer without conversation memory (nothing is checkpointed)
+        endpoint: Metrics label of the calling endpoint
     
     Returns:
         Agent's response content
     """
-    agent = await initialize_agent()
-    
-    config = {"configurable": {"thread_id": uuid}}
-    result = await agent.ainvoke(
-        {"messages": [HumanMessage(content=user_request)]},
-        config=config
-    )
-    return result["messages"][-1].content
+    start = time.perf_counter()
+    agent, config, served_answer, cacheable, decision, new_thread = await _prepare_turn(user_request, uuid, stateless)
+    if served_answer is not None:
+        REQUEST_SECONDS.labels(endpoint=endpoint, path=_served_path(decision)).observe(time.perf_counter() - start)
+        return served_answer
 
-async def get_agent_answer_stream(user_request: str, uuid: str):
-    agent = await initialize_agent()
-    
-    config = {"configurable": {"thread_id": uuid}}
+    async def run_turn():
+        start = time.perf_counter()
+        result = await agent.ainvoke(
+            {"messages": [HumanMessage(content=user_request)]},
+            config=config
+        )
+        answer = result["messages"][-1].content
+        agent_ms = round((time.perf_counter() - start) * 1000, 2)
+        await _after_turn(agent, config, user_request, answer, cacheable, decision, result["messages"], agent_ms)
+        return answer
+
+    flights = get_answer_single_flight()
+    if flights is None or not new_thread:
+        leader, answer = True, await run_turn()
+    else:
+        # Identical first-turn questions in flight share one agent run
+        leader, answer = await flights.do(("invoke", normalize_question(user_request)), run_turn)
+        if not leader:
+            await _record_cached_turn(agent, config, user_request, answer)
+    REQUEST_SECONDS.labels(endpoint=endpoint, path="agent" if leader else "single_flight").observe(time.perf_counter() - start)
+    return answer
+
+
+async def _astream_turn(agent, config, user_request: str, cacheable: bool, decision):
+    """
+    Run one agent turn as an event stream.
+
+    Yields:
+        The events of astream_agent_events, then ("answer", final answer)
+    """
+    start = time.perf_counter()
+    answer_tokens = []
     async for chunk in agent.astream(
         {"messages": [HumanMessage(content=user_request)]},
         config=config,
         stream_mode="messages",
     ):
         chunk_message = chunk[0]
-        if isinstance(chunk_message, AIMessageChunk):
+        if isinstance(chunk_message, AIMessage):
+            # Streaming models yield AIMessageChunk with tool_call_chunks (name set on the first chunk)
+            tool_calls = chunk_message.tool_call_chunks if isinstance(chunk_message, AIMessageChunk) else chunk_message.tool_calls
+            for tool_call in tool_calls:
+                if tool_call.get("name"):
+                    yield "tool_start", {"tool": tool_call["name"]}
             if chunk_message.content:
-                yield chunk_message.content
+                answer_tokens.append(chunk_message.content)
+                yield "token", chunk_message.content
+        elif isinstance(chunk_message, ToolMessage):
+            yield "tool_end", {"tool": chunk_message.name}
+
+    agent_ms = round((time.perf_counter() - start) * 1000, 2)
+    state = await agent.aget_state(config) if agent.checkpointer else None
+    # Only the final answer counts (the last model call's content)
+    answer = state.values["messages"][-1].content if state else "".join(answer_tokens)
+    await _after_turn(agent, config, user_request, answer, cacheable, decision, state.values["messages"] if state else None, agent_ms)
+    yield "answer", answer
+
+
+async def astream_agent_events(user_request: str, uuid: str):
+    """
+    Stream the agent's answer as typed events.
+
+    Args:
+        user_request: User's question/message
+        uuid: User's unique ID for conversation thread
+
+    Yields:
+        ("token", text) for answer text, and ("tool_start", {"tool": name}) /
+        ("tool_end", {"tool": name}) around each tool call
+    """
+    start = time.perf_counter()
+    agent, config, served_answer, cacheable, decision, new_thread = await _prepare_turn(user_request, uuid)
+    if served_answer is not None:
+        # Replay the cached / fast-path answer as a single token
+        path = _served_path(decision)
+        STREAM_FIRST_TOKEN_SECONDS.labels(path=path).observe(time.perf_counter() - start)
+        yield "token", served_answer
+        REQUEST_SECONDS.labels(endpoint="stream", path=path).observe(time.perf_counter() - start)
+        return
+
+    flights = get_answer_single_flight()
+    if flights is None or not new_thread:
+        leader, events = True, _astream_turn(agent, config, user_request, cacheable, decision)
+    else:
+        # Identical first-turn questions in flight share one agent run and its token stream
+        leader, events = flights.stream(
+            ("stream", normalize_question(user_request)),
+            lambda: _astream_turn(agent, config, user_request, cacheable, decision),
+        )
+
+    path = "agent" if leader else "single_flight"
+    first_token = True
+    async for event_type, payload in events:
+        if event_type == "token" and first_token:
+            first_token = False
+            STREAM_FIRST_TOKEN_SECONDS.labels(path=path).observe(time.perf_counter() - start)
+        if event_type != "answer":
+            yield event_type, payload
+        elif not leader:
+            # The run wrote the leader's thread; record the turn in this one too
+            await _record_cached_turn(agent, config, user_request, payload)
+    REQUEST_SECONDS.labels(endpoint="stream", path=path).observe(time.perf_counter() - start)
+
+async def get_agent_answer_stream(user_request: str, uuid: str):
+    """Stream only the answer text of astream_agent_events."""
+    async for event_type, payload in astream_agent_events(user_request, uuid):
+        if event_type == "token":
+            yield payload
 
 
 if __name__ == "__main__":
@@ -0,0 +1,127 @@
+"""
+Bulk question answering with bounded concurrency (POST /chatbot/batch_answer/).
+
+Nightly CRM jobs send thousands of FAQ-style questions. A batch runs them
+through the agent with at most `concurrency` agent runs in flight and yields
+each result as soon as it is ready:
+
+- Items without a uuid are stateless: they are answered by the agent without
+  a checkpointer, so nothing is read from or written to Redis, and identical
+  questions (after normalize_question) are answered once for the whole batch.
+  They still go through the semantic cache, the intent router and
+  single-flight, so they share work with interactive traffic too.
+- Items with a uuid are turns of that conversation and run in order.
+
+All batches of a worker share BATCH_MAX_CONCURRENCY slots, so several jobs
+at once cannot take more agent runs away from interactive requests than that.
+Batch items also queue behind interactive requests for admission (see
+agent/admission.py) and retry after Retry-After instead of failing when shed.
+"""
+from dotenv import load_dotenv
+from typing import Dict, List
+from langsmith import uuid7
+import structlog
+import asyncio
+import os
+import time
+
+from agent.admission import AdmissionRejected, admit
+from agent.agent_response import get_agent_answer
+from agent.cache.semantic_cache import normalize_question
+from metrics import REQUEST_ERRORS
+
+logger = structlog.get_logger()
+load_dotenv()
+
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+
+# Agent run slots shared by all batches of this worker (created on first use, inside the event loop)
+_batch_slots = None
+
+
+def _get_batch_slots():
+    global _batch_slots
+    if _batch_slots is None:
+        _batch_slots = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    return _batch_slots
+
+
+def _result(index: int, item: Dict, outcome: Dict, latency_ms: float, shared: bool = False) -> Dict:
+    return {
+        "index": index,
+        "id": item.get("id"),
+        "uuid": item.get("uuid"),
+        **outcome,
+        "latency_ms": latency_ms,
+        "shared": shared,
+    }
+
+
+async def _answer_when_admitted(question: str, uuid: str, stateless: bool):
+    """Answer with the lowest admission priority; batch work waits out overload instead of failing."""
+    while True:
+        try:
+            async with admit(uuid, "batch"):
+                return await get_agent_answer(question, uuid, stateless=stateless, endpoint="batch")
+        except AdmissionRejected as e:
+            await asyncio.sleep(e.retry_after)
+
+
+async def run_batch(items: List[Dict], concurrency: int = BATCH_MAX_CONCURRENCY):
+    """
+    Answer a list of questions, yielding results in completion order.
+
+    Args:
+        items: Dicts with "question" and optional "uuid" (conversation thread) and "id" (echoed back)
+        concurrency: Max agent runs of this batch in flight (capped at BATCH_MAX_CONCURRENCY)
+
+    Yields:
+        One dict per item: index, id, uuid, answer or error, latency_ms, and
+        shared (True when the answer of an identical question was reused)
+    """
+    concurrency = max(1, min(concurrency, BATCH_MAX_CONCURRENCY))
+    own_slots = asyncio.Semaphore(concurrency)
+    shared_slots = _get_batch_slots()
+    results = asyncio.Queue()
+
+    async def answer(index: int, uuid: str, stateless: bool):
+        start = time.perf_counter()
+        try:
+            async with own_slots, shared_slots:
+                outcome = {"answer": await _answer_when_admitted(items[index]["question"], uuid, stateless)}
+        except Exception as e:
+            logger.exception("exception_in_batch_item", index=index, error=str(e))
+            REQUEST_ERRORS.labels(endpoint="batch").inc()
+            outcome = {"error": str(e)}
+        return outcome, round((time.perf_counter() - start) * 1000, 2)
+
+    async def run_question(indices: List[int]):
+        # Stateless: answer once, hand the answer to every identical question
+        outcome, latency_ms = await answer(indices[0], str(uuid7()), stateless=True)
+        for position, index in enumerate(indices):
+            results.put_nowait(_result(index, items[index], outcome, latency_ms, shared=position > 0))
+
+    async def run_thread(indices: List[int]):
+        # Turns of one conversation depend on each other
+        for index in indices:
+            outcome, latency_ms = await answer(index, items[index]["uuid"], stateless=False)
+            results.put_nowait(_result(index, items[index], outcome, latency_ms))
+
+    groups = {}
+    for index, item in enumerate(items):
+        key = ("thread", item["uuid"]) if item.get("uuid") else ("question", normalize_question(item["question"]))
+        groups.setdefault(key, []).append(index)
+    logger.info("batch_started", items=len(items), groups=len(groups), concurrency=concurrency)
+
+    tasks = [
+        asyncio.create_task(run_thread(indices) if kind == "thread" else run_question(indices))
+        for (kind, _), indices in groups.items()
+    ]
+    try:
+        for _ in range(len(items)):
+            yield await results.get()
+    finally:
+        # The client went away: stop the remaining work
+        for task in tasks:
+            task.cancel()
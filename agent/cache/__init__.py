@@ -0,0 +1 @@
+# Agent cache package
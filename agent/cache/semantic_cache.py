@@ -0,0 +1,316 @@
+"""
+Redis-backed semantic answer cache.
+
+Answers are stored in redis-stack (RediSearch) together with the embedding of
+the question. A lookup embeds the incoming question and runs a KNN query; if
+the nearest cached question is at least SEMANTIC_CACHE_THRESHOLD similar the
+cached answer is replayed instead of running the full ReAct loop.
+
+Entries are tagged with the corpus version (see rag/redis_utils.py) so a
+re-ingest invalidates everything written against the previous data.
+
+Questions that differ only in a size or a number ("6*7 的蠶絲被價格" vs
+"5*7 的蠶絲被價格") are near-identical in embedding space, so a semantic hit
+also requires both questions to carry the same sizes, prices and numbers.
+"""
+from redis.commands.search.field import NumericField, TagField, TextField, VectorField
+from redis.commands.search.query import Query
+from redis.exceptions import ResponseError
+from array import array
+from dotenv import load_dotenv
+import asyncio
+import hashlib
+import os
+import re
+import time
+import structlog
+
+try:
+    from redis.commands.search.index_definition import IndexDefinition, IndexType
+except ImportError:  # redis-py < 6
+    from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+
+from rag.redis_utils import get_async_redis_client, aget_corpus_version
+from rag.mongo_db_utils.vector_store_utils import get_embedding_model
+from agent.router.intent_router import (
+    PRICE_MAX_PATTERN, PRICE_MIN_PATTERN, PRICE_RANGE_PATTERN, SIZE_PATTERN, normalize_text,
+)
+
+# Initialize logger
+logger = structlog.get_logger()
+load_dotenv()
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+# Cosine similarity required to replay a cached answer
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+
+EMBEDDING_DIMENSIONS = 1536
+
+KEY_PREFIX = "answer_cache:entry:"
+INDEX_NAME = "answer_cache_idx"
+LRU_KEY = "answer_cache:lru"
+STATS_KEY = "answer_cache:stats"
+
+NUMBER_PATTERN = re.compile(r"\d+")
+
+
+def _decode(value):
+    return value.decode("utf-8") if isinstance(value, bytes) else value
+
+
+def normalize_question(question: str) -> str:
+    """Normalize whitespace and case so trivially different questions share a key."""
+    return " ".join(question.split()).lower()
+
+
+def question_constraints(question: str):
+    """
+    Sizes, price bounds and other numbers in a question.
+
+    A cached answer is only replayed for a question with the same constraints,
+    whatever the embedding similarity.
+    """
+    text = normalize_text(question)
+    sizes = sorted(f"{match.group(1)}*{match.group(2)}" for match in SIZE_PATTERN.finditer(text))
+    price_ranges = sorted(
+        tuple(sorted((int(match.group(1)), int(match.group(2))))) for match in PRICE_RANGE_PATTERN.finditer(text)
+    )
+    price_max = sorted(int(next(group for group in match.groups() if group)) for match in PRICE_MAX_PATTERN.finditer(text))
+    price_min = sorted(int(next(group for group in match.groups() if group)) for match in PRICE_MIN_PATTERN.finditer(text))
+    numbers = sorted(int(number) for number in NUMBER_PATTERN.findall(SIZE_PATTERN.sub(" ", text)))
+    return sizes, price_ranges, price_max, price_min, numbers
+
+
+class SemanticCache:
+    """
+    Semantic cache for agent answers.
+
+    - Exact hits (same normalized question) skip the embedding call entirely.
+    - Semantic hits use a RediSearch KNN query filtered by corpus version, and
+      only count when the cached question has the same question_constraints.
+    - Each entry expires after SEMANTIC_CACHE_TTL_SECONDS without a hit (every
+      hit refreshes the TTL); when the cache grows past SEMANTIC_CACHE_MAX_ENTRIES
+      the least recently used entries are evicted.
+
+    The cache is strictly best-effort: any failure (Redis or the embedding
+    call) is logged and treated as a miss, so it can never break answering.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS,
+        max_entries: int = SEMANTIC_CACHE_MAX_ENTRIES,
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._index_ready = False
+        self._index_lock = asyncio.Lock()
+        # Corpus version whose LRU members were last checked for older versions
+        self._purged_version = None
+
+    @staticmethod
+    def _entry_key(version: int, question: str) -> str:
+        digest = hashlib.sha1(normalize_question(question).encode("utf-8")).hexdigest()
+        return f"{KEY_PREFIX}{version}:{digest}"
+
+    async def _ensure_index(self, redis_client):
+        if self._index_ready:
+            return
+        async with self._index_lock:
+            if self._index_ready:
+                return
+            schema = (
+                TextField("question"),
+                TagField("corpus_version"),
+                NumericField("created_at"),
+                VectorField(
+                    "embedding",
+                    "FLAT",
+                    {"TYPE": "FLOAT32", "DIM": EMBEDDING_DIMENSIONS, "DISTANCE_METRIC": "COSINE"},
+                ),
+            )
+            try:
+                await redis_client.ft(INDEX_NAME).create_index(
+                    schema,
+                    definition=IndexDefinition(prefix=[KEY_PREFIX], index_type=IndexType.HASH),
+                )
+                logger.info("Created semantic cache index", index=INDEX_NAME)
+            except ResponseError as e:
+                if "already exists" not in str(e).lower():
+                    raise
+            self._index_ready = True
+
+    async def lookup(self, question: str):
+        """
+        Look up a cached answer for a question.
+
+        Args:
+            question: User's question
+
+        Returns:
+            Cached answer string, or None on a miss
+        """
+        redis_client = get_async_redis_client()
+        try:
+            version = await aget_corpus_version()
+
+            # Exact match first: no embedding call needed
+            key = self._entry_key(version, question)
+            answer = await redis_client.hget(key, "answer")
+            if answer is not None:
+                await self._touch(redis_client, key, "exact_hits")
+                return _decode(answer)
+
+            await self._ensure_index(redis_client)
+            embedding = await get_embedding_model().aembed_query(question)
+            query = (
+                Query(f"(@corpus_version:{{{version}}})=>[KNN 1 @embedding $vec AS distance]")
+                .sort_by("distance")
+                .return_fields("question", "answer", "distance")
+                .paging(0, 1)
+                .dialect(2)
+            )
+            result = await redis_client.ft(INDEX_NAME).search(
+                query, query_params={"vec": array("f", embedding).tobytes()}
+            )
+            if result.docs:
+                best = result.docs[0]
+                similarity = 1.0 - float(best.distance)
+                if similarity >= self.threshold:
+                    if question_constraints(_decode(best.question)) == question_constraints(question):
+                        await self._touch(redis_client, best.id, "semantic_hits")
+                        return _decode(best.answer)
+                    await redis_client.hincrby(STATS_KEY, "constraint_mismatches", 1)
+
+            await redis_client.hincrby(STATS_KEY, "misses", 1)
+            return None
+        except Exception as e:
+            logger.warning("semantic_cache_lookup_failed", error=str(e))
+            return None
+
+    async def store(self, question: str, answer: str):
+        """
+        Store an answer for a question under the current corpus version.
+
+        Args:
+            question: User's question
+            answer: Agent's final answer
+        """
+        if not answer:
+            return
+        redis_client = get_async_redis_client()
+        try:
+            await self._ensure_index(redis_client)
+            version = await aget_corpus_version()
+            await self._purge_old_versions(redis_client, version)
+            embedding = await get_embedding_model().aembed_query(question)
+            key = self._entry_key(version, question)
+            now = time.time()
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.hset(key, mapping={
+                    "question": question,
+                    "answer": answer,
+                    "corpus_version": str(version),
+                    "created_at": now,
+                    "embedding": array("f", embedding).tobytes(),
+                })
+                pipe.expire(key, self.ttl_seconds)
+                pipe.zadd(LRU_KEY, {key: now})
+                # Members unused for a whole TTL belong to entries that have expired
+                pipe.zremrangebyscore(LRU_KEY, "-inf", now - self.ttl_seconds)
+                pipe.zcard(LRU_KEY)
+                results = await pipe.execute()
+            await self._evict(redis_client, results[-1])
+        except Exception as e:
+            logger.warning("semantic_cache_store_failed", error=str(e))
+
+    async def _touch(self, redis_client, key, stat_field: str):
+        # A hit keeps the entry alive: TTL and LRU score are both refreshed
+        async with redis_client.pipeline(transaction=False) as pipe:
+            pipe.expire(key, self.ttl_seconds)
+            pipe.zadd(LRU_KEY, {key: time.time()})
+            pipe.hincrby(STATS_KEY, "hits", 1)
+            pipe.hincrby(STATS_KEY, stat_field, 1)
+            await pipe.execute()
+
+    async def _purge_old_versions(self, redis_client, version: int):
+        """
+        Drop LRU members (and entries) written under an older corpus version.
+
+        Runs once per worker after each corpus version bump; such entries can
+        no longer be served and would otherwise count towards max_entries.
+        """
+        if self._purged_version == version:
+            return
+        prefix = f"{KEY_PREFIX}{version}:"
+        members = await redis_client.zrange(LRU_KEY, 0, -1)
+        stale = [member for member in members if not _decode(member).startswith(prefix)]
+        if stale:
+            async with redis_client.pipeline(transaction=False) as pipe:
+                pipe.zrem(LRU_KEY, *stale)
+                pipe.delete(*stale)
+                await pipe.execute()
+            logger.info("semantic_cache_purged_old_versions", version=version, entries=len(stale))
+        self._purged_version = version
+
+    async def _evict(self, redis_client, size: int):
+        """Evict least recently used entries beyond max_entries."""
+        overflow = size - self.max_entries
+        if overflow <= 0:
+            return
+        evicted = await redis_client.zpopmin(LRU_KEY, overflow)
+        keys = [key for key, _ in evicted]
+        if keys:
+            await redis_client.delete(*keys)
+            await redis_client.hincrby(STATS_KEY, "evictions", len(keys))
+
+    async def stats(self):
+        """
+        Return hit/miss counters and ratios for threshold tuning.
+
+        Returns:
+            Dict with hits, misses, near misses rejected for different
+            constraints, hit_ratio and current configuration
+        """
+        redis_client = get_async_redis_client()
+        version = await aget_corpus_version()
+        await self._purge_old_versions(redis_client, version)
+        await redis_client.zremrangebyscore(LRU_KEY, "-inf", time.time() - self.ttl_seconds)
+        raw = await redis_client.hgetall(STATS_KEY)
+        counters = {_decode(k): int(v) for k, v in raw.items()}
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+        total = hits + misses
+        return {
+            "enabled": SEMANTIC_CACHE_ENABLED,
+            "hits": hits,
+            "exact_hits": counters.get("exact_hits", 0),
+            "semantic_hits": counters.get("semantic_hits", 0),
+            "constraint_mismatches": counters.get("constraint_mismatches", 0),
+            "misses": misses,
+            "evictions": counters.get("evictions", 0),
+            "hit_ratio": hits / total if total else 0.0,
+            "entries": await redis_client.zcard(LRU_KEY),
+            "corpus_version": version,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+        }
+
+
+# ========== SINGLETON CACHE ==============
+_semantic_cache = None
+
+
+def get_semantic_cache():
+    """Get or create the shared semantic cache (None when disabled)."""
+    global _semantic_cache
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache()
+    return _semantic_cache
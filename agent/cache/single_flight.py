@@ -0,0 +1,145 @@
+"""
+Single-flight coalescing of identical in-flight work.
+
+During campaigns many users send the same question within seconds. Instead
+of running the same work several times, the first caller for a key (the
+leader) starts it as a background task and later callers with the same key
+(followers) attach to it while it is in flight. Nothing is kept after the
+work finishes; this is deduplication, not a cache.
+
+- do(): share the result of one coroutine
+- stream(): share an async event stream; every subscriber receives all
+  events from the start (late joiners get the events so far replayed, then
+  live ones), so one agent run can feed several SSE responses
+
+The shared work runs in its own task, so a leader whose client disconnects
+does not cancel it for the followers.
+"""
+from dotenv import load_dotenv
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Tuple
+import structlog
+import asyncio
+import os
+
+logger = structlog.get_logger()
+load_dotenv()
+
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+
+class _SharedStream:
+    """Buffers the events of one stream and replays them to any number of subscribers."""
+
+    def __init__(self, events: AsyncIterator):
+        self.events = []
+        self.done = False
+        self.error = None
+        self._changed = asyncio.Event()
+        self.task = asyncio.create_task(self._pump(events))
+
+    async def _pump(self, events: AsyncIterator):
+        try:
+            async for event in events:
+                self.events.append(event)
+                self._notify()
+        except asyncio.CancelledError:
+            self.error = RuntimeError("shared stream was cancelled")
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self._notify()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self):
+        index = 0
+        while True:
+            while index < len(self.events):
+                yield self.events[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Key -> in-flight work registry.
+
+    Args:
+        name: Used in logs and stats
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._flights: Dict[Hashable, Any] = {}
+        self._stats = {"leaders": 0, "followers": 0}
+
+    def _join(self, key: Hashable, start: Callable[[], Any]):
+        flight = self._flights.get(key)
+        if flight is not None:
+            self._stats["followers"] += 1
+            logger.info("single_flight_join", name=self.name)
+            return False, flight
+
+        flight = start()
+        self._flights[key] = flight
+        self._stats["leaders"] += 1
+        task = flight.task if isinstance(flight, _SharedStream) else flight
+        # Forget the flight once it is done; the next caller starts fresh work
+        task.add_done_callback(lambda _: self._flights.pop(key, None) if self._flights.get(key) is flight else None)
+        return True, flight
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable]) -> Tuple[bool, Any]:
+        """
+        Await the shared result for key, starting factory() if nothing is in flight.
+
+        Returns:
+            Tuple of (whether this caller started the work, result)
+        """
+        leader, task = self._join(key, lambda: asyncio.create_task(factory()))
+        # shield: a cancelled caller must not cancel the work other callers wait for
+        return leader, await asyncio.shield(task)
+
+    def stream(self, key: Hashable, factory: Callable[[], AsyncIterator]) -> Tuple[bool, AsyncIterator]:
+        """
+        Subscribe to the shared event stream for key, starting factory() if nothing is in flight.
+
+        Returns:
+            Tuple of (whether this caller started the stream, event iterator)
+        """
+        leader, shared = self._join(key, lambda: _SharedStream(factory()))
+        return leader, shared.subscribe()
+
+    def stats(self):
+        """
+        Coalescing counters.
+
+        Returns:
+            Dict with leaders, followers, in_flight and the share of callers that joined existing work
+        """
+        stats = dict(self._stats)
+        calls = stats["leaders"] + stats["followers"]
+        stats["in_flight"] = len(self._flights)
+        stats["coalesced_rate"] = stats["followers"] / calls if calls else 0.0
+        return stats
+
+
+# ========== SINGLETON REGISTRIES ==============
+_answer_flights = None
+
+
+def get_answer_single_flight():
+    """Get the registry for in-flight stateless answers, or None when SINGLE_FLIGHT_ENABLED is false."""
+    global _answer_flights
+    if not SINGLE_FLIGHT_ENABLED:
+        return None
+    if _answer_flights is None:
+        _answer_flights = SingleFlight("answer")
+    return _answer_flights
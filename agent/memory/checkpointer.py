@@ -6,6 +6,9 @@ from dotenv import load_dotenv
 import os
 from pathlib import Path
 import uuid
+import time
+
+from metrics import CHECKPOINT_SECONDS
 
 # Initialize logger
 logger = structlog.get_logger()
@@ -32,6 +35,31 @@ ttl_config = {
     "refresh_on_read": True,  # touching a thread resets its TTL
 }
 
+class InstrumentedRedisSaver(AsyncRedisSaver):
+    """AsyncRedisSaver that records read / write latency in chatbot_checkpoint_seconds."""
+
+    async def aget_tuple(self, config):
+        start = time.perf_counter()
+        try:
+            return await super().aget_tuple(config)
+        finally:
+            CHECKPOINT_SECONDS.labels(operation="aget_tuple").observe(time.perf_counter() - start)
+
+    async def aput(self, config, checkpoint, metadata, new_versions, stream_mode="values"):
+        start = time.perf_counter()
+        try:
+            return await super().aput(config, checkpoint, metadata, new_versions, stream_mode)
+        finally:
+            CHECKPOINT_SECONDS.labels(operation="aput").observe(time.perf_counter() - start)
+
+    async def aput_writes(self, config, writes, task_id, task_path=""):
+        start = time.perf_counter()
+        try:
+            return await super().aput_writes(config, writes, task_id, task_path)
+        finally:
+            CHECKPOINT_SECONDS.labels(operation="aput_writes").observe(time.perf_counter() - start)
+
+
 # ========== SINGLETON CHECKPOINTER ==============
 # Shared checkpointer for all requests - thread-safe singleton
 _checkpointer = None
@@ -50,7 +78,7 @@ async def get_shared_checkpointer():
             # Double-check pattern to avoid race conditions
             if _checkpointer is None:
                 logger.info("Initializing shared Redis checkpointer", redis_url=REDIS_URL)
-                _checkpointer = await AsyncRedisSaver.from_conn_string(
+                _checkpointer = await InstrumentedRedisSaver.from_conn_string(
                     REDIS_URL,
                     ttl=ttl_config,
                     connection_args=REDIS_CONN_KWARGS
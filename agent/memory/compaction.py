@@ -0,0 +1,157 @@
+"""
+Background summarization compaction for long conversations.
+
+After a response has been sent, schedule_compaction() starts a background
+task that folds the older turns of a thread into a rolling summary message
+(SummarizationMiddleware) and writes it back to the checkpoint, so the next
+turn's prompt stays small and stable instead of growing until the trimmer
+starts dropping context.
+
+- Runs off the user's critical path (asyncio task after the answer is streamed)
+- At most one compaction per thread at a time; re-running on an already
+  compacted thread is a no-op because it is back under the token threshold
+- Skipped when the thread's Redis TTL is about to expire (it would be wasted)
+- Skipped when a new turn was written while the summary was being generated
+"""
+from langchain.agents.middleware import SummarizationMiddleware
+from langchain_openai import ChatOpenAI
+from dotenv import load_dotenv
+import structlog
+import asyncio
+import os
+
+from agent.memory.trim_message import message_tokens
+
+logger = structlog.get_logger()
+load_dotenv()
+
+COMPACTION_ENABLED = os.getenv("COMPACTION_ENABLED", "true").lower() == "true"
+# Compact once the history exceeds this many tokens (keep below MAX_CONTEXT_TOKENS)
+COMPACTION_TRIGGER_TOKENS = int(os.getenv("COMPACTION_TRIGGER_TOKENS", "8000"))
+# Most recent tokens kept verbatim after the summary
+COMPACTION_KEEP_TOKENS = int(os.getenv("COMPACTION_KEEP_TOKENS", "2000"))
+# Skip threads whose checkpoint expires sooner than this
+COMPACTION_MIN_TTL_SECONDS = int(os.getenv("COMPACTION_MIN_TTL_SECONDS", "60"))
+
+SUMMARY_PROMPT = """你正在為「好眠羊」寢具客服整理對話摘要，摘要會取代下列較早的對話內容。
+
+請用繁體中文條列：
+- 顧客的需求與偏好（使用情境、尺寸、預算、材質、過敏等）
+- 已推薦或查詢過的商品，以及提到的價格、尺寸與規格
+- 已回答過的問題與結論
+- 尚未解決的問題
+
+只輸出摘要內容，不要加上其他說明。
+
+<messages>
+{messages}
+</messages>"""
+
+
+def _count_tokens(messages) -> int:
+    return sum(message_tokens(message) for message in messages)
+
+
+_summarizer = None
+_in_progress = set()
+_tasks = set()
+
+
+def get_summarizer():
+    """Get or create the summarization middleware used for compaction."""
+    global _summarizer
+    if _summarizer is None:
+        _summarizer = SummarizationMiddleware(
+            model=ChatOpenAI(model="gpt-4o-mini", temperature=0),
+            trigger=("tokens", COMPACTION_TRIGGER_TOKENS),
+            keep=("tokens", COMPACTION_KEEP_TOKENS),
+            token_counter=_count_tokens,
+            summary_prompt=SUMMARY_PROMPT,
+        )
+    return _summarizer
+
+
+async def _thread_ttl_seconds(checkpointer, thread_id: str):
+    """
+    Remaining TTL of a thread in the Redis checkpointer.
+
+    Reads the TTL of the latest-checkpoint pointer directly: aget_state() would
+    refresh the TTL (refresh_on_read) and hide an about-to-expire thread.
+
+    Returns:
+        Seconds left, -1 for no expiry, -2 for a missing thread, None when unknown (non-Redis checkpointer)
+    """
+    redis_client = getattr(checkpointer, "_redis", None)
+    if redis_client is None or not hasattr(checkpointer, "_make_redis_checkpoint_latest_key"):
+        return None
+    return await redis_client.ttl(checkpointer._make_redis_checkpoint_latest_key(thread_id, ""))
+
+
+async def compact_thread(agent, config) -> bool:
+    """
+    Fold older turns of a thread into a summary if it is over the token threshold.
+
+    Returns:
+        Whether the thread was compacted
+    """
+    thread_id = config["configurable"]["thread_id"]
+
+    ttl = await _thread_ttl_seconds(agent.checkpointer, thread_id)
+    if ttl is not None and (ttl == -2 or 0 <= ttl < COMPACTION_MIN_TTL_SECONDS):
+        logger.info("compaction_skipped_ttl", thread_id=thread_id, ttl=ttl)
+        return False
+
+    state = await agent.aget_state(config)
+    messages = state.values.get("messages", [])
+    if state.next or not messages:
+        # A turn is still in progress (or the thread is empty)
+        return False
+
+    update = await get_summarizer().abefore_model({"messages": messages}, None)
+    if update is None:
+        return False
+
+    # Optimistic concurrency: don't overwrite a turn that arrived while summarizing
+    latest = await agent.aget_state(config)
+    if latest.config["configurable"].get("checkpoint_id") != state.config["configurable"].get("checkpoint_id"):
+        logger.info("compaction_skipped_concurrent_turn", thread_id=thread_id)
+        return False
+
+    await agent.aupdate_state(config, update, as_node="model")
+    logger.info(
+        "thread_compacted",
+        thread_id=thread_id,
+        messages_before=len(messages),
+        messages_after=len(update["messages"]) - 1,
+        tokens_before=_count_tokens(messages),
+        tokens_after=_count_tokens(update["messages"][1:]),
+    )
+    return True
+
+
+async def _run_compaction(agent, config):
+    thread_id = config["configurable"]["thread_id"]
+    try:
+        await compact_thread(agent, config)
+    except Exception as e:
+        logger.warning("compaction_failed", thread_id=thread_id, error=str(e))
+    finally:
+        _in_progress.discard(thread_id)
+
+
+def schedule_compaction(agent, config):
+    """
+    Start a background compaction for the thread (no-op if disabled, no
+    checkpointer, or a compaction for this thread is already running).
+    """
+    if not COMPACTION_ENABLED or agent.checkpointer is None:
+        return None
+    thread_id = config["configurable"]["thread_id"]
+    if thread_id in _in_progress:
+        return None
+    _in_progress.add(thread_id)
+    task = asyncio.create_task(_run_compaction(agent, config))
+    # Keep a reference so the task isn't garbage collected mid-flight
+    _tasks.add(task)
+    task.add_done_callback(_tasks.discard)
+    return task
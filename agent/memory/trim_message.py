@@ -1,27 +1,138 @@
 from langchain.agents.middleware.types import before_model, AgentState
 from langchain.agents.middleware import SummarizationMiddleware
 from langgraph.graph.message import RemoveMessage, REMOVE_ALL_MESSAGES
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
 from langchain_core.messages.utils import trim_messages, count_tokens_approximately
+from functools import lru_cache
 from typing import Any
+from dotenv import load_dotenv
+import structlog
+import tiktoken
+import json
+import zlib
+import os
 
-MAX_CONVERSATION_LENGTH = 25
+logger = structlog.get_logger()
+load_dotenv()
 
-# Create middleware for message trimming
-@before_model
-def trim_messages_middleware(state: AgentState, runtime: Any = None) -> dict[str, any] | None:
-    """Trim messages before model call to stay within token limits."""
-    trimmed_messages = trim_messages(
-        state["messages"],
-        max_tokens=MAX_CONVERSATION_LENGTH,  # Rough estimate (adjust as needed)
+# Token budget for the conversation history sent to the model (system prompt excluded)
+MAX_CONTEXT_TOKENS = int(os.getenv("MAX_CONTEXT_TOKENS", "16000"))
+# gpt-4o / gpt-4o-mini tokenizer
+TOKENIZER_ENCODING = "o200k_base"
+# OpenAI chat format overhead per message (role + separators)
+TOKENS_PER_MESSAGE = 3
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """Load the tokenizer once; None when the BPE file cannot be downloaded (offline)."""
+    try:
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning("tiktoken unavailable, using approximate token counts", error=str(e))
+        return None
+
+
+def _token_count_key():
+    encoding = _get_encoding()
+    return f"token_count:{encoding.name if encoding is not None else 'approx'}"
+
+
+def _message_text(message: BaseMessage) -> str:
+    if isinstance(message.content, str):
+        return message.content
+    return "".join(block.get("text", "") if isinstance(block, dict) else str(block) for block in message.content)
+
+
+def _message_fingerprint(message: BaseMessage) -> int:
+    """CRC32 of the counted content (text and tool calls): far cheaper than tokenizing, and stable across processes."""
+    fingerprint = zlib.crc32(_message_text(message).encode("utf-8"))
+    if isinstance(message, AIMessage) and message.tool_calls:
+        fingerprint = zlib.crc32(json.dumps(message.tool_calls, ensure_ascii=False, sort_keys=True).encode("utf-8"), fingerprint)
+    return fingerprint
+
+
+def _count_message_tokens(message: BaseMessage) -> int:
+    encoding = _get_encoding()
+    if encoding is None:
+        return count_tokens_approximately([message])
+
+    text = _message_text(message)
+    tokens = TOKENS_PER_MESSAGE + len(encoding.encode(text, disallowed_special=()))
+    if isinstance(message, AIMessage):
+        for tool_call in message.tool_calls:
+            tokens += len(encoding.encode(tool_call["name"] + json.dumps(tool_call["args"], ensure_ascii=False), disallowed_special=()))
+    return tokens
+
+
+def message_tokens(message: BaseMessage) -> int:
+    """
+    Token count of a message, computed once and memoized in its response_metadata.
+
+    The count is stored with the message, so it is also persisted by the
+    checkpointer and each model step only tokenizes the messages added since
+    the previous step. It is keyed by a fingerprint of the content, so a message
+    edited after it was counted (or copied with its metadata) is counted again.
+    """
+    key = _token_count_key()
+    fingerprint = _message_fingerprint(message)
+    cached = message.response_metadata.get(key)
+    if isinstance(cached, dict) and cached.get("fingerprint") == fingerprint:
+        return cached["tokens"]
+
+    tokens = _count_message_tokens(message)
+    message.response_metadata[key] = {"tokens": tokens, "fingerprint": fingerprint}
+    return tokens
+
+
+def trim_history(messages, max_tokens: int = MAX_CONTEXT_TOKENS):
+    """Return the messages to keep: the most recent ones within the token budget, starting on a human turn."""
+    kept = trim_messages(
+        messages,
+        max_tokens=max_tokens,
         strategy="last",  # Keep most recent
-        token_counter=len,  # Simple counter
+        token_counter=message_tokens,  # Per-message, memoized
         include_system=True,  # Always keep system prompts
         allow_partial=False,  # Don't split messages
         start_on="human",  # ← KEY: Prevents incomplete tool calls!
     )
-    # Return trimmed messages to be used by the model
-    # return {"messages": trimmed_messages}
+    if not any(isinstance(message, HumanMessage) for message in kept):
+        # The current turn alone is over budget (e.g. a huge tool result): keep the
+        # whole turn rather than sending the model an empty conversation
+        last_human = max((i for i, message in enumerate(messages) if isinstance(message, HumanMessage)), default=0)
+        kept = messages[last_human:]
+    return kept
+
+
+def trim_delta(messages, kept_messages) -> dict[str, Any] | None:
+    """
+    Minimal state update turning `messages` into `kept_messages`.
 
-    return {
-        "messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *trimmed_messages]
-    }
\ No newline at end of file
+    Returns None when nothing changed, otherwise one RemoveMessage per evicted
+    message ID, so the checkpointer only writes the removals instead of the whole list.
+    Removals can only express "the same messages, minus some, in the same order":
+    anything else (missing IDs, reordered or new messages) is a full rewrite.
+    """
+    ids = [message.id for message in messages]
+    kept_ids = [message.id for message in kept_messages]
+    if kept_ids == ids and None not in ids:
+        return None
+    if None in ids or None in kept_ids or not _is_subsequence(kept_ids, ids):
+        return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *kept_messages]}
+
+    kept_set = set(kept_ids)
+    return {"messages": [RemoveMessage(id=message.id) for message in messages if message.id not in kept_set]}
+
+
+def _is_subsequence(items: list, sequence: list) -> bool:
+    """Whether `items` appear in `sequence` in the same relative order."""
+    remaining = iter(sequence)
+    return all(item in remaining for item in items)
+
+
+# Create middleware for message trimming
+@before_model
+def trim_messages_middleware(state: AgentState, runtime: Any = None) -> dict[str, Any] | None:
+    """Trim messages before model call to stay within the token budget (no state update when under budget)."""
+    messages = state["messages"]
+    return trim_delta(messages, trim_history(messages))
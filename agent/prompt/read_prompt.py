@@ -1,9 +1,15 @@
+import os
+
+# Resolved relative to this file so the prompt loads from any working directory
+PROMPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
 def read_prompt_template(prompt_path: str) -> str:
     with open(prompt_path, 'r', encoding='utf-8') as f:
         template = f.read()
     return template
 
-SYSTEM_PROMPT_TEMPLATE = read_prompt_template("agent/prompt/system_prompt.md")
+SYSTEM_PROMPT_TEMPLATE = read_prompt_template(os.path.join(PROMPT_DIR, "system_prompt.md"))
 
 
 if __name__ == "__main__":
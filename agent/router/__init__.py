@@ -0,0 +1 @@
+# Agent intent router package
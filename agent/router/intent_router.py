@@ -0,0 +1,373 @@
+"""
+Local intent router: a fast path for pure catalog lookups.
+
+Questions like "羽絨被有哪些?" or "6*7 的蠶絲被價格" are deterministic filters
+over the catalog, but through the ReAct loop they cost two gpt-4o-mini round
+trips. The router matches the message against a dictionary built from the
+product data (categories, product names, sizes) plus price patterns, and
+scores how much of the message those entities and a few lookup phrases
+explain. A confident, fully structured question is answered directly from
+filter_products with a templated answer. Negated or exclusive questions
+("非羽絨被有哪些", "除了羽絨被以外") are never classified as lookups, since the
+filters would select exactly the products the user ruled out.
+
+INTENT_ROUTER_MODE:
+    off     router disabled (default)
+    shadow  classify every first-turn question, always run the agent, and log
+            whether the agent's tool calls agreed with the router
+    on      serve confident questions from the fast path, agent otherwise
+
+Every decision (with the agent's tool calls and latency when the agent ran)
+is appended to INTENT_ROUTER_LOG_PATH as JSON lines; see
+benchmarks/intent_router_report.py for accuracy / latency reporting.
+"""
+from dotenv import load_dotenv
+from typing import Dict, List, Optional
+import structlog
+import asyncio
+import json
+import os
+import re
+import time
+import unicodedata
+
+from data.product_data.product_data import PRODUCT_DATA
+from rag.search_data import afilter_products
+
+logger = structlog.get_logger()
+load_dotenv()
+
+INTENT_ROUTER_MODE = os.getenv("INTENT_ROUTER_MODE", "off")
+# Minimum share of the question explained by catalog entities and lookup phrases
+INTENT_ROUTER_THRESHOLD = float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.8"))
+INTENT_ROUTER_LOG_PATH = os.getenv("INTENT_ROUTER_LOG_PATH", "logs/intent_router.jsonl")
+
+FILTER_ARGS = ("category", "product_name", "price_min", "price_max", "size")
+
+# 代表「列出 / 查價」的問法
+LOOKUP_PHRASES = (
+    "有哪些", "有什麼", "有哪幾款", "哪幾款", "有幾款", "有幾種", "列出",
+    "多少錢", "價格", "價錢", "售價", "尺寸", "規格",
+)
+# 可以忽略的語助詞與客套話
+FILLER_PHRASES = (
+    "請問", "你們", "妳們", "您們", "目前", "現在", "全部", "所有", "一下",
+    "商品", "產品", "棉被", "被子", "請", "有", "的", "嗎", "呢", "啊", "呀",
+    "吧", "我", "想", "要", "看", "查", "款", "種", "是", "和", "跟", "與",
+)
+# 否定 / 排除：「非羽絨被」「不要羽絨被」「除了羽絨被以外」要的是其他商品，不能照字面過濾
+NEGATION_PATTERN = re.compile(r"[不非沒没無无別别]|除了|除外|以外|之外|排除|\b(?:not|no|except|without|exclud\w*)\b")
+# Confidence multiplier when the question has entities but no lookup phrase ("羽絨被")
+NO_LOOKUP_PHRASE_PENALTY = 0.75
+
+SIZE_PATTERN = re.compile(r"(\d)\s*(?:\*|x|×|乘)\s*(\d)")
+PRICE_AMOUNT = r"(\d{3,6})\s*(?:元|塊)?"
+PRICE_RANGE_PATTERN = re.compile(PRICE_AMOUNT + r"\s*(?:到|至|~|-)\s*" + PRICE_AMOUNT + r"(?:之間)?")
+PRICE_MAX_PATTERN = re.compile(r"(?:低於|少於|小於|不超過|預算)\s*" + PRICE_AMOUNT + r"|" + PRICE_AMOUNT + r"\s*(?:以下|以內|內)")
+PRICE_MIN_PATTERN = re.compile(r"(?:高於|大於|超過)\s*" + PRICE_AMOUNT + r"|" + PRICE_AMOUNT + r"\s*以上")
+NON_WORD_PATTERN = re.compile(r"[\W_]+")
+
+# Variant price values written by data_to_docs.create_variants
+PRICE_STATUS_LABELS = {
+    "Price hasn't yet been listed": "價格未列出",
+    "Product isn't available yet": "尚未上架",
+}
+
+
+def normalize_text(text: str) -> str:
+    """NFKC (full-width digits and symbols) and lowercase."""
+    return unicodedata.normalize("NFKC", text).lower()
+
+
+def _name_aliases(name: str) -> List[str]:
+    """Surface forms of a product name: as listed, and without its (型號) suffix."""
+    full = normalize_text(name)
+    short = re.sub(r"\s*\(.*?\)\s*", "", full).strip()
+    return [full, full.replace(" ", "")] + ([short] if short and short != full else [])
+
+
+def _agent_filters(tool_calls: List[Dict]) -> Optional[Dict]:
+    """
+    Structured filters the agent used in a turn.
+
+    Returns:
+        The filter args when every tool call was a product tool with the same
+        filters, otherwise None (FAQ lookups, mixed or unfiltered searches)
+    """
+    filters = None
+    for tool_call in tool_calls:
+        if tool_call["name"] not in ("filter_product_tool", "search_product_tool"):
+            return None
+        call_filters = {arg: tool_call["args"][arg] for arg in FILTER_ARGS if tool_call["args"].get(arg) is not None}
+        if not call_filters or (filters is not None and call_filters != filters):
+            return None
+        filters = call_filters
+    return filters
+
+
+def _format_price(variant: Dict) -> str:
+    price = variant.get("price")
+    if isinstance(price, int):
+        text = f"{price:,} 元"
+    elif price is None:
+        text = "依斤計價"
+    else:
+        text = PRICE_STATUS_LABELS.get(price, str(price))
+    if variant.get("weight"):
+        return f"{variant['weight']}：{text}"
+    return text
+
+
+def render_answer(products: List[Dict], filters: Dict) -> str:
+    """
+    Templated answer for a catalog lookup.
+
+    Args:
+        products: filter_products results
+        filters: Filters the products were selected with
+    """
+    conditions = []
+    if filters.get("product_name"):
+        conditions.append(filters["product_name"])
+    elif filters.get("category"):
+        conditions.append(filters["category"])
+    if filters.get("size"):
+        conditions.append(f"{filters['size']} 尺寸")
+    if filters.get("price_min") is not None and filters.get("price_max") is not None:
+        conditions.append(f"{filters['price_min']:,}～{filters['price_max']:,} 元")
+    elif filters.get("price_min") is not None:
+        conditions.append(f"{filters['price_min']:,} 元以上")
+    elif filters.get("price_max") is not None:
+        conditions.append(f"{filters['price_max']:,} 元以下")
+
+    lines = [f"您好～好眠羊幫您整理了符合「{'、'.join(conditions)}」的商品，共 {len(products)} 款 🐑", ""]
+    for number, product in enumerate(products, 1):
+        lines.append(f"{number}. **{product['product_name']}**（{product['category']}）")
+        for variant in product.get("variants") or []:
+            if filters.get("size") and variant.get("size") not in (filters["size"], "custom"):
+                continue
+            size = "依重量" if variant.get("size") == "custom" else variant.get("size")
+            lines.append(f"   - {size}：{_format_price(variant)}")
+    lines += ["", "如果想了解材質、保暖度或挑選建議，歡迎再告訴我！"]
+    return "\n".join(lines)
+
+
+class IntentRouter:
+    """
+    Rule-based catalog lookup classifier with a fast-path answerer.
+
+    Args:
+        products: Raw product data the entity dictionary is built from
+        threshold: Minimum confidence to take the fast path
+        mode: "shadow" or "on" (see module docstring)
+        log_path: JSON lines decision log ("" to disable)
+    """
+
+    def __init__(
+        self,
+        products: List[Dict] = PRODUCT_DATA,
+        threshold: float = INTENT_ROUTER_THRESHOLD,
+        mode: str = INTENT_ROUTER_MODE,
+        log_path: str = INTENT_ROUTER_LOG_PATH,
+    ):
+        self.threshold = threshold
+        self.mode = mode
+        self.log_path = log_path
+
+        # surface form -> (field, value); value None marks an alias shared by several products
+        entities = {}
+        categories = {}
+        for product in products:
+            entities[normalize_text(product["category"])] = ("category", product["category"])
+            categories[product["product_name"]] = product["category"]
+        for name in categories:
+            for alias in _name_aliases(name):
+                previous = entities.get(alias)
+                if previous is not None and previous != ("product_name", name):
+                    entities[alias] = ("product_name", None)
+                else:
+                    entities[alias] = ("product_name", name)
+        # Longest first so "康適木棉蠶絲被" wins over the category "蠶絲被"
+        self._entities = sorted(entities.items(), key=lambda item: len(item[0]), reverse=True)
+        self._product_categories = categories
+        self._sizes = {size for product in products for size in product.get("sizes") or []}
+        self._stats = {"decisions": 0, "confident": 0, "served": 0, "fallback_empty": 0, "agree": 0, "disagree": 0}
+
+    def classify(self, question: str) -> Dict:
+        """
+        Extract catalog filters from a question and score the match.
+
+        Returns:
+            Dict with filters (None when not expressible as one filter query),
+            confidence in [0, 1] and a short reason
+        """
+        text = normalize_text(question)
+        consumed = [False] * len(text)
+        filters = {}
+
+        def take(start, end):
+            if any(consumed[start:end]):
+                return False
+            consumed[start:end] = [True] * (end - start)
+            return True
+
+        def reject(reason):
+            return {"filters": None, "confidence": 0.0, "reason": reason}
+
+        for alias, (field, value) in self._entities:
+            start = text.find(alias)
+            while start != -1:
+                if take(start, start + len(alias)):
+                    if value is None:
+                        return reject("ambiguous_product")
+                    if filters.get(field, value) != value:
+                        return reject(f"multiple_{field}")
+                    filters[field] = value
+                start = text.find(alias, start + len(alias))
+
+        for match in SIZE_PATTERN.finditer(text):
+            size = f"{match.group(1)}*{match.group(2)}"
+            if size not in self._sizes:
+                return reject("unknown_size")
+            if filters.get("size", size) != size:
+                return reject("multiple_size")
+            take(*match.span())
+            filters["size"] = size
+
+        for match in PRICE_RANGE_PATTERN.finditer(text):
+            if take(*match.span()):
+                low, high = sorted((int(match.group(1)), int(match.group(2))))
+                filters["price_min"], filters["price_max"] = low, high
+        for pattern, field in ((PRICE_MAX_PATTERN, "price_max"), (PRICE_MIN_PATTERN, "price_min")):
+            for match in pattern.finditer(text):
+                if take(*match.span()):
+                    if field in filters:
+                        return reject(f"multiple_{field}")
+                    filters[field] = int(next(group for group in match.groups() if group))
+
+        if not filters:
+            return reject("no_catalog_entity")
+        if "product_name" in filters and "category" in filters:
+            if self._product_categories[filters["product_name"]] != filters["category"]:
+                return reject("conflicting_category")
+
+        residual = "".join(char for char, used in zip(text, consumed) if not used)
+        # The filters would select exactly what the user ruled out
+        if NEGATION_PATTERN.search(residual):
+            return reject("negation")
+        has_lookup_phrase = any(phrase in residual for phrase in LOOKUP_PHRASES)
+        for phrase in LOOKUP_PHRASES + FILLER_PHRASES:
+            residual = residual.replace(phrase, "")
+        residual = NON_WORD_PATTERN.sub("", residual)
+        total = len(NON_WORD_PATTERN.sub("", text))
+
+        confidence = 1 - len(residual) / total if total else 0.0
+        if not has_lookup_phrase:
+            confidence *= NO_LOOKUP_PHRASE_PENALTY
+        return {"filters": filters, "confidence": round(confidence, 3), "reason": "catalog_lookup" if residual == "" else "unexplained_text"}
+
+    async def adecide(self, question: str) -> Dict:
+        """
+        Classify a question and, when confident, prepare the fast-path answer.
+
+        Returns:
+            Decision dict: question, filters, confidence, reason, confident,
+            answer (None unless the fast path can serve it) and router_ms
+        """
+        start = time.perf_counter()
+        decision = {"question": question, **self.classify(question)}
+        decision["confident"] = decision["filters"] is not None and decision["confidence"] >= self.threshold
+        decision["answer"] = None
+        if decision["confident"]:
+            products = await afilter_products(**decision["filters"], limit=100)
+            # An empty result is answered by the agent (it can suggest alternatives)
+            if products and products[0].get("score", 0) > 0:
+                decision["answer"] = render_answer(products, decision["filters"])
+        decision["router_ms"] = round((time.perf_counter() - start) * 1000, 2)
+
+        self._stats["decisions"] += 1
+        self._stats["confident"] += decision["confident"]
+        if decision["confident"] and decision["answer"] is None:
+            self._stats["fallback_empty"] += 1
+        return decision
+
+    def should_serve(self, decision: Dict) -> bool:
+        """Whether the fast-path answer replaces the agent for this decision."""
+        return self.mode == "on" and decision["answer"] is not None
+
+    async def arecord(self, decision: Dict, served: bool, agent_tool_calls: Optional[List[Dict]] = None, agent_ms: Optional[float] = None):
+        """
+        Log a decision, with the agent's tool calls and latency when the agent ran.
+
+        Args:
+            decision: Result of adecide
+            served: Whether the fast-path answer was returned to the user
+            agent_tool_calls: [{"name", "args"}] of the agent's tool calls in this turn
+            agent_ms: Agent latency for this turn
+        """
+        record = {
+            "ts": time.time(),
+            "mode": self.mode,
+            "question": decision["question"],
+            "filters": decision["filters"],
+            "confidence": decision["confidence"],
+            "reason": decision["reason"],
+            "confident": decision["confident"],
+            "served": served,
+            "router_ms": decision["router_ms"],
+            "agent_ms": agent_ms,
+            "agent_tool_calls": agent_tool_calls,
+        }
+        if agent_tool_calls is not None:
+            record["agent_filters"] = _agent_filters(agent_tool_calls)
+            record["agree"] = decision["filters"] is not None and record["agent_filters"] == decision["filters"]
+            if decision["confident"]:
+                self._stats["agree" if record["agree"] else "disagree"] += 1
+        self._stats["served"] += served
+
+        logger.info(
+            "intent_router_decision",
+            mode=self.mode,
+            confidence=decision["confidence"],
+            reason=decision["reason"],
+            served=served,
+            agree=record.get("agree"),
+            router_ms=decision["router_ms"],
+            agent_ms=agent_ms,
+        )
+        if self.log_path:
+            await asyncio.to_thread(self._append, record)
+
+    def _append(self, record: Dict):
+        try:
+            os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+            with open(self.log_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.warning("intent_router_log_failed", path=self.log_path, error=str(e))
+
+    def stats(self):
+        """
+        Router counters.
+
+        Returns:
+            Dict with decision counters and shadow agreement rate of confident decisions
+        """
+        stats = dict(self._stats)
+        compared = stats["agree"] + stats["disagree"]
+        stats["agreement_rate"] = stats["agree"] / compared if compared else 0.0
+        return stats
+
+
+# ========== SINGLETON ROUTER ==============
+_intent_router = None
+
+
+def get_intent_router():
+    """Get the shared intent router, or None when INTENT_ROUTER_MODE is off."""
+    global _intent_router
+    if INTENT_ROUTER_MODE not in ("shadow", "on"):
+        return None
+    if _intent_router is None:
+        _intent_router = IntentRouter()
+    return _intent_router
@@ -0,0 +1,204 @@
+"""
+Speculative retrieval prefetch (opt-in with PREFETCH_ENABLED=true).
+
+For most user messages the first model call only decides to call
+search_product_tool or search_faq_tool with roughly the user's text. When a
+new user turn reaches the model, this middleware starts hybrid searches on the
+raw message for both collections at the same moment, so retrieval overlaps the
+planning call. When the tool call arrives and its query is close enough to the
+user's text (CJK bigram Jaccard similarity) and uses no structured filters, the
+tool is answered from the prefetched results instead of searching again.
+
+Hits, misses (by reason) and the latency saved are counted and exposed via
+GET /chatbot/prefetch_stats/.
+"""
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import HumanMessage, ToolMessage
+from dotenv import load_dotenv
+from typing import Dict
+import structlog
+import asyncio
+import json
+import time
+import os
+
+from rag.local_fulltext import tokenize
+from rag.search_data import asearch_qa_data, asearch_product_data
+
+logger = structlog.get_logger()
+load_dotenv()
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "false").lower() == "true"
+# Minimum bigram Jaccard similarity between the tool query and the user message
+PREFETCH_SIMILARITY = float(os.getenv("PREFETCH_SIMILARITY", "0.5"))
+MAX_PENDING_TURNS = 1024
+
+# Tool name -> search run speculatively on the raw user message
+PREFETCH_SEARCHES = {
+    "search_faq_tool": lambda text: asearch_qa_data(text),
+    "search_product_tool": lambda text: asearch_product_data(query=text),
+}
+# search_product_tool arguments that change the search; prefetched results are unfiltered
+PRODUCT_FILTER_ARGS = ("category", "product_name", "price_min", "price_max", "size")
+
+
+def _tool_content(result):
+    """Tool output as ToolMessage content, stringified like the tool node does (JSON, non-ASCII kept)."""
+    # Strings and empty results are valid message content as they are
+    if isinstance(result, str) or result == []:
+        return result
+    try:
+        return json.dumps(result, ensure_ascii=False)
+    except (TypeError, ValueError):
+        return str(result)
+
+
+def query_similarity(a: str, b: str) -> float:
+    """Jaccard similarity of the CJK-bigram / word token sets of two queries."""
+    tokens_a, tokens_b = set(tokenize(a)), set(tokenize(b))
+    if not tokens_a or not tokens_b:
+        return 0.0
+    return len(tokens_a & tokens_b) / len(tokens_a | tokens_b)
+
+
+class _Prefetch:
+    """Prefetched searches for one user message."""
+
+    def __init__(self, text: str):
+        self.text = text
+        self.start = time.perf_counter()
+        self.finished_at: Dict[str, float] = {}
+        self.tasks = {name: asyncio.create_task(self._run(name, search(text))) for name, search in PREFETCH_SEARCHES.items()}
+        for task in self.tasks.values():
+            # Unused prefetches may fail unobserved; retrieve the exception to avoid asyncio warnings
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _run(self, name: str, coroutine):
+        try:
+            return await coroutine
+        finally:
+            self.finished_at[name] = time.perf_counter()
+
+    def cancel(self):
+        for task in self.tasks.values():
+            task.cancel()
+
+
+class SpeculativePrefetchMiddleware(AgentMiddleware):
+    """
+    Start retrieval for the user's message alongside the planning call and
+    serve matching tool calls from it.
+
+    Args:
+        similarity: Minimum query similarity for serving a tool call from the prefetch
+    """
+
+    def __init__(self, similarity: float = PREFETCH_SIMILARITY):
+        super().__init__()
+        self.similarity = similarity
+        self._turns: Dict[str, _Prefetch] = {}
+        self._stats = {
+            "prefetches": 0,
+            "hits": 0,
+            "miss_dissimilar": 0,
+            "miss_filtered": 0,
+            "miss_failed": 0,
+            "saved_seconds": 0.0,
+        }
+
+    @staticmethod
+    def _last_human(messages):
+        for message in reversed(messages):
+            if isinstance(message, HumanMessage):
+                return message
+        return None
+
+    async def abefore_model(self, state, runtime):
+        messages = state["messages"]
+        # Only the planning call of a new turn: the last message is the user's
+        if not messages or not isinstance(messages[-1], HumanMessage) or messages[-1].id in self._turns:
+            return None
+        text = messages[-1].text
+        if not text.strip():
+            return None
+        if len(self._turns) >= MAX_PENDING_TURNS:
+            self._turns.pop(next(iter(self._turns))).cancel()
+        self._turns[messages[-1].id] = _Prefetch(text)
+        self._stats["prefetches"] += 1
+        return None
+
+    async def aafter_agent(self, state, runtime):
+        human = self._last_human(state["messages"])
+        prefetch = self._turns.pop(human.id, None) if human is not None else None
+        if prefetch is not None:
+            prefetch.cancel()
+        return None
+
+    async def awrap_tool_call(self, request, handler):
+        tool_call = request.tool_call
+        name = tool_call["name"]
+        if name not in PREFETCH_SEARCHES:
+            return await handler(request)
+
+        human = self._last_human(request.state.get("messages", []))
+        prefetch = self._turns.get(human.id) if human is not None else None
+        if prefetch is None:
+            return await handler(request)
+
+        args = tool_call["args"]
+        if any(args.get(arg) is not None for arg in PRODUCT_FILTER_ARGS):
+            self._stats["miss_filtered"] += 1
+            return await handler(request)
+        similarity = query_similarity(args.get("query", ""), prefetch.text)
+        if similarity < self.similarity:
+            self._stats["miss_dissimilar"] += 1
+            return await handler(request)
+
+        requested_at = time.perf_counter()
+        try:
+            result = await prefetch.tasks[name]
+        except Exception as e:
+            self._stats["miss_failed"] += 1
+            logger.warning("prefetch_failed", tool=name, error=str(e))
+            return await handler(request)
+
+        # Latency saved = search time that already happened before the tool call arrived
+        finished_at = prefetch.finished_at.get(name, requested_at)
+        saved = min(finished_at, requested_at) - prefetch.start
+        self._stats["hits"] += 1
+        self._stats["saved_seconds"] += saved
+        logger.info("prefetch_hit", tool=name, similarity=round(similarity, 2), saved_ms=round(saved * 1000, 1))
+        # Same ToolMessage the tool itself would have produced for this output
+        return ToolMessage(
+            content=_tool_content(result),
+            tool_call_id=tool_call["id"],
+            name=name,
+            status="success",
+        )
+
+    def stats(self):
+        """
+        Prefetch hit rate and latency saved.
+
+        Returns:
+            Dict with counters, hit_rate over eligible tool calls and avg_saved_ms per hit
+        """
+        stats = dict(self._stats)
+        lookups = stats["hits"] + stats["miss_dissimilar"] + stats["miss_filtered"] + stats["miss_failed"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["avg_saved_ms"] = stats["saved_seconds"] / stats["hits"] * 1000 if stats["hits"] else 0.0
+        return stats
+
+
+# ========== SINGLETON MIDDLEWARE ==============
+_prefetch_middleware = None
+
+
+def get_prefetch_middleware():
+    """Get the shared prefetch middleware, or None when PREFETCH_ENABLED is false."""
+    global _prefetch_middleware
+    if not PREFETCH_ENABLED:
+        return None
+    if _prefetch_middleware is None:
+        _prefetch_middleware = SpeculativePrefetchMiddleware()
+    return _prefetch_middleware
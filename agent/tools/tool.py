@@ -1,13 +1,13 @@
 from langchain_core.tools import tool
 from typing import List, Dict, Any, Optional, Literal
 
-from rag.search_data import search_qa_data, search_product_data, filter_products
+from rag.search_data import asearch_qa_data, asearch_product_data, afilter_products
 from data.product_data.product_data import PRODUCT_CATEGORIES, PRODUCT_NAME
 from agent.tools.tool_schema import ProductSearchSchema, ProductFilterSchema
 
 
 @tool("search_faq_tool")
-def rag_search(query: str) -> List[Dict[str, Any]]:
+async def rag_search(query: str) -> List[Dict[str, Any]]:
     """
     📚 General Knowledge & Non-Product Queries.
     
@@ -18,11 +18,11 @@ def rag_search(query: str) -> List[Dict[str, Any]]:
     
     ⛔ HARD STOP: If user asks for prices, specs, or any product related information, DO NOT use this.
     """
-    rag_data = search_qa_data(query)
+    rag_data = await asearch_qa_data(query)
     return rag_data
 
 @tool("search_product_tool", args_schema=ProductSearchSchema)
-def product_search(
+async def product_search(
     query: str,
     category: Optional[Literal[*PRODUCT_CATEGORIES]] = None,
     product_name: Optional[Literal[*PRODUCT_NAME]] = None,
@@ -42,7 +42,7 @@ def product_search(
         query: Descriptive/subjective part of user's question about product features, recommendations, or needs.
         category, product_name, price_min, price_max, size: Only set if user EXPLICITLY mentions them.
     """
-    return search_product_data(
+    return await asearch_product_data(
         query=query,
         category=category,
         product_name=product_name,
@@ -52,7 +52,7 @@ def product_search(
     )
 
 @tool("filter_product_tool", args_schema=ProductFilterSchema)
-def product_filter(
+async def product_filter(
     category: Optional[Literal[PRODUCT_CATEGORIES]] = None,
     product_name: Optional[Literal[PRODUCT_NAME]] = None,
     price_min: Optional[int] = None,
@@ -67,7 +67,7 @@ def product_filter(
     Args:
         category, product_name, price_min, price_max, size: Only set parameters that user EXPLICITLY mentions.
     """
-    return filter_products(
+    return await afilter_products(
         category=category,
         product_name=product_name,
         price_min=price_min,
@@ -0,0 +1,206 @@
+"""
+Concurrency, timeouts and tracing for tool calls within one agent step.
+
+When the model emits several tool calls in one message (e.g. search_product_tool
+for two categories plus search_faq_tool), the async ToolNode starts them together
+with asyncio.gather and returns the ToolMessages in the original call order.
+This middleware bounds how many of them run at once per step, gives each call a
+timeout (a timed-out call returns an error ToolMessage instead of stalling the
+step), and logs per-call offsets plus a per-step summary so the overlap is
+visible in the logs (LangSmith already shows the tool runs side by side).
+Each call's duration is also recorded in the chatbot_tool_seconds histogram.
+
+SingleFlightToolMiddleware lets identical retrieval calls (same tool and
+normalized arguments) from concurrent conversations share one in-flight run.
+"""
+from langchain.agents.middleware import AgentMiddleware
+from langchain_core.messages import ToolMessage
+from dotenv import load_dotenv
+from typing import Dict, Optional
+import structlog
+import asyncio
+import json
+import time
+import os
+
+from agent.cache.semantic_cache import normalize_question
+from agent.cache.single_flight import SingleFlight, SINGLE_FLIGHT_ENABLED
+from metrics import TOOL_SECONDS
+
+logger = structlog.get_logger()
+load_dotenv()
+
+# Max tool calls of one agent step running at the same time
+TOOL_MAX_CONCURRENCY = int(os.getenv("TOOL_MAX_CONCURRENCY", "4"))
+# Default per-call timeout; per tool overrides with TOOL_TIMEOUTS="search_faq_tool=10,search_product_tool=20"
+TOOL_TIMEOUT_SECONDS = float(os.getenv("TOOL_TIMEOUT_SECONDS", "20"))
+TOOL_TIMEOUTS = {
+    name.strip(): float(seconds)
+    for name, seconds in (item.split("=") for item in os.getenv("TOOL_TIMEOUTS", "").split(",") if "=" in item)
+}
+# Read-only retrieval tools whose identical in-flight calls can share one result
+SINGLE_FLIGHT_TOOLS = ("search_faq_tool", "search_product_tool", "filter_product_tool")
+
+
+class _Step:
+    """Bookkeeping for the tool calls issued by one AI message."""
+
+    def __init__(self, calls: int, max_concurrency: int):
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.pending = calls
+        self.calls = calls
+        self.start = time.perf_counter()
+        self.busy_seconds = 0.0
+
+
+class ToolConcurrencyMiddleware(AgentMiddleware):
+    """
+    Bound concurrent tool calls per step and apply per-tool timeouts.
+
+    Args:
+        max_concurrency: Max tool calls of one step running at once
+        timeout_seconds: Default timeout per tool call
+        timeouts: Per tool name timeout overrides
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = TOOL_MAX_CONCURRENCY,
+        timeout_seconds: float = TOOL_TIMEOUT_SECONDS,
+        timeouts: Optional[Dict[str, float]] = None,
+    ):
+        super().__init__()
+        self.max_concurrency = max_concurrency
+        self.timeout_seconds = timeout_seconds
+        self.timeouts = {**TOOL_TIMEOUTS, **(timeouts or {})}
+        self._steps: Dict[str, _Step] = {}
+
+    def _get_step(self, request):
+        messages = request.state.get("messages", []) if isinstance(request.state, dict) else []
+        ai_message = messages[-1] if messages else None
+        step_id = getattr(ai_message, "id", None) or request.tool_call["id"]
+        step = self._steps.get(step_id)
+        if step is None:
+            calls = len(getattr(ai_message, "tool_calls", None) or []) or 1
+            step = self._steps[step_id] = _Step(calls, self.max_concurrency)
+        return step_id, step
+
+    def _finish_call(self, step_id: str, step: _Step, duration: float):
+        step.busy_seconds += duration
+        step.pending -= 1
+        if step.pending <= 0:
+            self._steps.pop(step_id, None)
+            wall = time.perf_counter() - step.start
+            logger.info(
+                "tool_step",
+                calls=step.calls,
+                wall_ms=round(wall * 1000, 1),
+                sum_ms=round(step.busy_seconds * 1000, 1),
+                overlap=round(step.busy_seconds / wall, 2) if wall else 1.0,
+            )
+
+    def wrap_tool_call(self, request, handler):
+        # Sync agents (agent.invoke) already run tool calls in a thread pool; only log timing
+        start = time.perf_counter()
+        status = "error"
+        try:
+            result = handler(request)
+            status = getattr(result, "status", "success")
+            return result
+        finally:
+            duration = time.perf_counter() - start
+            logger.info("tool_call", tool=request.tool_call["name"], duration_ms=round(duration * 1000, 1))
+            TOOL_SECONDS.labels(tool=request.tool_call["name"], status=status).observe(duration)
+
+    async def awrap_tool_call(self, request, handler):
+        tool_call = request.tool_call
+        name = tool_call["name"]
+        timeout = self.timeouts.get(name, self.timeout_seconds)
+        step_id, step = self._get_step(request)
+
+        start = None
+        status = "cancelled"
+        try:
+            async with step.semaphore:
+                start = time.perf_counter()
+                try:
+                    result = await asyncio.wait_for(handler(request), timeout)
+                    # ToolMessage status is "success" / "error" (a Command has none)
+                    status = getattr(result, "status", "success")
+                    return result
+                except asyncio.TimeoutError:
+                    status = "timeout"
+                    logger.warning("tool_call_timeout", tool=name, timeout_seconds=timeout)
+                    return ToolMessage(
+                        content=f"工具 {name} 執行逾時（{timeout:g} 秒），請稍後再試或改用其他方式回答。",
+                        tool_call_id=tool_call["id"],
+                        name=name,
+                        status="error",
+                    )
+                except Exception:
+                    status = "error"
+                    raise
+        finally:
+            # Also runs when the step is cancelled while this call waits for the semaphore
+            duration = time.perf_counter() - start if start is not None else 0.0
+            if start is not None:
+                logger.info(
+                    "tool_call",
+                    tool=name,
+                    step_offset_ms=round((start - step.start) * 1000, 1),
+                    duration_ms=round(duration * 1000, 1),
+                )
+                TOOL_SECONDS.labels(tool=name, status=status).observe(duration)
+            self._finish_call(step_id, step, duration)
+
+
+def tool_call_key(tool_call) -> str:
+    """Tool name plus arguments with normalized string values, in a stable order."""
+    args = {
+        name: normalize_question(value) if isinstance(value, str) else value
+        for name, value in tool_call["args"].items()
+        if value is not None
+    }
+    return tool_call["name"] + ":" + json.dumps(args, sort_keys=True, ensure_ascii=False)
+
+
+class SingleFlightToolMiddleware(AgentMiddleware):
+    """
+    Share one in-flight run between identical retrieval tool calls.
+
+    Args:
+        tool_names: Tools eligible for sharing (must be side-effect free)
+    """
+
+    def __init__(self, tool_names=SINGLE_FLIGHT_TOOLS):
+        super().__init__()
+        self.tool_names = set(tool_names)
+        self.flights = SingleFlight("tool")
+
+    async def awrap_tool_call(self, request, handler):
+        tool_call = request.tool_call
+        if tool_call["name"] not in self.tool_names:
+            return await handler(request)
+
+        leader, result = await self.flights.do(tool_call_key(tool_call), lambda: handler(request))
+        if leader:
+            return result
+        if not isinstance(result, ToolMessage):
+            # Commands are tied to the calling graph; run the tool for this call
+            return await handler(request)
+        # Same content answered for this call (fresh id so the message isn't merged with the leader's)
+        return result.model_copy(update={"tool_call_id": tool_call["id"], "id": None})
+
+
+# ========== SINGLETON MIDDLEWARE ==============
+_single_flight_middleware = None
+
+
+def get_single_flight_tool_middleware():
+    """Get the shared single-flight tool middleware, or None when SINGLE_FLIGHT_ENABLED is false."""
+    global _single_flight_middleware
+    if not SINGLE_FLIGHT_ENABLED:
+        return None
+    if _single_flight_middleware is None:
+        _single_flight_middleware = SingleFlightToolMiddleware()
+    return _single_flight_middleware
@@ -3,23 +3,39 @@ Main FastAPI Application for YiChin Chatbot System
 
 Provides OpenAI-compatible chat endpoints for chatbot integration.
 """
+import time
 
+# Cold-start time is measured from here (imports included)
+PROCESS_START = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
 import structlog
 
 from api.routers import chatbot_response
-# Agent is automatically initialized when imported
-from agent.agent import agent
+from api.warmup import start_warm_up, stop_warm_up, get_warmup_state
+from metrics import METRICS_ENABLED, render_metrics
 
 # Initialize logger
 logger = structlog.get_logger()
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the agent, checkpointer, Mongo clients and retrievers before serving
+    await start_warm_up(PROCESS_START)
+    yield
+    await stop_warm_up()
+
+
 # Create FastAPI app
 app = FastAPI(
     title="YiChin Chatbot API",
     version="1.0.0",
     description="億進寢具 Chatbot API with RAG and conversation memory",
+    lifespan=lifespan,
 )
 
 # CORS middleware (for web frontends)
@@ -43,7 +59,9 @@ async def root():
         "status": "running",
         "endpoints": {
             "chat": "/chatbot/get_agent_answer/",
-            "health": "/health"
+            "health": "/health",
+            "ready": "/ready",
+            "metrics": "/metrics"
         }
     }
 
@@ -52,3 +70,19 @@ async def health_check():
     """Health check endpoint for Docker"""
     return {"status": "healthy", "service": "yichin-chatbot"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint: 200 only after this worker finished warm-up, 503 before"""
+    state = get_warmup_state()
+    return JSONResponse(
+        status_code=200 if state["ready"] else 503,
+        content={"status": "ready" if state["ready"] else "warming_up", **state},
+    )
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus metrics: per-stage latency histograms and counters of the chat pipeline"""
+    if not METRICS_ENABLED:
+        return JSONResponse(status_code=404, content={"detail": "Metrics are disabled (METRICS_ENABLED=false)"})
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
@@ -0,0 +1,56 @@
+"""
+Capture of incoming chat questions for offline load tests.
+
+With REQUEST_CAPTURE_PATH set, every chat request is appended to that JSON
+lines file as {"ts", "endpoint", "question", "thread"}, and
+benchmarks/load_test.py replays the file. The thread is a hash of the
+user's uuid, so follow-up questions replay in the same conversation without
+storing the id itself. REQUEST_CAPTURE_SAMPLE_RATE keeps only a share of the
+conversations (sampling is per thread, so conversations stay complete).
+"""
+from dotenv import load_dotenv
+import structlog
+import asyncio
+import hashlib
+import json
+import os
+import time
+
+logger = structlog.get_logger()
+load_dotenv()
+
+# Empty: capture is off
+REQUEST_CAPTURE_PATH = os.getenv("REQUEST_CAPTURE_PATH", "")
+REQUEST_CAPTURE_SAMPLE_RATE = float(os.getenv("REQUEST_CAPTURE_SAMPLE_RATE", "1.0"))
+
+
+def _thread_hash(uuid: str) -> str:
+    return hashlib.sha256(uuid.encode("utf-8")).hexdigest()[:16]
+
+
+def _append(record: dict):
+    try:
+        os.makedirs(os.path.dirname(REQUEST_CAPTURE_PATH) or ".", exist_ok=True)
+        with open(REQUEST_CAPTURE_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    except OSError as e:
+        logger.warning("request_capture_failed", path=REQUEST_CAPTURE_PATH, error=str(e))
+
+
+async def capture_request(endpoint: str, question: str, uuid: str):
+    """
+    Append a chat request to REQUEST_CAPTURE_PATH (no-op when capture is off).
+
+    Args:
+        endpoint: "invoke" or "stream"
+        question: The user's question
+        uuid: Conversation thread ID (stored hashed)
+    """
+    if not REQUEST_CAPTURE_PATH:
+        return
+    thread = _thread_hash(uuid)
+    # Same threads are always kept or always dropped
+    if int(thread[:8], 16) / 0xFFFFFFFF >= REQUEST_CAPTURE_SAMPLE_RATE:
+        return
+    record = {"ts": time.time(), "endpoint": endpoint, "question": question, "thread": thread}
+    await asyncio.to_thread(_append, record)
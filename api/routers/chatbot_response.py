@@ -4,19 +4,50 @@ Chat completion router - OpenAI-compatible endpoints
 
 from fastapi import HTTPException, APIRouter, Query
 from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
 import asyncio
 import json
+import time
 import structlog
 
-from agent.agent_response import get_agent_answer, get_agent_answer_stream
+from agent.agent_response import get_agent_answer, astream_agent_events
+from agent.batch import run_batch, BATCH_MAX_CONCURRENCY, BATCH_MAX_ITEMS
+from agent.admission import AdmissionRejected, admit, get_admission_controller
+from api.streaming import sse_stream
+from api.request_capture import capture_request
+from agent.cache.semantic_cache import get_semantic_cache
+from agent.tools.prefetch import get_prefetch_middleware
+from agent.router.intent_router import get_intent_router
+from agent.cache.single_flight import get_answer_single_flight
+from agent.tools.tool_middleware import get_single_flight_tool_middleware
+from metrics import REQUEST_ERRORS
 from langsmith import uuid7
 
 logger = structlog.get_logger()
 
 router = APIRouter()
 
+
+def _overloaded(e: AdmissionRejected) -> HTTPException:
+    """429 for a request the admission controller did not admit."""
+    return HTTPException(
+        status_code=429,
+        detail="目前詢問人數眾多，請稍後再試。",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+async def _release_when_done(frames, ticket):
+    """Pass the SSE frames through and free the admission slot when the stream ends."""
+    try:
+        async for frame in frames:
+            yield frame
+    finally:
+        if ticket is not None:
+            ticket.release()
+
 # 取得 response
 @router.get("/get_agent_answer/")
 async def get_agent_answer_api(
@@ -34,8 +65,10 @@ async def get_agent_answer_api(
             logger.warning("invalid_input_empty_question", input=question)
             raise HTTPException(status_code=400, detail="問題內容不可為空。")
         
-        # Get answer from global agent
-        answer = await get_agent_answer(user_request=question, uuid=user_id)
+        await capture_request("invoke", question, user_id)
+        # Get answer from global agent (waits for an admission slot)
+        async with admit(user_id, "invoke"):
+            answer = await get_agent_answer(user_request=question, uuid=user_id)
         
         return {
             "answer": answer,
@@ -45,8 +78,11 @@ async def get_agent_answer_api(
 
     except HTTPException as http_exc:
         raise http_exc
+    except AdmissionRejected as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.exception("exception_in_answer", error=str(e))
+        REQUEST_ERRORS.labels(endpoint="invoke").inc()
         raise HTTPException(status_code=500, detail=f"伺服器內部錯誤：{str(e)}")
 
 @router.get("/get_agent_answer_stream/")
@@ -64,35 +100,136 @@ async def get_agent_answer_stream_api(
             logger.warning("invalid_input_empty_question", input=question)
             raise HTTPException(status_code=400, detail="問題內容不可為空。")
         
-        async def generate():
-            """Generator function for streaming tokens"""
-            try:
-                async for token in get_agent_answer_stream(
-                    user_request=question, 
-                    uuid=user_id
-                ):
-                    # Format as Server-Sent Events (SSE)
-                    # Format: data: <json>\n\n
-                    yield f"data: {json.dumps({'token': token, 'uuid': user_id}, ensure_ascii=False)}\n\n"
-                
-                # Send completion signal
-                yield f"data: {json.dumps({'done': True, 'uuid': user_id}, ensure_ascii=False)}\n\n"
-            except Exception as e:
-                logger.exception("exception_in_stream", error=str(e))
-                yield f"data: {json.dumps({'error': str(e)}, ensure_ascii=False)}\n\n"
-        
+        await capture_request("stream", question, user_id)
+        # Admit before the response starts so an overloaded server can still answer 429
+        admission = get_admission_controller()
+        ticket = await admission.acquire(user_id, "stream") if admission is not None else None
         return StreamingResponse(
-            generate(),
+            _release_when_done(sse_stream(astream_agent_events(user_request=question, uuid=user_id), user_id), ticket),
             media_type="text/event-stream",
             headers={
                 "Cache-Control": "no-cache",
                 "Connection": "keep-alive",
                 "X-Accel-Buffering": "no",  # Disable nginx buffering
-            }
+            },
+            # Also frees the slot when the client disconnects before the stream starts
+            background=BackgroundTask(ticket.release) if ticket is not None else None,
         )
     
     except HTTPException as http_exc:
         raise http_exc
+    except AdmissionRejected as e:
+        raise _overloaded(e)
     except Exception as e:
         logger.exception("exception_in_stream_endpoint", error=str(e))
-        raise HTTPException(status_code=500, detail=f"伺服器內部錯誤：{str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"伺服器內部錯誤：{str(e)}")
+
+class BatchItem(BaseModel):
+    question: str
+    uuid: Optional[str] = None  # Conversation thread; without it the question is answered statelessly
+    id: Optional[str] = None  # Echoed back to match results to questions
+
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+    concurrency: int = BATCH_MAX_CONCURRENCY
+
+
+async def _ndjson_results(items: List[Dict[str, Any]], concurrency: int):
+    """One JSON line per answered item (in completion order), then a summary line."""
+    start = time.perf_counter()
+    errors = shared = 0
+    async for result in run_batch(items, concurrency):
+        errors += "error" in result
+        shared += result["shared"]
+        yield json.dumps(result, ensure_ascii=False) + "\n"
+    yield json.dumps({
+        "done": True,
+        "count": len(items),
+        "errors": errors,
+        "shared": shared,
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 2),
+    }) + "\n"
+
+
+# 批次回答 (NDJSON)
+@router.post("/batch_answer/")
+async def batch_answer_api(request: BatchRequest):
+    """
+    Answer many questions in one request; results stream back as NDJSON lines as they complete.
+    Items without uuid are answered without conversation memory, identical ones only once.
+    """
+    if not request.items:
+        raise HTTPException(status_code=400, detail="問題列表不可為空。")
+    if len(request.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=400, detail=f"一次最多只能送出 {BATCH_MAX_ITEMS} 個問題。")
+    if any(not item.question for item in request.items):
+        logger.warning("invalid_input_empty_question_in_batch")
+        raise HTTPException(status_code=400, detail="問題內容不可為空。")
+
+    items = [item.model_dump() for item in request.items]
+    return StreamingResponse(
+        _ndjson_results(items, request.concurrency),
+        media_type="application/x-ndjson",
+        headers={"X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/cache_stats/")
+async def get_cache_stats_api():
+    """
+    Semantic answer cache hit/miss counters (for tuning SEMANTIC_CACHE_THRESHOLD).
+    """
+    cache = get_semantic_cache()
+    if cache is None:
+        return {"enabled": False}
+    try:
+        return await cache.stats()
+    except Exception as e:
+        logger.exception("exception_in_cache_stats", error=str(e))
+        raise HTTPException(status_code=500, detail=f"伺服器內部錯誤：{str(e)}")
+
+
+@router.get("/prefetch_stats/")
+async def get_prefetch_stats_api():
+    """
+    Speculative retrieval prefetch hit rate and saved latency (for tuning PREFETCH_SIMILARITY).
+    """
+    prefetch = get_prefetch_middleware()
+    if prefetch is None:
+        return {"enabled": False}
+    return {"enabled": True, **prefetch.stats()}
+
+
+@router.get("/router_stats/")
+async def get_router_stats_api():
+    """
+    Intent router fast-path counters and shadow agreement rate (for tuning INTENT_ROUTER_THRESHOLD).
+    """
+    intent_router = get_intent_router()
+    if intent_router is None:
+        return {"enabled": False}
+    return {"enabled": True, "mode": intent_router.mode, **intent_router.stats()}
+
+
+@router.get("/admission_stats/")
+async def get_admission_stats_api():
+    """
+    In-flight requests, queue depth and rejections of the admission controller (for tuning ADMISSION_*).
+    """
+    admission = get_admission_controller()
+    if admission is None:
+        return {"enabled": False}
+    return {"enabled": True, **admission.stats()}
+
+
+@router.get("/single_flight_stats/")
+async def get_single_flight_stats_api():
+    """
+    How many answers and tool calls joined an identical in-flight run.
+    """
+    answer_flights = get_answer_single_flight()
+    tool_middleware = get_single_flight_tool_middleware()
+    if answer_flights is None:
+        return {"enabled": False}
+    return {"enabled": True, "answers": answer_flights.stats(), "tools": tool_middleware.flights.stats()}
@@ -0,0 +1,196 @@
+"""
+Server-Sent Events framing for the streaming chat endpoint.
+
+The agent yields (event_type, payload) tuples (see agent.agent_response.astream_agent_events):
+    ("token", "好")                          answer text
+    ("tool_start", {"tool": "search_product_tool"})
+    ("tool_end", {"tool": "search_product_tool"})
+
+sse_stream() turns them into SSE frames. Token frames keep the original
+`data: {"token": ..., "uuid": ...}` shape so existing clients keep working;
+tool events are sent as named events (`event: tool_start` with a display
+label, `event: tool_end`), which EventSource clients that only listen to
+`message` ignore.
+
+With SSE_COALESCE_MODE=window, consecutive tokens (often one or two CJK
+characters each) are merged into one frame and flushed after
+SSE_COALESCE_WINDOW_MS (on a timer, also when the model stalls) or once
+SSE_COALESCE_MAX_BYTES are buffered. The first token of each answer segment
+is sent immediately so time-to-first-byte does not pay the window.
+
+The time each frame takes to reach the client connection is recorded in
+chatbot_sse_flush_seconds.
+"""
+from dotenv import load_dotenv
+from collections import deque
+from typing import Any, AsyncIterator, Optional, Tuple
+import structlog
+import asyncio
+import json
+import os
+import time
+
+from metrics import REQUEST_ERRORS, SSE_FLUSH_SECONDS, SSE_FRAMES
+
+logger = structlog.get_logger()
+load_dotenv()
+
+# "off": one frame per model chunk, "window": coalesce tokens by time window / size
+SSE_COALESCE_MODE = os.getenv("SSE_COALESCE_MODE", "window")
+SSE_COALESCE_WINDOW_MS = float(os.getenv("SSE_COALESCE_WINDOW_MS", "30"))
+SSE_COALESCE_MAX_BYTES = int(os.getenv("SSE_COALESCE_MAX_BYTES", "256"))
+
+# 工具執行中顯示給使用者的文字
+TOOL_LABELS = {
+    "search_product_tool": "查詢商品中…",
+    "filter_product_tool": "篩選商品中…",
+    "search_faq_tool": "查詢資料中…",
+}
+DEFAULT_TOOL_LABEL = "查詢中…"
+
+
+def sse_frame(data: dict, event: Optional[str] = None) -> str:
+    """Format one SSE frame."""
+    payload = json.dumps(data, ensure_ascii=False)
+    if event is None:
+        return f"data: {payload}\n\n"
+    return f"event: {event}\ndata: {payload}\n\n"
+
+
+async def coalesce_tokens(
+    events: AsyncIterator[Tuple[str, Any]],
+    window_ms: float = SSE_COALESCE_WINDOW_MS,
+    max_bytes: int = SSE_COALESCE_MAX_BYTES,
+):
+    """
+    Merge consecutive token events.
+
+    Buffered tokens are flushed when max_bytes is reached, when the window
+    since the first buffered token has elapsed, or before any non-token event /
+    the end of the stream. The stream is read by one background task per
+    answer into a deque; while tokens are buffered the consumer waits for the
+    next chunk with a loop timer at the window's deadline, so a model that
+    stalls after a partial buffer still gets it flushed on time. (A bare
+    future + call_at per wait is much cheaper than a task or asyncio.Queue per
+    chunk.)
+
+    Args:
+        events: (event_type, payload) stream
+        window_ms: Flush buffered tokens once they are this old
+        max_bytes: Flush as soon as this many UTF-8 bytes are buffered
+    """
+    loop = asyncio.get_running_loop()
+    window = window_ms / 1000
+    buffer = []
+    buffered_bytes = 0
+    deadline = 0.0
+    send_next_token = True  # first token of a segment goes out immediately
+    chunks = deque()
+    finished = False
+    error = None
+    waiter = None
+
+    def wake(_=None):
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def read():
+        nonlocal finished, error
+        try:
+            async for event in events:
+                chunks.append(event)
+                wake()
+        except Exception as e:
+            error = e
+        finally:
+            finished = True
+            wake()
+
+    reader = loop.create_task(read())
+    try:
+        while True:
+            while chunks:
+                event = chunks.popleft()
+                if event[0] != "token":
+                    if buffer:
+                        yield "token", "".join(buffer)
+                        buffer, buffered_bytes = [], 0
+                    send_next_token = True
+                    yield event
+                    continue
+
+                if send_next_token:
+                    send_next_token = False
+                    yield event
+                    continue
+
+                now = loop.time()
+                if not buffer:
+                    deadline = now + window
+                buffer.append(event[1])
+                buffered_bytes += len(event[1].encode("utf-8"))
+                if buffered_bytes >= max_bytes or now >= deadline:
+                    yield "token", "".join(buffer)
+                    buffer, buffered_bytes = [], 0
+
+            if finished:
+                if error is not None:
+                    raise error
+                break
+
+            waiter = loop.create_future()
+            timer = loop.call_at(deadline, wake) if buffer else None
+            await waiter
+            waiter = None
+            if timer is not None:
+                timer.cancel()
+            if buffer and not chunks and loop.time() >= deadline:
+                # The model stalled: send what the window has collected
+                yield "token", "".join(buffer)
+                buffer, buffered_bytes = [], 0
+
+        if buffer:
+            yield "token", "".join(buffer)
+    finally:
+        # The client went away mid-answer: stop reading the agent stream
+        reader.cancel()
+
+
+async def sse_stream(events: AsyncIterator[Tuple[str, Any]], uuid: str, mode: str = SSE_COALESCE_MODE, **coalesce_kwargs):
+    """
+    Render an agent event stream as SSE frames, ending with a done (or error) frame.
+
+    Args:
+        events: (event_type, payload) stream from the agent
+        uuid: Conversation thread ID echoed in every frame
+        mode: "window" to coalesce tokens, "off" for one frame per chunk
+        coalesce_kwargs: window_ms / max_bytes overrides
+    """
+    if mode == "window":
+        events = coalesce_tokens(events, **coalesce_kwargs)
+    frames = {}
+    try:
+        async for event_type, payload in events:
+            if event_type == "token":
+                frame = sse_frame({"token": payload, "uuid": uuid})
+            else:
+                data = {**payload, "uuid": uuid}
+                if event_type == "tool_start":
+                    data["label"] = TOOL_LABELS.get(payload.get("tool"), DEFAULT_TOOL_LABEL)
+                frame = sse_frame(data, event=event_type)
+            # The response resumes this generator once the frame was sent to the client
+            start = time.perf_counter()
+            yield frame
+            SSE_FLUSH_SECONDS.observe(time.perf_counter() - start)
+            frames[event_type] = frames.get(event_type, 0) + 1
+
+        # Send completion signal
+        yield sse_frame({"done": True, "uuid": uuid})
+    except Exception as e:
+        logger.exception("exception_in_stream", error=str(e))
+        REQUEST_ERRORS.labels(endpoint="stream").inc()
+        yield sse_frame({"error": str(e)})
+    finally:
+        # Counted per stream rather than per frame (a labels() lookup costs more than the frame count)
+        for event_type, count in frames.items():
+            SSE_FRAMES.labels(event=event_type).inc(count)
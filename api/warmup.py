@@ -0,0 +1,136 @@
+"""
+Eager warm-up of the API process.
+
+Without warm-up the agent, the Redis checkpointer, the Mongo clients and the
+hybrid retrievers are all created lazily, so the first user after every
+deploy or restart pays for them. The FastAPI lifespan hook calls
+start_warm_up(), which builds everything before the worker accepts traffic
+(uvicorn workers share one socket, so a worker must not start accepting while
+cold). Startup waits at most WARMUP_TIMEOUT_SECONDS; failed steps (e.g. Redis
+not up yet) keep being retried in the background, and GET /ready returns 503
+until every step succeeded.
+
+Each uvicorn worker is its own process with its own singletons, so every
+worker warms up independently.
+"""
+from dotenv import load_dotenv
+import structlog
+import asyncio
+import os
+import time
+
+from agent.agent import initialize_agent
+from agent.cache.semantic_cache import get_semantic_cache
+from rag.catalog_index import aget_catalog_index
+from rag.mongo_db_utils.vector_store_utils import get_mongo_client, get_async_mongo_client
+from rag.redis_utils import get_async_redis_client
+from rag.search_data import warm_up_retrievers, CATALOG_BACKEND
+
+logger = structlog.get_logger()
+load_dotenv()
+
+# false: keep the lazy behaviour (first request initializes everything)
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+# Max time startup blocks on warm-up before serving (warm-up continues in the background)
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "30"))
+WARMUP_RETRY_SECONDS = float(os.getenv("WARMUP_RETRY_SECONDS", "10"))
+
+_state = {
+    "ready": False,
+    "mode": "eager" if WARMUP_ENABLED else "lazy",
+    "attempts": 0,
+    "steps_ms": {},
+    "errors": {},
+    "cold_start_ms": None,
+}
+_warmup_task = None
+
+
+async def _ping_mongo():
+    await get_async_mongo_client().admin.command("ping")
+    await asyncio.to_thread(get_mongo_client().admin.command, "ping")
+
+
+async def _ping_redis():
+    await get_async_redis_client().ping()
+
+
+def _warmup_steps():
+    steps = {
+        "agent": initialize_agent,  # LLM client + Redis checkpointer
+        "mongo": _ping_mongo,
+        "retrievers": lambda: asyncio.to_thread(warm_up_retrievers),
+    }
+    if CATALOG_BACKEND == "memory":
+        steps["catalog_index"] = aget_catalog_index
+    if get_semantic_cache() is not None:
+        steps["redis_cache"] = _ping_redis
+    return steps
+
+
+async def _run_step(name: str, step) -> bool:
+    start = time.perf_counter()
+    try:
+        await step()
+    except Exception as e:
+        _state["errors"][name] = str(e)
+        logger.warning("warmup_step_failed", step=name, error=str(e))
+        return False
+    _state["steps_ms"][name] = round((time.perf_counter() - start) * 1000, 1)
+    _state["errors"].pop(name, None)
+    return True
+
+
+async def warm_up(process_start: float) -> bool:
+    """
+    Run every warm-up step that hasn't succeeded yet (concurrently).
+
+    Args:
+        process_start: time.perf_counter() when the app module started importing
+
+    Returns:
+        Whether the process is ready
+    """
+    _state["attempts"] += 1
+    pending = {name: step for name, step in _warmup_steps().items() if name not in _state["steps_ms"]}
+    results = await asyncio.gather(*(_run_step(name, step) for name, step in pending.items()))
+    if all(results):
+        _state["ready"] = True
+        _state["cold_start_ms"] = round((time.perf_counter() - process_start) * 1000, 1)
+        logger.info("warmup_complete", cold_start_ms=_state["cold_start_ms"], steps_ms=_state["steps_ms"], pid=os.getpid())
+    return _state["ready"]
+
+
+async def _retry_until_ready(process_start: float):
+    while not await warm_up(process_start):
+        await asyncio.sleep(WARMUP_RETRY_SECONDS)
+
+
+async def start_warm_up(process_start: float):
+    """
+    Lifespan startup: warm up before serving (up to WARMUP_TIMEOUT_SECONDS),
+    retrying failed steps in the background.
+
+    Args:
+        process_start: time.perf_counter() when the app module started importing
+    """
+    global _warmup_task
+    if not WARMUP_ENABLED:
+        _state["ready"] = True
+        _state["cold_start_ms"] = round((time.perf_counter() - process_start) * 1000, 1)
+        return
+    _warmup_task = asyncio.create_task(_retry_until_ready(process_start))
+    done, _ = await asyncio.wait({_warmup_task}, timeout=WARMUP_TIMEOUT_SECONDS)
+    if not done:
+        logger.warning("warmup_not_finished", timeout_seconds=WARMUP_TIMEOUT_SECONDS, errors=_state["errors"])
+
+
+async def stop_warm_up():
+    """Lifespan shutdown: stop a still running warm-up."""
+    if _warmup_task is not None:
+        _warmup_task.cancel()
+
+
+def get_warmup_state():
+    """Readiness and per-step warm-up timings of this worker."""
+    return {**_state, "pid": os.getpid()}
@@ -0,0 +1,103 @@
+"""
+Measure API cold start: lazy initialization vs eager warm-up.
+
+For each mode a fresh uvicorn process is started (WARMUP_ENABLED=false /
+true) and we record:
+- time until the port answers /health
+- time until /ready returns 200 (the worker's own cold_start_ms is shown too)
+- latency of the first and second chat request
+
+With lazy initialization the first request pays for agent construction, the
+Redis checkpointer and the Mongo clients; with eager warm-up that cost moves
+before /ready, so a load balancer never routes users to a cold worker.
+
+Needs the same services as the API (.env: OpenAI, MongoDB, Redis). Use
+--no-request to only measure startup.
+
+Usage:
+    python -m benchmarks.bench_cold_start
+    python -m benchmarks.bench_cold_start --workers 2 --question "羽絨被怎麼洗"
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import httpx
+
+from logger import log_header, log_info, log_success, log_warning
+
+
+def wait_for(client, path, timeout):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            response = client.get(path)
+            if response.status_code == 200:
+                return response
+        except httpx.TransportError:
+            pass
+        time.sleep(0.05)
+    return None
+
+
+def timed_request(client, question, uuid):
+    start = time.perf_counter()
+    response = client.get("/chatbot/get_agent_answer/", params={"question": question, "uuid": uuid})
+    response.raise_for_status()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_mode(mode, args):
+    env = {**os.environ, "WARMUP_ENABLED": "true" if mode == "eager" else "false", "SEMANTIC_CACHE_ENABLED": "false"}
+    command = [sys.executable, "-m", "uvicorn", "api.main:app", "--host", "127.0.0.1", "--port", str(args.port), "--workers", str(args.workers)]
+    start = time.perf_counter()
+    server = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{args.port}", timeout=120) as client:
+            if wait_for(client, "/health", args.timeout) is None:
+                log_warning(f"{mode}: server did not start")
+                return None
+            listening_ms = (time.perf_counter() - start) * 1000
+            ready = wait_for(client, "/ready", args.timeout)
+            if ready is None:
+                log_warning(f"{mode}: /ready never returned 200 (check services in .env)")
+                return None
+            ready_ms = (time.perf_counter() - start) * 1000
+            result = {"listening_ms": listening_ms, "ready_ms": ready_ms, "worker_cold_start_ms": ready.json()["cold_start_ms"]}
+            if not args.no_request:
+                result["first_request_ms"] = timed_request(client, args.question, f"bench-cold-{mode}-1")
+                result["second_request_ms"] = timed_request(client, args.question, f"bench-cold-{mode}-2")
+    finally:
+        server.terminate()
+        server.wait()
+
+    log_info(
+        f"{mode:<5} listening={result['listening_ms']:7.0f} ms  ready={result['ready_ms']:7.0f} ms  "
+        f"(worker {result['worker_cold_start_ms']:.0f} ms)"
+        + (f"  first request={result['first_request_ms']:7.0f} ms  second={result['second_request_ms']:7.0f} ms" if not args.no_request else "")
+    )
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--question", default="棉被應該多久清洗一次？")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8598)
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for /health and /ready")
+    parser.add_argument("--no-request", action="store_true", help="Only measure startup")
+    args = parser.parse_args()
+
+    log_header(f"Cold start: {args.workers} worker(s)")
+    lazy = run_mode("lazy", args)
+    eager = run_mode("eager", args)
+    if lazy and eager and not args.no_request:
+        log_success(
+            f"First request: {lazy['first_request_ms']:.0f} ms lazy vs {eager['first_request_ms']:.0f} ms after warm-up "
+            f"(warm-up moved {eager['ready_ms'] - lazy['ready_ms']:.0f} ms before /ready)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Benchmark the local BM25 + vector hybrid search against the Atlas hybrid retriever.
+
+For each query both paths run with the same k and RRF penalties; we report
+latency percentiles per path and recall@k of the local results against the
+Atlas results (Atlas is treated as the reference ranking).
+
+Query embeddings are warmed up first so both paths hit the embedding cache and
+the numbers compare search cost only.
+
+Usage:
+    python -m benchmarks.bench_hybrid_search                 # Atlas vs local
+    python -m benchmarks.bench_hybrid_search --local-only    # offline latency only
+    python -m benchmarks.bench_hybrid_search --queries queries.txt --collection qa_collection
+"""
+from langchain_mongodb.retrievers import MongoDBAtlasHybridSearchRetriever
+from langchain_mongodb.vectorstores import MongoDBAtlasVectorSearch
+from dotenv import load_dotenv
+import argparse
+import os
+import statistics
+import time
+
+from rag.local_vector_store import LocalVectorStore
+from rag.local_fulltext import LocalHybridRetriever
+from rag.mongo_db_utils.vector_store_utils import get_collection, get_embedding_model, ATLAS_VECTOR_SEARCH_INDEX_NAME
+from logger import log_header, log_info, log_success
+
+load_dotenv()
+
+DEFAULT_QUERIES = [
+    "蠶絲被怎麼洗",
+    "6*7 羽絨被多少錢",
+    "康適四孔棉抗菌被有哪些尺寸？",
+    "適合過敏體質的棉被",
+    "冬天保暖的被子推薦",
+    "可以水洗的棉被",
+    "宿舍寢具怎麼選",
+    "枕頭高度怎麼挑",
+    "品牌故事",
+    "ESG 永續經營",
+    "幼兒園午睡寢具",
+    "DACRON 七孔被",
+]
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def _doc_key(doc):
+    return str(doc.metadata.get("_id") or doc.page_content)
+
+
+def _run(retriever, queries, repeats):
+    latencies = []
+    results = {}
+    for _ in range(repeats):
+        for query in queries:
+            start = time.perf_counter()
+            docs = retriever.invoke(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+            results[query] = [_doc_key(doc) for doc in docs]
+    return latencies, results
+
+
+def _report(name, latencies):
+    log_info(
+        f"{name:<8} p50={_percentile(latencies, 50):7.2f} ms  "
+        f"p95={_percentile(latencies, 95):7.2f} ms  "
+        f"mean={statistics.mean(latencies):7.2f} ms  (n={len(latencies)})"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--collection", default=os.getenv("QA_COLLECTION_NAME"))
+    parser.add_argument("--queries", help="File with one query per line")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--penalty", type=float, default=50)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--local-only", action="store_true", help="Skip the Atlas path (no network)")
+    args = parser.parse_args()
+
+    queries = DEFAULT_QUERIES
+    if args.queries:
+        with open(args.queries, encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    embedding = get_embedding_model()
+    log_header(f"Hybrid search benchmark: {args.collection} (k={args.k}, penalty={args.penalty})")
+
+    # Warm the embedding cache so only search cost is measured
+    embedding.embed_documents(queries)
+
+    local_store = LocalVectorStore(args.collection, embedding=embedding)
+    start = time.perf_counter()
+    local_store.fulltext_index
+    log_info(f"Built BM25 index over {len(local_store)} documents in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    local = LocalHybridRetriever(
+        vectorstore=local_store, k=args.k, vector_penalty=args.penalty, fulltext_penalty=args.penalty
+    )
+    local_latencies, local_results = _run(local, queries, args.repeats)
+    _report("local", local_latencies)
+
+    if args.local_only:
+        return
+
+    atlas = MongoDBAtlasHybridSearchRetriever(
+        vectorstore=MongoDBAtlasVectorSearch(
+            collection=get_collection(args.collection),
+            embedding=embedding,
+            index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
+            relevance_score_fn="cosine",
+        ),
+        search_index_name=os.getenv("SEARCH_INDEX_NAME", "search_index"),
+        k=args.k,
+        vector_penalty=args.penalty,
+        fulltext_penalty=args.penalty,
+        auto_create_index=False,
+    )
+    atlas_latencies, atlas_results = _run(atlas, queries, args.repeats)
+    _report("atlas", atlas_latencies)
+
+    recalls = []
+    for query in queries:
+        reference = set(atlas_results[query])
+        if reference:
+            recalls.append(len(reference & set(local_results[query])) / len(reference))
+    if recalls:
+        log_success(f"Local recall@{args.k} vs Atlas: {statistics.mean(recalls):.3f} over {len(recalls)} queries")
+    log_success(
+        f"Median speed-up: {_percentile(atlas_latencies, 50) / max(_percentile(local_latencies, 50), 1e-6):.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Import-time report for the repo's modules (python -X importtime per module).
+
+Each module is imported in a fresh interpreter whose working directory is a
+temporary directory and whose environment has no API keys or database URLs.
+That run checks two things: the import has no side effects that need
+network config or a CWD-relative file, and the import is fast. For every
+module we report the cumulative import time (best of --repeats runs), the
+process wall time, and the heaviest packages it pulls in.
+
+Use --record to append the results (with the git commit) to a JSON lines
+file, so startup time can be tracked over time. Use --budget-ms to fail
+(exit code 1) when a lightweight module gets slower than the budget.
+
+Usage:
+    python -m benchmarks.bench_import_time
+    python -m benchmarks.bench_import_time --record benchmarks/import_time.jsonl --budget-ms 1000
+    python -m benchmarks.bench_import_time --modules rag.search_data --top 15
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from logger import log_header, log_info, log_success, log_error, log_warning
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules used by scripts, tools and tests, which should import quickly
+LIGHT_MODULES = [
+    "data.product_data.product_data",
+    "data.product_data.data_to_docs",
+    "rag.search_data",
+    "rag.catalog_index",
+    "agent.router.intent_router",
+    "api.streaming",
+]
+# Modules that load LangChain agents / integrations (reported, not budgeted)
+HEAVY_MODULES = [
+    "agent.agent",
+    "api.main",
+    "rag.add_data_to_mongo",
+    "data.qa_data.website_to_docs",
+]
+REPO_PACKAGES = ("agent", "api", "rag", "data", "benchmarks", "logger")
+# Stripped from the child environment: importing must not need them
+SECRET_VARS = ("OPENAI_API_KEY", "MONGODB_URL", "MONGODB_URI", "REDIS_URL", "FIRECRAWL_API_KEY", "LANGSMITH_API_KEY")
+
+
+def parse_importtime(stderr: str):
+    """Parse -X importtime output into (cumulative_us, depth, module) rows."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cumulative), depth, name.strip()))
+    return rows
+
+
+def measure(module: str):
+    """Import a module once in a clean interpreter."""
+    env = {key: value for key, value in os.environ.items() if key not in SECRET_VARS}
+    env["PYTHONPATH"] = REPO_ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    with tempfile.TemporaryDirectory() as cwd:
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            cwd=cwd, env=env, capture_output=True, text=True,
+        )
+        wall_ms = (time.perf_counter() - start) * 1000
+
+    rows = parse_importtime(process.stderr)
+    if process.returncode != 0:
+        error = [line for line in process.stderr.splitlines() if not line.startswith("import time:")]
+        return {"module": module, "ok": False, "error": error[-1] if error else "failed", "wall_ms": wall_ms}
+
+    # The module's subtree: rows after the previous top-level import (interpreter startup)
+    end = max(index for index, (_, depth, name) in enumerate(rows) if name == module and depth == 0)
+    start = max([index + 1 for index, (_, depth, _) in enumerate(rows[:end]) if depth == 0], default=0)
+    subtree = rows[start:end + 1]
+    import_us = subtree[-1][0]
+    # Heaviest third-party packages pulled in, by cumulative time of their top-level import
+    packages = {
+        name: cumulative for cumulative, depth, name in subtree
+        if "." not in name and name not in REPO_PACKAGES
+    }
+    return {
+        "module": module,
+        "ok": True,
+        "import_ms": import_us / 1000,
+        "wall_ms": wall_ms,
+        "heaviest": sorted(((name, us / 1000) for name, us in packages.items()), key=lambda item: -item[1]),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modules", nargs="+", help="Modules to measure (default: light + heavy lists)")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per module (best is reported)")
+    parser.add_argument("--top", type=int, default=3, help="Heaviest packages shown per module")
+    parser.add_argument("--budget-ms", type=float, help="Fail if a light module's import exceeds this")
+    parser.add_argument("--record", help="Append results as a JSON line to this file")
+    args = parser.parse_args()
+
+    modules = args.modules or LIGHT_MODULES + HEAVY_MODULES
+    log_header(f"Import time ({len(modules)} modules, best of {args.repeats})")
+
+    results = []
+    over_budget = []
+    for module in modules:
+        runs = [measure(module) for _ in range(args.repeats)]
+        failed = [run for run in runs if not run["ok"]]
+        if failed:
+            log_error(f"{module:<34} import failed: {failed[0]['error']}")
+            results.append(failed[0])
+            continue
+        result = min(runs, key=lambda run: run["import_ms"])
+        results.append(result)
+        heaviest = ", ".join(f"{name} {ms:.0f}" for name, ms in result["heaviest"][:args.top])
+        log_info(f"{module:<34} import={result['import_ms']:7.0f} ms  process={result['wall_ms']:7.0f} ms  [{heaviest}]")
+        if args.budget_ms is not None and module in LIGHT_MODULES and result["import_ms"] > args.budget_ms:
+            over_budget.append(module)
+
+    if args.record:
+        record = {
+            "ts": time.time(),
+            "commit": git_commit(),
+            "python": sys.version.split()[0],
+            "results": {r["module"]: round(r["import_ms"], 1) if r["ok"] else None for r in results},
+        }
+        with open(args.record, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+        log_info(f"Recorded to {args.record}")
+
+    if any(not r["ok"] for r in results):
+        sys.exit(1)
+    if over_budget:
+        log_warning(f"Over the {args.budget_ms:.0f} ms budget: {', '.join(over_budget)}")
+        sys.exit(1)
+    log_success("All modules imported without network config")
+
+
+if __name__ == "__main__":
+    main()
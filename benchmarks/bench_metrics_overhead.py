@@ -0,0 +1,141 @@
+"""
+Microbenchmark of the Prometheus instrumentation overhead.
+
+Two measurements:
+1. Cost of one recording call (histogram labels().observe(), counter inc())
+   compared with the no-op metric used when METRICS_ENABLED=false.
+2. The instrumented hot paths with metrics on vs off, each in a fresh
+   interpreter (metrics are created at import): api.streaming.sse_stream
+   over a synthetic token stream (one flush observation per frame) and
+   ToolConcurrencyMiddleware.awrap_tool_call with an instant tool.
+
+The per-request estimate multiplies the per-call cost by the number of
+recordings of a typical streamed answer (--recordings-per-request) and
+compares it with --request-seconds.
+
+No external services are needed.
+
+Usage:
+    python -m benchmarks.bench_metrics_overhead
+    python -m benchmarks.bench_metrics_overhead --iterations 500000 --frames 20000
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import timeit
+
+from logger import log_header, log_info, log_success, log_warning
+
+
+def per_call_ns(statement: str, setup: str, iterations: int) -> float:
+    """Best of 5 runs, in nanoseconds per call."""
+    return min(timeit.repeat(statement, setup=setup, number=iterations, repeat=5)) / iterations * 1e9
+
+
+def measure_calls(iterations: int):
+    setup = (
+        "from metrics import TOOL_SECONDS, SSE_FLUSH_SECONDS, SSE_FRAMES, _NoopMetric\n"
+        "noop = _NoopMetric()"
+    )
+    return {
+        "histogram labels().observe()": per_call_ns(
+            "TOOL_SECONDS.labels(tool='search_product_tool', status='success').observe(0.1)", setup, iterations),
+        "histogram observe() (no labels)": per_call_ns("SSE_FLUSH_SECONDS.observe(0.0001)", setup, iterations),
+        "counter labels().inc()": per_call_ns("SSE_FRAMES.labels(event='token').inc()", setup, iterations),
+        "no-op labels().observe()": per_call_ns("noop.labels(tool='x', status='y').observe(0.1)", setup, iterations),
+    }
+
+
+async def _child(frames: int, tool_calls: int):
+    """Time the instrumented hot paths in this interpreter (run with METRICS_ENABLED set)."""
+    import time
+    from langchain_core.messages import AIMessage, ToolMessage
+    from langchain.agents.middleware.types import ToolCallRequest
+    from api.streaming import sse_stream
+    from agent.tools.tool_middleware import ToolConcurrencyMiddleware
+
+    async def events():
+        for _ in range(frames):
+            yield "token", "好"
+
+    start = time.perf_counter()
+    async for _ in sse_stream(events(), "bench", mode="off"):
+        pass
+    stream_seconds = time.perf_counter() - start
+
+    middleware = ToolConcurrencyMiddleware()
+    tool_call = {"name": "search_product_tool", "args": {"query": "涼被"}, "id": "call_0", "type": "tool_call"}
+    request = ToolCallRequest(
+        tool_call=tool_call, tool=None, state={"messages": [AIMessage(content="", tool_calls=[tool_call])]}, runtime=None,
+    )
+
+    async def handler(request):
+        return ToolMessage(content="[]", tool_call_id=request.tool_call["id"], name=request.tool_call["name"])
+
+    start = time.perf_counter()
+    for _ in range(tool_calls):
+        await middleware.awrap_tool_call(request, handler)
+    tool_seconds = time.perf_counter() - start
+
+    print(json.dumps({
+        "frame_us": stream_seconds / frames * 1e6,
+        "tool_call_us": tool_seconds / tool_calls * 1e6,
+    }))
+
+
+def run_child(enabled: bool, args):
+    env = {**os.environ, "METRICS_ENABLED": "true" if enabled else "false"}
+    env.pop("PROMETHEUS_MULTIPROC_DIR", None)
+    command = [sys.executable, "-m", "benchmarks.bench_metrics_overhead", "--child",
+               "--frames", str(args.frames), "--tool-calls", str(args.tool_calls)]
+    process = subprocess.run(command, env=env, capture_output=True, text=True, check=True)
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200000, help="Calls per timing run")
+    parser.add_argument("--frames", type=int, default=20000, help="SSE frames per hot-path run")
+    parser.add_argument("--tool-calls", type=int, default=2000, help="Tool calls per hot-path run")
+    parser.add_argument("--recordings-per-request", type=int, default=150,
+                        help="Metric recordings of a typical streamed answer (mostly one per SSE frame)")
+    parser.add_argument("--request-seconds", type=float, default=3.0, help="Typical answer latency")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        import structlog
+        # Tool-call logging is the same with and without metrics; keep it out of the output
+        structlog.configure(logger_factory=structlog.ReturnLoggerFactory())
+        asyncio.run(_child(args.frames, args.tool_calls))
+        return
+
+    log_header("Metric recording cost")
+    calls = measure_calls(args.iterations)
+    for name, ns in calls.items():
+        log_info(f"{name:<34} {ns:8.0f} ns")
+
+    log_header("Instrumented hot paths (metrics on vs off)")
+    enabled = run_child(True, args)
+    disabled = run_child(False, args)
+    for key, label in (("frame_us", "sse_stream per frame"), ("tool_call_us", "awrap_tool_call per call")):
+        delta = enabled[key] - disabled[key]
+        log_info(f"{label:<26} on={enabled[key]:8.2f} µs  off={disabled[key]:8.2f} µs  overhead={delta:+.2f} µs")
+
+    per_request_us = calls["histogram labels().observe()"] / 1000 * args.recordings_per_request
+    share = per_request_us / (args.request_seconds * 1e6) * 100
+    message = (
+        f"~{per_request_us:.0f} µs of recording per request ({args.recordings_per_request} recordings) "
+        f"= {share:.3f}% of a {args.request_seconds:g} s answer"
+    )
+    if share < 0.1:
+        log_success(message)
+    else:
+        log_warning(message)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+"""
+Benchmark SSE framing of the streaming endpoint: per-chunk frames vs coalescing.
+
+A synthetic agent event stream replays what gpt-4o-mini produces for a
+typical answer: a tool call, then hundreds of 1-2 character CJK chunks
+arriving every few milliseconds. The stream is rendered by
+api.streaming.sse_stream (the same code the endpoint uses) behind a
+StreamingResponse served by uvicorn in a separate process, and many clients
+read it concurrently. For each mode we report frames and bytes per answer,
+time to first byte, time to first answer token, total stream time and the
+server's CPU time.
+
+Only localhost is used; no external services are needed.
+
+Usage:
+    python -m benchmarks.bench_sse_stream
+    python -m benchmarks.bench_sse_stream --streams 500 --tokens 400 --window-ms 50
+"""
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+import argparse
+import asyncio
+import httpx
+import multiprocessing
+import random
+import statistics
+import time
+import uvicorn
+
+from api.streaming import sse_stream
+from logger import log_header, log_info, log_success
+
+ANSWER = "您好，這款天絲涼被採用萊賽爾纖維，觸感滑順透氣，適合夏季使用，可以直接放入洗衣袋以冷水輕柔洗滌。" * 20
+
+
+async def fake_agent_events(tokens: int, tool_seconds: float, token_gap_ms: float, seed: int):
+    rng = random.Random(seed)
+    yield "tool_start", {"tool": "search_product_tool"}
+    await asyncio.sleep(tool_seconds)
+    yield "tool_end", {"tool": "search_product_tool"}
+    position = 0
+    for _ in range(tokens):
+        size = rng.choice((1, 1, 2))
+        yield "token", ANSWER[position:position + size]
+        position += size
+        await asyncio.sleep(rng.uniform(0.5, 1.5) * token_gap_ms / 1000)
+
+
+def create_app(args):
+    """Minimal app serving the synthetic stream through sse_stream, like the chat endpoint."""
+    app = FastAPI()
+
+    @app.get("/stream")
+    async def stream(mode: str, seed: int):
+        events = fake_agent_events(args.tokens, args.tool_seconds, args.token_gap_ms, seed)
+        return StreamingResponse(
+            sse_stream(events, "bench", mode=mode, window_ms=args.window_ms, max_bytes=args.max_bytes),
+            media_type="text/event-stream",
+        )
+
+    @app.get("/cpu")
+    async def cpu():
+        return {"seconds": time.process_time()}
+
+    return app
+
+
+def serve(args):
+    uvicorn.run(create_app(args), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+async def consume(client, mode: str, seed: int):
+    start = time.perf_counter()
+    first_byte = first_token = None
+    body = []
+    async with client.stream("GET", "/stream", params={"mode": mode, "seed": seed}) as response:
+        async for chunk in response.aiter_text():
+            now = time.perf_counter()
+            if first_byte is None:
+                first_byte = now - start
+            if first_token is None and '"token"' in chunk:
+                first_token = now - start
+            body.append(chunk)
+    text = "".join(body)
+    return text.count("\n\n"), len(text.encode("utf-8")), first_byte, first_token, time.perf_counter() - start
+
+
+async def run_mode(mode: str, args):
+    limits = httpx.Limits(max_connections=args.streams)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60) as client:
+        cpu_start = (await client.get("/cpu")).json()["seconds"]
+        results = await asyncio.gather(*(consume(client, mode, seed) for seed in range(args.streams)))
+        server_cpu = (await client.get("/cpu")).json()["seconds"] - cpu_start
+    frames, sizes, ttfb, ttft, totals = zip(*results)
+    log_info(
+        f"{mode:<7} frames/answer={statistics.mean(frames):7.1f}  bytes/answer={statistics.mean(sizes):8.0f}  "
+        f"TTFB={statistics.mean(ttfb) * 1000:6.1f} ms  first token={statistics.mean(ttft) * 1000:6.1f} ms  "
+        f"total={statistics.mean(totals) * 1000:7.1f} ms  server CPU={server_cpu * 1000:7.0f} ms"
+    )
+    return statistics.mean(frames), server_cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=100, help="Concurrent streams")
+    parser.add_argument("--tokens", type=int, default=300, help="Model chunks per answer")
+    parser.add_argument("--token-gap-ms", type=float, default=8)
+    parser.add_argument("--tool-seconds", type=float, default=0.3)
+    parser.add_argument("--window-ms", type=float, default=30)
+    parser.add_argument("--max-bytes", type=int, default=256)
+    parser.add_argument("--port", type=int, default=8599)
+    args = parser.parse_args()
+
+    server = multiprocessing.Process(target=serve, args=(args,), daemon=True)
+    server.start()
+    time.sleep(2)
+    try:
+        log_header(f"SSE framing: {args.streams} concurrent streams x {args.tokens} chunks")
+        off_frames, off_cpu = asyncio.run(run_mode("off", args))
+        window_frames, window_cpu = asyncio.run(run_mode("window", args))
+    finally:
+        server.terminate()
+    log_success(
+        f"Coalescing: {off_frames / window_frames:.1f}x fewer frames, "
+        f"{off_cpu / max(window_cpu, 1e-9):.1f}x less server CPU"
+    )
+
+
+if __name__ == "__main__":
+    main()
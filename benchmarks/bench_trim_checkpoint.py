@@ -0,0 +1,147 @@
+"""
+Benchmark checkpoint write volume of the message trimming middleware.
+
+Runs the same multi-turn conversation (each turn: one tool call + one answer)
+through create_agent twice, once with the legacy middleware that returned
+RemoveMessage(REMOVE_ALL_MESSAGES) + every kept message on every model call,
+and once with the current trim_messages_middleware that only emits targeted
+removals. A counting checkpointer measures the serialized bytes and message
+objects written per turn.
+
+No network is needed: the chat model and the tool are fakes.
+
+Usage:
+    python -m benchmarks.bench_trim_checkpoint
+    python -m benchmarks.bench_trim_checkpoint --turns 40 --answer-chars 400
+"""
+from langchain.agents import create_agent
+from langchain.agents.middleware.types import before_model, AgentState
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.tools import tool
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph.message import RemoveMessage, REMOVE_ALL_MESSAGES
+from typing import Any
+import argparse
+import statistics
+
+from agent.memory.trim_message import trim_history, trim_messages_middleware
+from logger import log_header, log_info, log_success
+
+
+class FakeToolCallingModel(BaseChatModel):
+    """Calls the lookup tool once per user turn, then answers."""
+
+    answer_chars: int = 200
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-tool-calling"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        if isinstance(messages[-1], ToolMessage):
+            message = AIMessage(content="答" * self.answer_chars)
+        else:
+            call_id = f"call_{len(messages)}"
+            message = AIMessage(content="", tool_calls=[{"name": "lookup", "args": {"query": messages[-1].content}, "id": call_id}])
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+@tool
+def lookup(query: str) -> str:
+    """Look up an answer."""
+    return "資料" * 100
+
+
+@before_model
+def legacy_trim_messages_middleware(state: AgentState, runtime: Any = None):
+    """Previous behaviour: rewrite the whole history on every model call."""
+    return {"messages": [RemoveMessage(id=REMOVE_ALL_MESSAGES), *trim_history(state["messages"])]}
+
+
+class CountingSaver(InMemorySaver):
+    """
+    InMemorySaver that counts serialized bytes and message objects written.
+
+    Like the Redis saver, a channel blob is only stored when its version changed,
+    so a node that returns no update does not rewrite the messages channel.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.checkpoint_bytes = 0
+        self.write_bytes = 0
+        self.messages_written = 0
+
+    @property
+    def bytes_written(self):
+        return self.checkpoint_bytes + self.write_bytes
+
+    def _count(self, value):
+        if isinstance(value, list):
+            self.messages_written += len(value)
+        return len(self.serde.dumps_typed(value)[1])
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        for channel in new_versions:
+            if channel in checkpoint["channel_values"]:
+                self.checkpoint_bytes += self._count(checkpoint["channel_values"][channel])
+        return super().put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id, task_path=""):
+        for _, value in writes:
+            self.write_bytes += self._count(value)
+        return super().put_writes(config, writes, task_id, task_path)
+
+
+def run(middleware, turns: int, answer_chars: int):
+    saver = CountingSaver()
+    agent = create_agent(
+        model=FakeToolCallingModel(answer_chars=answer_chars),
+        tools=[lookup],
+        checkpointer=saver,
+        middleware=[middleware],
+    )
+    config = {"configurable": {"thread_id": "bench"}}
+    per_turn_bytes = []
+    per_turn_messages = []
+    for turn in range(turns):
+        bytes_before, messages_before = saver.bytes_written, saver.messages_written
+        agent.invoke({"messages": [HumanMessage(content=f"第 {turn} 個問題")]}, config)
+        per_turn_bytes.append(saver.bytes_written - bytes_before)
+        per_turn_messages.append(saver.messages_written - messages_before)
+    final_messages = agent.get_state(config).values["messages"]
+    return saver, per_turn_bytes, per_turn_messages, final_messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=30)
+    parser.add_argument("--answer-chars", type=int, default=200)
+    args = parser.parse_args()
+
+    log_header(f"Checkpoint write volume over {args.turns} turns")
+    results = {}
+    for name, middleware in (("legacy", legacy_trim_messages_middleware), ("delta", trim_messages_middleware)):
+        saver, per_turn_bytes, per_turn_messages, final_messages = run(middleware, args.turns, args.answer_chars)
+        results[name] = (per_turn_bytes, final_messages)
+        log_info(
+            f"{name:<7} total={sum(per_turn_bytes) / 1024:8.1f} KiB "
+            f"(checkpoints={saver.checkpoint_bytes / 1024:.1f}, writes={saver.write_bytes / 1024:.1f})  "
+            f"per turn mean={statistics.mean(per_turn_bytes) / 1024:6.1f} KiB  "
+            f"last={per_turn_bytes[-1] / 1024:6.1f} KiB  "
+            f"message objects written={sum(per_turn_messages)}"
+        )
+
+    legacy_bytes, legacy_messages = results["legacy"]
+    delta_bytes, delta_messages = results["delta"]
+    same_history = [m.content for m in legacy_messages] == [m.content for m in delta_messages]
+    log_success(f"Write volume reduced {sum(legacy_bytes) / max(sum(delta_bytes), 1):.1f}x (same final history: {same_history})")
+
+
+if __name__ == "__main__":
+    main()
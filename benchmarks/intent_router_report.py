@@ -0,0 +1,101 @@
+"""
+Accuracy / latency report for the intent router from its decision log.
+
+Reads the JSON lines written by agent/router/intent_router.py (shadow or on
+mode). Turns where the agent ran are compared against the agent's own tool
+calls: the router "agrees" when the agent used only product tools with
+exactly the filters the router extracted. For each confidence threshold we
+report how much traffic the fast path would take (coverage), how often it
+agrees with the agent (precision), how many of the agent's structured
+lookups it catches (recall), and the agent latency it would save.
+
+Also replays the logged questions through the current classifier, so rule
+changes can be evaluated against the same traffic before they are deployed.
+
+Usage:
+    python -m benchmarks.intent_router_report
+    python -m benchmarks.intent_router_report --log logs/intent_router.jsonl --thresholds 0.6 0.8 1.0
+"""
+import argparse
+import json
+import statistics
+
+from agent.router.intent_router import IntentRouter, INTENT_ROUTER_LOG_PATH
+from logger import log_header, log_info, log_success, log_warning
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def load_records(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def sweep(records, thresholds, label):
+    """Coverage / precision / recall / saved latency per threshold for (filters, confidence) records."""
+    log_header(f"Threshold sweep ({label}, {len(records)} compared turns)")
+    lookups = sum(record["agent_filters"] is not None for record in records)
+    for threshold in thresholds:
+        routed = [r for r in records if r["filters"] is not None and r["confidence"] >= threshold]
+        agreed = [r for r in routed if r["filters"] == r["agent_filters"]]
+        saved = [r["agent_ms"] - r["router_ms"] for r in routed if r.get("agent_ms") is not None]
+        log_info(
+            f"threshold={threshold:.2f}  coverage={len(routed) / len(records):6.1%}  "
+            f"precision={len(agreed) / len(routed) if routed else 0:6.1%}  "
+            f"recall={len(agreed) / lookups if lookups else 0:6.1%}  "
+            f"saved/routed turn={statistics.mean(saved) if saved else 0:7.0f} ms"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=INTENT_ROUTER_LOG_PATH, help="Decision log (JSON lines)")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8, 0.9, 1.0])
+    parser.add_argument("--show-disagreements", type=int, default=10, help="Disagreeing questions to print")
+    args = parser.parse_args()
+
+    records = load_records(args.log)
+    compared = [r for r in records if r.get("agent_tool_calls") is not None]
+    served = [r for r in records if r["served"]]
+
+    log_header(f"Intent router log: {len(records)} decisions")
+    log_info(f"served by fast path: {len(served)}   compared with agent: {len(compared)}")
+    reasons = {}
+    for record in records:
+        reasons[record["reason"]] = reasons.get(record["reason"], 0) + 1
+    log_info("reasons: " + ", ".join(f"{reason}={count}" for reason, count in sorted(reasons.items(), key=lambda item: -item[1])))
+
+    router_ms = [r["router_ms"] for r in records]
+    agent_ms = [r["agent_ms"] for r in compared if r.get("agent_ms") is not None]
+    log_info(f"router latency  p50={percentile(router_ms, 0.5):8.2f} ms  p95={percentile(router_ms, 0.95):8.2f} ms")
+    if agent_ms:
+        log_info(f"agent latency   p50={percentile(agent_ms, 0.5):8.0f} ms  p95={percentile(agent_ms, 0.95):8.0f} ms")
+
+    if not compared:
+        log_warning("No turns with agent tool calls logged (run with INTENT_ROUTER_MODE=shadow)")
+        return
+
+    sweep(compared, args.thresholds, "logged decisions")
+
+    # Replay the same questions through the current rules
+    router = IntentRouter(log_path="")
+    replayed = [{**record, **router.classify(record["question"])} for record in compared]
+    sweep(replayed, args.thresholds, "current classifier")
+
+    disagreements = [
+        r for r in replayed
+        if r["filters"] is not None and r["confidence"] >= router.threshold and r["filters"] != r["agent_filters"]
+    ]
+    if disagreements:
+        log_header(f"Confident disagreements at threshold {router.threshold:.2f}")
+        for record in disagreements[:args.show_disagreements]:
+            log_warning(f"{record['question']}  router={record['filters']}  agent={record['agent_tool_calls']}")
+    else:
+        log_success(f"No confident disagreements at threshold {router.threshold:.2f}")
+
+
+if __name__ == "__main__":
+    main()
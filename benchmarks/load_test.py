@@ -0,0 +1,357 @@
+"""
+Offline load test of the chat endpoints (no network, runs on a laptop).
+
+The API is started in a separate process on localhost with the stand-ins of
+benchmarks/offline_stack.py: a deterministic fake chat model with a
+configurable time to first token and token rate, local vector snapshots
+instead of Atlas, the in-memory catalog index and InMemorySaver instead of
+Redis. Everything else is the production code path: middleware, tools,
+retrievers, single-flight, SSE framing and metrics.
+
+Questions are replayed from a capture file (REQUEST_CAPTURE_PATH, see
+api/request_capture.py) or from a built-in set. Turns of one captured
+conversation are sent in order on the same uuid; --concurrency
+conversations run at once. We report p50/p95/p99 latency per endpoint, time
+to first token of streams, requests/s, errors and requests shed by admission
+control (429, not counted as errors).
+
+To catch regressions per commit, --record appends the results (with the git
+commit and configuration) to a JSON lines file, and --max-regression fails
+(exit code 1) when p95 latency or throughput is worse than the last recorded
+run with the same configuration by more than that percentage.
+
+Usage:
+    python -m benchmarks.load_test
+    python -m benchmarks.load_test --requests logs/requests.jsonl --concurrency 32 --count 500
+    python -m benchmarks.load_test --endpoint stream --first-token-ms 500 --tokens-per-second 40
+    python -m benchmarks.load_test --server-env SINGLE_FLIGHT_ENABLED=false INTENT_ROUTER_MODE=on
+    python -m benchmarks.load_test --concurrency 64 --server-env ADMISSION_MAX_IN_FLIGHT=8 ADMISSION_QUEUE_SIZE=8
+    python -m benchmarks.load_test --record benchmarks/load_test.jsonl --max-regression 20
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import httpx
+
+from logger import log_header, log_info, log_success, log_warning, log_error
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_QUESTIONS = [
+    "棉被應該多久清洗一次？",
+    "蠶絲被怎麼洗",
+    "羽絨被有哪些?",
+    "6*7 的蠶絲被價格",
+    "適合過敏體質的棉被推薦",
+    "冬天保暖的被子推薦",
+    "宿舍寢具怎麼選",
+    "枕頭高度怎麼挑",
+    "品牌故事",
+    "退換貨怎麼處理",
+]
+# Follow-up conversations (turns replayed in order on one uuid)
+DEFAULT_CONVERSATIONS = [
+    ["我想找一件不會太熱的雙人棉被", "那價格呢?", "可以水洗嗎"],
+    ["枕頭有哪些?", "哪一款適合側睡", "怎麼保養"],
+]
+
+
+# ========== SERVER ==============
+def serve(port: int, model: dict, server_env: dict, verbose: bool):
+    """Run the API with the offline stand-ins (in a child process)."""
+    from benchmarks.offline_stack import configure_offline_environment, install_offline_stack
+
+    snapshot_dir = tempfile.mkdtemp(prefix="load_test_snapshots_")
+    configure_offline_environment(snapshot_dir, server_env)
+    if not verbose:
+        import structlog
+        structlog.configure(logger_factory=structlog.ReturnLoggerFactory())
+    install_offline_stack(**model)
+
+    import uvicorn
+    from api.main import app
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", access_log=False)
+
+
+# ========== WORKLOAD ==============
+def load_conversations(path: str, endpoint: str):
+    """
+    Conversations to replay, each a list of (endpoint, question) turns in order.
+
+    Args:
+        path: Capture file (None for the built-in questions)
+        endpoint: "invoke" / "stream" to override, "recorded" to use the captured endpoint
+    """
+    if path is None:
+        conversations = [[question] for question in DEFAULT_QUESTIONS] + DEFAULT_CONVERSATIONS
+        default = "stream" if endpoint == "recorded" else endpoint
+        return [[(default, question) for question in turns] for turns in conversations]
+
+    threads = {}
+    with open(path, encoding="utf-8") as f:
+        records = sorted((json.loads(line) for line in f if line.strip()), key=lambda record: record["ts"])
+    for record in records:
+        turn_endpoint = record.get("endpoint", "stream") if endpoint == "recorded" else endpoint
+        threads.setdefault(record["thread"], []).append((turn_endpoint, record["question"]))
+    return list(threads.values())
+
+
+# ========== CLIENT ==============
+async def send_invoke(client, question: str, uuid: str):
+    start = time.perf_counter()
+    response = await client.get("/chatbot/get_agent_answer/", params={"question": question, "uuid": uuid})
+    response.raise_for_status()
+    return time.perf_counter() - start, None
+
+
+async def send_stream(client, question: str, uuid: str):
+    start = time.perf_counter()
+    first_token = None
+    params = {"question": question, "uuid": uuid}
+    async with client.stream("GET", "/chatbot/get_agent_answer_stream/", params=params) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if first_token is None and line.startswith('data: {"token"'):
+                first_token = time.perf_counter() - start
+            elif line.startswith('data: {"error"'):
+                raise RuntimeError(line[len("data: "):])
+    return time.perf_counter() - start, first_token
+
+
+async def run_load(base_url: str, conversations, count: int, concurrency: int, run_id: str):
+    """
+    Replay conversations until count turns were sent.
+
+    Returns:
+        Tuple of (per-turn results, wall seconds)
+    """
+    queue = asyncio.Queue()
+    planned = 0
+    for play, turns in zip(itertools.count(), itertools.cycle(conversations)):
+        if planned >= count:
+            break
+        turns = turns[:count - planned]
+        queue.put_nowait((f"{run_id}-{play}", turns))
+        planned += len(turns)
+
+    results = []
+    senders = {"invoke": send_invoke, "stream": send_stream}
+
+    async def worker(client):
+        while not queue.empty():
+            uuid, turns = queue.get_nowait()
+            for endpoint, question in turns:
+                try:
+                    latency, first_token = await senders[endpoint](client, question, uuid)
+                    results.append({"endpoint": endpoint, "latency": latency, "first_token": first_token, "ok": True})
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code == 429:
+                        # Shed by admission control: counted separately from errors
+                        results.append({"endpoint": endpoint, "ok": False, "rejected": True})
+                    else:
+                        results.append({"endpoint": endpoint, "ok": False, "error": f"{type(e).__name__}: {e}"})
+                except Exception as e:
+                    results.append({"endpoint": endpoint, "ok": False, "error": f"{type(e).__name__}: {e}"})
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=300, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+    return results, wall
+
+
+def percentiles(values):
+    """p50 / p95 / p99 in milliseconds."""
+    if len(values) < 2:
+        value = values[0] * 1000 if values else 0.0
+        return {"p50": value, "p95": value, "p99": value}
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": cuts[49] * 1000, "p95": cuts[94] * 1000, "p99": cuts[98] * 1000}
+
+
+def summarize(results, wall: float):
+    ok = [result for result in results if result["ok"]]
+    rejected = sum(1 for result in results if result.get("rejected"))
+    summary = {
+        "requests": len(results),
+        "errors": len(results) - len(ok) - rejected,
+        "rejected": rejected,
+        "wall_seconds": wall,
+        "requests_per_second": len(ok) / wall if wall else 0.0,
+        "endpoints": {},
+    }
+    for endpoint in sorted({result["endpoint"] for result in ok}):
+        turns = [result for result in ok if result["endpoint"] == endpoint]
+        stats = {"count": len(turns), "latency_ms": percentiles([turn["latency"] for turn in turns])}
+        first_tokens = [turn["first_token"] for turn in turns if turn["first_token"] is not None]
+        if first_tokens:
+            stats["ttft_ms"] = percentiles(first_tokens)
+        summary["endpoints"][endpoint] = stats
+    return summary
+
+
+def served_paths(base_url: str):
+    """Requests per serving path (agent / single_flight / router / cache) from the server's /metrics."""
+    try:
+        text = httpx.get(f"{base_url}/metrics", timeout=10).text
+    except httpx.HTTPError:
+        return {}
+    paths = {}
+    for line in text.splitlines():
+        if line.startswith("chatbot_request_seconds_count{"):
+            labels, value = line[len("chatbot_request_seconds_count{"):].split("} ")
+            label_map = dict(item.split("=") for item in labels.split(","))
+            path = label_map["path"].strip('"')
+            paths[path] = paths.get(path, 0) + int(float(value))
+    return paths
+
+
+# ========== RECORDING ==============
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def find_baseline(path: str, config: dict):
+    """Last recorded run with the same configuration."""
+    if not os.path.exists(path):
+        return None
+    baseline = None
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            record = json.loads(line)
+            if record.get("config") == config:
+                baseline = record
+    return baseline
+
+
+def regressions(summary: dict, baseline: dict, max_regression: float):
+    """Metrics worse than the baseline by more than max_regression percent."""
+    found = []
+    for endpoint, stats in summary["endpoints"].items():
+        previous = baseline["results"]["endpoints"].get(endpoint)
+        if previous is None:
+            continue
+        for metric in ("latency_ms", "ttft_ms"):
+            if metric in stats and metric in previous:
+                change = (stats[metric]["p95"] / previous[metric]["p95"] - 1) * 100 if previous[metric]["p95"] else 0.0
+                if change > max_regression:
+                    found.append(f"{endpoint} {metric} p95 +{change:.0f}%")
+    previous_rps = baseline["results"]["requests_per_second"]
+    if previous_rps:
+        change = (1 - summary["requests_per_second"] / previous_rps) * 100
+        if change > max_regression:
+            found.append(f"requests/s -{change:.0f}%")
+    return found
+
+
+def wait_until_up(base_url: str, timeout: float) -> bool:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            if httpx.get(f"{base_url}/health", timeout=1).status_code == 200:
+                return True
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", help="Captured requests (JSON lines from REQUEST_CAPTURE_PATH); default: built-in questions")
+    parser.add_argument("--endpoint", choices=("recorded", "invoke", "stream"), default="recorded",
+                        help="Endpoint for every turn (recorded: as captured, stream for built-in questions)")
+    parser.add_argument("--count", type=int, default=200, help="Turns to send")
+    parser.add_argument("--concurrency", type=int, default=16, help="Conversations in flight")
+    parser.add_argument("--warmup", type=int, default=5, help="Turns sent before measuring")
+    parser.add_argument("--first-token-ms", type=float, default=300, help="Fake model latency to its first chunk")
+    parser.add_argument("--tokens-per-second", type=float, default=50, help="Fake model chunk rate")
+    parser.add_argument("--answer-tokens", type=int, default=80, help="Chunks per fake answer")
+    parser.add_argument("--server-env", nargs="*", default=[], metavar="KEY=VALUE", help="Extra server settings")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--record", help="Append results as a JSON line to this file")
+    parser.add_argument("--max-regression", type=float, help="Fail if p95 / requests/s is this many percent worse than the last record")
+    parser.add_argument("--verbose", action="store_true", help="Show server logs")
+    args = parser.parse_args()
+
+    model = {"first_token_ms": args.first_token_ms, "tokens_per_second": args.tokens_per_second, "answer_tokens": args.answer_tokens}
+    server_env = dict(item.split("=", 1) for item in args.server_env)
+    conversations = load_conversations(args.requests, args.endpoint)
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    server = multiprocessing.Process(target=serve, args=(args.port, model, server_env, args.verbose), daemon=True)
+    server.start()
+    try:
+        if not wait_until_up(base_url, timeout=120):
+            log_error("Server did not start (run with --verbose to see its logs)")
+            sys.exit(1)
+        log_header(f"Load test: {args.count} turns, concurrency {args.concurrency}, {len(conversations)} conversations")
+        if args.warmup:
+            asyncio.run(run_load(base_url, conversations, args.warmup, min(args.concurrency, args.warmup), "warmup"))
+        results, wall = asyncio.run(run_load(base_url, conversations, args.count, args.concurrency, f"run{int(time.time())}"))
+        paths = served_paths(base_url)
+    finally:
+        server.terminate()
+        server.join()
+
+    summary = summarize(results, wall)
+    for endpoint, stats in summary["endpoints"].items():
+        latency = stats["latency_ms"]
+        line = f"{endpoint:<7} n={stats['count']:<5} latency p50={latency['p50']:7.0f}  p95={latency['p95']:7.0f}  p99={latency['p99']:7.0f} ms"
+        if "ttft_ms" in stats:
+            ttft = stats["ttft_ms"]
+            line += f"  |  ttft p50={ttft['p50']:6.0f}  p95={ttft['p95']:6.0f}  p99={ttft['p99']:6.0f} ms"
+        log_info(line)
+    log_info(
+        f"{summary['requests_per_second']:.1f} requests/s over {wall:.1f} s, {summary['errors']} errors, "
+        f"{summary['rejected']} rejected (429)"
+    )
+    if paths:
+        log_info("Served by (warm-up included): " + ", ".join(f"{path} {count}" for path, count in sorted(paths.items())))
+    for error in sorted({result["error"] for result in results if "error" in result})[:5]:
+        log_warning(error)
+
+    config = {
+        "requests": args.requests,
+        "endpoint": args.endpoint,
+        "count": args.count,
+        "concurrency": args.concurrency,
+        "model": model,
+        "server_env": server_env,
+    }
+    failed = summary["errors"] > 0
+    if args.record:
+        baseline = find_baseline(args.record, config)
+        if baseline is None:
+            log_info("No earlier record with this configuration to compare with")
+        elif args.max_regression is not None:
+            found = regressions(summary, baseline, args.max_regression)
+            if found:
+                log_warning(f"Regression vs {baseline['commit']}: {', '.join(found)}")
+                failed = True
+            else:
+                log_success(f"Within {args.max_regression:g}% of {baseline['commit']}")
+        record = {"ts": time.time(), "commit": git_commit(), "config": config, "results": summary}
+        with open(args.record, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        log_info(f"Recorded to {args.record}")
+
+    if failed:
+        sys.exit(1)
+    log_success("Load test finished")
+
+
+if __name__ == "__main__":
+    main()
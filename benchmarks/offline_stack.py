@@ -0,0 +1,264 @@
+"""
+Offline stand-ins for the API's external services (used by benchmarks/load_test.py).
+
+- FakeChatModel: deterministic tool-calling chat model with a configurable
+  time to first token and token rate (streams like gpt-4o-mini: 1-2 CJK
+  characters per chunk)
+- HashEmbeddings: deterministic character-bigram embeddings (no API calls)
+- Local vector snapshots of the product catalog (PRODUCT_DATA) and the FAQ
+  pages (data/qa_data/markdown when present, otherwise generated pages),
+  served by the VECTOR_BACKEND=local hybrid retriever instead of Atlas
+- The in-memory catalog index for filter_product_tool, InMemorySaver instead
+  of the Redis checkpointer, and the LRU-only embedding cache (no Redis)
+
+The semantic answer cache needs redis-stack vector search and is turned off.
+
+Usage (before importing the API):
+    configure_offline_environment(snapshot_dir)
+    install_offline_stack(first_token_ms=300, tokens_per_second=50, answer_tokens=80)
+    from api.main import app
+"""
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pathlib import Path
+from typing import List
+import numpy as np
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import zlib
+
+from data.product_data.product_data import PRODUCT_CATEGORIES, PRODUCT_DATA
+from data.qa_data.data_sources import URLS_CONFIG
+
+QA_COLLECTION = "qa_collection"
+PRODUCT_COLLECTION = "product_collection"
+EMBEDDING_DIMENSIONS = 256
+QA_MARKDOWN_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "qa_data", "markdown")
+
+# Read by the modules at import time, so set before the API is imported
+OFFLINE_ENV = {
+    "VECTOR_BACKEND": "local",
+    "CATALOG_BACKEND": "memory",
+    "CATALOG_VERSION_CHECK_SECONDS": "1e9",  # no corpus version checks against Redis
+    "QA_COLLECTION_NAME": QA_COLLECTION,
+    "PRODUCT_COLLECTION_NAME": PRODUCT_COLLECTION,
+    "SEMANTIC_CACHE_ENABLED": "false",
+    "EMBEDDING_CACHE_REDIS_ENABLED": "false",
+    "COMPACTION_ENABLED": "false",
+    "WARMUP_ENABLED": "false",
+    "LANGCHAIN_TRACING_V2": "false",
+    "LANGSMITH_TRACING": "false",
+}
+
+ANSWER_TEXT = (
+    "您好，根據查詢結果，這款商品採用透氣舒適的材質，觸感柔軟，四季皆適用。"
+    "建議依照床墊尺寸挑選，清洗時請放入洗衣袋以冷水輕柔洗滌並平放晾乾。"
+    "如需更多資訊，歡迎聯繫我們的客服人員，我們將竭誠為您服務。"
+)
+FILTER_KEYWORDS = ("價格", "多少錢", "價錢", "有哪些", "尺寸", "元")
+PRODUCT_KEYWORDS = ("被", "枕", "墊", "床", "毯", "推薦")
+
+
+class HashEmbeddings(Embeddings):
+    """Deterministic bag-of-character-bigrams embeddings (similar texts get similar vectors)."""
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        text = re.sub(r"\s+", "", text)
+        for i in range(max(len(text) - 1, 1)):
+            bucket = zlib.crc32(text[i:i + 2].encode("utf-8"))
+            vector[bucket % self.dimensions] += 1.0 if bucket & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Deterministic stand-in for the chat model.
+
+    For a user message it calls one tool (filter_product_tool for price / size /
+    listing questions, search_product_tool for other product questions,
+    search_faq_tool otherwise); after a tool result it answers with
+    answer_tokens chunks. Every call waits first_token_ms, then each further
+    chunk 1 / tokens_per_second.
+    """
+
+    first_token_ms: float = 300
+    tokens_per_second: float = 50
+    answer_tokens: int = 80
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-offline"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _tool_call(self, question: str, call_id: str):
+        if any(keyword in question for keyword in FILTER_KEYWORDS):
+            category = next((category for category in PRODUCT_CATEGORIES if category in question), None)
+            return {"name": "filter_product_tool", "args": {"category": category}, "id": call_id}
+        if any(keyword in question for keyword in PRODUCT_KEYWORDS):
+            return {"name": "search_product_tool", "args": {"query": question}, "id": call_id}
+        return {"name": "search_faq_tool", "args": {"query": question}, "id": call_id}
+
+    def _answer_chunks(self, seed: str) -> List[str]:
+        rng = random.Random(zlib.crc32(seed.encode("utf-8")))
+        chunks, position = [], 0
+        for _ in range(self.answer_tokens):
+            size = rng.choice((1, 1, 2))
+            chunks.append((ANSWER_TEXT * 2)[position:position + size])
+            position = (position + size) % len(ANSWER_TEXT)
+        return chunks
+
+    def _plan(self, messages):
+        """Tool call message for a user turn, or the answer chunks after a tool result."""
+        if isinstance(messages[-1], ToolMessage):
+            return None, self._answer_chunks(str(messages[-1].content))
+        return self._tool_call(str(messages[-1].content), f"call_{len(messages)}"), []
+
+    @staticmethod
+    def _usage(messages, chunks):
+        input_tokens = sum(len(str(message.content)) for message in messages)
+        return {"input_tokens": input_tokens, "output_tokens": len(chunks), "total_tokens": input_tokens + len(chunks)}
+
+    def _seconds(self, chunks) -> float:
+        return self.first_token_ms / 1000 + max(len(chunks) - 1, 0) / self.tokens_per_second
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_call, chunks = self._plan(messages)
+        time.sleep(self._seconds(chunks))
+        message = AIMessage(
+            content="".join(chunks), tool_calls=[tool_call] if tool_call else [], usage_metadata=self._usage(messages, chunks),
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_call, chunks = self._plan(messages)
+        await asyncio.sleep(self._seconds(chunks))
+        message = AIMessage(
+            content="".join(chunks), tool_calls=[tool_call] if tool_call else [], usage_metadata=self._usage(messages, chunks),
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        tool_call, chunks = self._plan(messages)
+        await asyncio.sleep(self.first_token_ms / 1000)
+        if tool_call:
+            tool_call_chunk = {**tool_call, "args": json.dumps(tool_call["args"], ensure_ascii=False), "index": 0}
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[tool_call_chunk]))
+        for i, text in enumerate(chunks):
+            if i:
+                await asyncio.sleep(1 / self.tokens_per_second)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+        yield ChatGenerationChunk(message=AIMessageChunk(content="", usage_metadata=self._usage(messages, chunks)))
+
+
+# ========== LOCAL SNAPSHOTS ==============
+def product_records():
+    """Product documents shaped like the ingested MongoDB documents."""
+    from data.product_data.data_to_docs import transform_product
+    return [{"text": doc.page_content, **doc.metadata} for doc in transform_product(PRODUCT_DATA)]
+
+
+def qa_records(chunk_chars: int = 500):
+    """FAQ page chunks (saved markdown when present, otherwise generated text)."""
+    records = []
+    for source, url in URLS_CONFIG.items():
+        path = os.path.join(QA_MARKDOWN_DIR, f"{source}.md")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                page = f.read()
+        else:
+            page = f"# {source}\n\n" + "\n\n".join(f"段落 {i}：{source} 的內容。" * 5 for i in range(10))
+        for start in range(0, len(page), chunk_chars):
+            records.append({"text": page[start:start + chunk_chars], "source": source, "url": url})
+    return records
+
+
+def write_snapshot(snapshot_dir: str, collection: str, records, embeddings: Embeddings):
+    """Write records in the rag/local_vector_store.py snapshot format."""
+    path = Path(snapshot_dir) / collection
+    path.mkdir(parents=True, exist_ok=True)
+    matrix = np.asarray(embeddings.embed_documents([record["text"] for record in records]), dtype=np.float32)
+    np.save(path / "embeddings.npy", matrix)
+    with open(path / "records.jsonl", "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    with open(path / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "collection": collection,
+            "count": matrix.shape[0],
+            "dimensions": matrix.shape[1],
+            "dtype": "float32",
+            "exported_at": time.time(),
+        }, f, indent=2)
+
+
+# ========== INSTALL ==============
+def configure_offline_environment(snapshot_dir: str, overrides=None):
+    """
+    Point the app's configuration at the offline stand-ins (call before importing the API).
+
+    Args:
+        snapshot_dir: Directory for the generated local vector snapshots
+        overrides: Extra environment variables (e.g. {"SINGLE_FLIGHT_ENABLED": "false"})
+    """
+    os.environ.update(OFFLINE_ENV)
+    os.environ["LOCAL_SNAPSHOT_DIR"] = snapshot_dir
+    os.environ.update(overrides or {})
+
+
+def install_offline_stack(first_token_ms: float = 300, tokens_per_second: float = 50, answer_tokens: int = 80):
+    """
+    Build the local snapshots and install the fakes in the app's singletons.
+
+    Args:
+        first_token_ms: Fake model latency before its first chunk
+        tokens_per_second: Fake model chunk rate after the first chunk
+        answer_tokens: Chunks per answer
+    """
+    from langgraph.checkpoint.memory import InMemorySaver
+    from agent import agent as agent_module
+    from agent.agent import LLMMetricsCallback
+    from agent.memory import checkpointer
+    from rag import catalog_index
+    from rag.mongo_db_utils import vector_store_utils
+    from rag.mongo_db_utils.embedding_cache import CachedEmbeddings
+
+    embeddings = HashEmbeddings()
+    products = product_records()
+    snapshot_dir = os.environ["LOCAL_SNAPSHOT_DIR"]
+    write_snapshot(snapshot_dir, PRODUCT_COLLECTION, products, embeddings)
+    write_snapshot(snapshot_dir, QA_COLLECTION, qa_records(), embeddings)
+
+    vector_store_utils._embedding_model = CachedEmbeddings(embeddings, model_name="hash-offline", use_redis=False)
+    catalog_index._catalog_index = catalog_index.CatalogIndex(products)
+    checkpointer._checkpointer = InMemorySaver()
+    agent_module._llm = FakeChatModel(
+        first_token_ms=first_token_ms,
+        tokens_per_second=tokens_per_second,
+        answer_tokens=answer_tokens,
+        callbacks=[LLMMetricsCallback("fake-offline")],
+    )
@@ -1,30 +1,12 @@
-from dotenv import load_dotenv
-import os
+"""
+Transform the raw product data (data/product_data/product_data.py) into
+product Documents. Pure functions: importing this module opens no database
+or API clients (ingestion lives in rag/add_data_to_mongo.py).
+"""
 import re
 from typing import List, Dict
-from openai import OpenAI
-from data.product_data.product_data import PRODUCT_DATA
 from langchain_core.documents import Document
-from rag.mongo_db_utils.add_data import add_documents
-from rag.mongo_db_utils.vector_store_utils import get_vector_store
-from rag.mongo_db_utils.vector_store_utils import get_mongo_client
-load_dotenv()
-
-# Configuration
-
-MONGODB_URI = os.getenv("MONGODB_URI")
-DATABASE_NAME = os.getenv("DATABASE_NAME")
-COLLECTION_NAME = os.getenv("PRODUCT_COLLECTION_NAME")
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-
-# Initialize MongoDB client
-client = get_mongo_client()
-db = client[DATABASE_NAME]
-collection = db[COLLECTION_NAME]
-
-# Initialize OpenAI client
-openai = OpenAI(api_key=OPENAI_API_KEY)
-
+from data.product_data.product_data import PRODUCT_DATA
 
 
 def parse_weight_prices(weight_prices: List[str]) -> List[Dict]:
@@ -0,0 +1,109 @@
+""" Local stub of the FireCrawl scrape API for exercising the crawl pipeline offline
+
+Implements POST /v2/scrape with configurable latency, failure rate (HTTP 500,
+or another status such as 502) and a per-second request limit (HTTP 429), and tracks the peak number of
+in-flight requests so concurrency and rate limiting can be checked.
+
+Pages are served from data/qa_data/markdown/<source>.md when present
+(written by `python -m data.qa_data.website_to_docs`), otherwise a generated
+page is returned.
+
+Usage:
+    python -m data.qa_data.firecrawl_stub --port 3002 --latency 0.5 --failure-rate 0.2
+    FIRECRAWL_API_URL=http://127.0.0.1:3002 python -m rag.add_data_to_mongo --only qa --dry-run
+"""
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+import argparse
+import asyncio
+import os
+import random
+import time
+
+from data.qa_data.data_sources import URLS_CONFIG
+
+MARKDOWN_DIR = os.path.join(os.path.dirname(__file__), "markdown")
+SOURCES_BY_URL = {url: source for source, url in URLS_CONFIG.items()}
+
+
+def create_app(
+    latency: float = 0.5,
+    failure_rate: float = 0.0,
+    max_requests_per_second: float = 0.0,
+    failure_status: int = 500,
+):
+    """
+    Build the stub FireCrawl app.
+
+    Args:
+        latency: Seconds each scrape takes
+        failure_rate: Probability of answering with failure_status
+        max_requests_per_second: Answer HTTP 429 above this rate (0 disables the check)
+        failure_status: HTTP status of failed scrapes
+    """
+    app = FastAPI(title="FireCrawl stub")
+    app.state.stats = {"requests": 0, "failures": 0, "rate_limited": 0, "in_flight": 0, "peak_in_flight": 0}
+    request_times = []
+
+    def _page(url: str):
+        source = SOURCES_BY_URL.get(url, url)
+        path = os.path.join(MARKDOWN_DIR, f"{source}.md")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                return f.read()
+        return f"# {source}\n\n" + "\n\n".join(f"段落 {i}：{source} 的內容。" * 5 for i in range(10))
+
+    @app.post("/v2/scrape")
+    async def scrape(request: Request):
+        body = await request.json()
+        stats = app.state.stats
+        stats["requests"] += 1
+
+        now = time.monotonic()
+        while request_times and now - request_times[0] > 1:
+            request_times.pop(0)
+        request_times.append(now)
+        if max_requests_per_second and len(request_times) > max_requests_per_second:
+            stats["rate_limited"] += 1
+            return JSONResponse({"success": False, "error": "Rate limit exceeded"}, status_code=429)
+
+        stats["in_flight"] += 1
+        stats["peak_in_flight"] = max(stats["peak_in_flight"], stats["in_flight"])
+        try:
+            await asyncio.sleep(latency)
+        finally:
+            stats["in_flight"] -= 1
+
+        if random.random() < failure_rate:
+            stats["failures"] += 1
+            return JSONResponse({"success": False, "error": "Stub internal error"}, status_code=failure_status)
+
+        url = body["url"]
+        return {
+            "success": True,
+            "data": {
+                "markdown": _page(url),
+                "metadata": {"url": url, "sourceURL": url, "statusCode": 200},
+            },
+        }
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    return app
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Local FireCrawl stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=3002)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--max-rps", type=float, default=0.0)
+    parser.add_argument("--failure-status", type=int, default=500)
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args.latency, args.failure_rate, args.max_rps, args.failure_status), host=args.host, port=args.port)
@@ -1,21 +1,98 @@
-""" This file uses FireCrawl to convert a url website to markdown format for RAG"""
-from langchain_community.document_loaders.firecrawl import FireCrawlLoader
+""" This file uses FireCrawl to convert a url website to markdown format for RAG
+
+Pages can be crawled one at a time (load_url) or concurrently (astream_splitted_docs):
+the async path bounds in-flight requests with a semaphore, paces them with a
+token bucket, retries transient FireCrawl errors with exponential backoff and
+yields each page as soon as it is scraped and split, so embedding can start
+before the whole crawl list is done. The SDK client makes a single attempt per
+call, so every request (retries included) goes through the token bucket.
+
+Set FIRECRAWL_API_URL to point at a self-hosted or stub FireCrawl server
+(see data/qa_data/firecrawl_stub.py).
+"""
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from firecrawl import AsyncFirecrawl
+from firecrawl.v2.utils.error_handler import FirecrawlError, InternalServerError, RateLimitError, RequestTimeoutError
+import httpx
 
 from dotenv import load_dotenv
 import os
 import asyncio
-from typing import List
+import random
+import time
+from typing import Dict, List, Optional
 from logger import log_success, log_error, log_header, log_info, Colors, log_warning
 
 load_dotenv()
 
+FIRECRAWL_API_URL = os.getenv("FIRECRAWL_API_URL", "https://api.firecrawl.dev")
+FIRECRAWL_CONCURRENCY = int(os.getenv("FIRECRAWL_CONCURRENCY", "4"))
+FIRECRAWL_RATE_PER_SECOND = float(os.getenv("FIRECRAWL_RATE_PER_SECOND", "2"))
+FIRECRAWL_MAX_RETRIES = int(os.getenv("FIRECRAWL_MAX_RETRIES", "4"))
+FIRECRAWL_BACKOFF_SECONDS = float(os.getenv("FIRECRAWL_BACKOFF_SECONDS", "1"))
+
+# Errors worth retrying: 500s, 429s, timeouts and connection problems
+RETRYABLE_ERRORS = (InternalServerError, RateLimitError, RequestTimeoutError, httpx.TransportError)
+# Gateway errors come back as a plain FirecrawlError with the status code
+RETRYABLE_STATUS_CODES = (502, 503, 504)
+# AsyncFirecrawl counts attempts, not retries: 1 = no retries inside the SDK (they would bypass the token bucket)
+SDK_ATTEMPTS = 1
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a FireCrawl scrape error is transient."""
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    return isinstance(error, FirecrawlError) and error.status_code in RETRYABLE_STATUS_CODES
+
+
+class TokenBucket:
+    """
+    Async token bucket: allows bursts of `capacity` requests, refilled at `rate` per second.
+
+    Args:
+        rate: Tokens added per second
+        capacity: Maximum burst size (defaults to max(1, rate))
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
 # FireCrawl Website to Markdown
 class FireCrawlWebsiteToDocs:
-    def __init__(self):
+    def __init__(
+        self,
+        api_url: str = FIRECRAWL_API_URL,
+        concurrency: int = FIRECRAWL_CONCURRENCY,
+        rate_per_second: float = FIRECRAWL_RATE_PER_SECOND,
+        max_retries: int = FIRECRAWL_MAX_RETRIES,
+        backoff_seconds: float = FIRECRAWL_BACKOFF_SECONDS,
+    ):
         self.mode = "scrape"
-    
+        self.api_url = api_url
+        self.concurrency = concurrency
+        self.rate_per_second = rate_per_second
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+
 
     def split_docs(self, docs: List[Document]):
         text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
@@ -25,9 +102,12 @@ class FireCrawlWebsiteToDocs:
 
 
     def load_url(self, url: str, source: str):
+        # Sync single-page path only; langchain_community is slow to import
+        from langchain_community.document_loaders.firecrawl import FireCrawlLoader
         docs = []
         loader = FireCrawlLoader(
             api_key=os.getenv("FIRECRAWL_API_KEY"),
+            api_url=self.api_url,
             url=url,
             mode=self.mode
         )
@@ -44,62 +124,99 @@ class FireCrawlWebsiteToDocs:
         splitted_docs = self.split_docs(docs)
         return splitted_docs
 
+    async def _scrape_with_retry(self, client: AsyncFirecrawl, url: str, source: str,
+                                 semaphore: asyncio.Semaphore, bucket: TokenBucket):
+        """Scrape one url, retrying transient errors with exponential backoff + jitter."""
+        for attempt in range(self.max_retries + 1):
+            async with semaphore:
+                await bucket.acquire()
+                try:
+                    page = await client.scrape(url, formats=["markdown"])
+                    break
+                except Exception as e:
+                    if not is_retryable(e) or attempt == self.max_retries:
+                        raise
+                    error = e
+            delay = self.backoff_seconds * (2 ** attempt) * (1 + random.random())
+            log_warning(f"FireCrawl error for {source} ({type(error).__name__}), retry {attempt + 1}/{self.max_retries} in {delay:.1f}s")
+            await asyncio.sleep(delay)
 
-if __name__ == "__main__":
-    import time
-    from firecrawl.v2.utils.error_handler import InternalServerError
-    
-    firecrawl = FireCrawlWebsiteToDocs()
+        if not page.markdown:
+            return []
+        page_url = (page.metadata.url or page.metadata.source_url) if page.metadata else None
+        docs = [Document(page_content=page.markdown, metadata={"source": source, "url": page_url or url})]
+        log_success(f"Loaded {len(docs)} documents from {url}")
+        return docs
+
+    async def astream_docs(self, urls_config: Dict[str, str]):
+        """
+        Crawl all urls concurrently and yield results as each page finishes.
+
+        Args:
+            urls_config: Mapping of source name to url (e.g. URLS_CONFIG)
+
+        Yields:
+            (source, url, docs, error) tuples in completion order;
+            error is None on success and docs is empty on failure
+        """
+        client = AsyncFirecrawl(api_key=os.getenv("FIRECRAWL_API_KEY"), api_url=self.api_url, max_retries=SDK_ATTEMPTS)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        bucket = TokenBucket(self.rate_per_second)
+
+        async def crawl(source, url):
+            try:
+                return source, url, await self._scrape_with_retry(client, url, source, semaphore, bucket), None
+            except Exception as e:
+                return source, url, [], e
+
+        tasks = [asyncio.create_task(crawl(source, url)) for source, url in urls_config.items()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def astream_splitted_docs(self, urls_config: Dict[str, str]):
+        """Same as astream_docs, but each page is split into chunks as soon as it arrives."""
+        async for source, url, docs, error in self.astream_docs(urls_config):
+            yield source, url, self.split_docs(docs) if docs else [], error
+
+
+async def _save_markdown(markdown_dir: str):
     from data.qa_data.data_sources import URLS_CONFIG
-    
-    # Create the markdown directory if it doesn't exist
-    markdown_dir = "data/qa_data/markdown"
-    os.makedirs(markdown_dir, exist_ok=True)
-    
+
+    firecrawl = FireCrawlWebsiteToDocs()
     failed_urls = []
     successful_urls = []
-    
-    for source, url in URLS_CONFIG.items():
-        try:
-            log_info(f"Processing {source} from {url}...")
-            docs = firecrawl.load_url(url, source)
-            
-            if not docs:
-                log_warning(f"No documents retrieved for {source}")
-                failed_urls.append((source, url, "No documents retrieved"))
-                continue
-            
-            for doc in docs:
-                markdown_content = doc.page_content
-                markdown_file = f"{markdown_dir}/{source}.md"
-                with open(markdown_file, "w", encoding="utf-8") as f:
-                    f.write(markdown_content)
-                log_success(f"Saved {source} to {markdown_file}")
-                successful_urls.append(source)
-            
-            # Add a small delay between requests to avoid rate limiting
-            time.sleep(2)
-            
-        except InternalServerError as e:
-            error_msg = str(e)
-            log_error(f"FireCrawl error for {source} ({url}): {error_msg}")
-            failed_urls.append((source, url, "FireCrawl Internal Server Error"))
-            # Continue with next URL
+
+    log_info(f"Crawling {len(URLS_CONFIG)} urls (concurrency={firecrawl.concurrency}, rate={firecrawl.rate_per_second}/s)")
+    start = time.perf_counter()
+    async for source, url, docs, error in firecrawl.astream_docs(URLS_CONFIG):
+        if error is not None:
+            log_error(f"Failed to process {source} ({url}): {error}")
+            failed_urls.append((source, url, str(error)))
             continue
-        except Exception as e:
-            error_msg = str(e)
-            log_error(f"Failed to process {source} ({url}): {error_msg}")
-            failed_urls.append((source, url, error_msg))
-            # Continue with next URL
+        if not docs:
+            log_warning(f"No documents retrieved for {source}")
+            failed_urls.append((source, url, "No documents retrieved"))
             continue
-    
+
+        markdown_file = f"{markdown_dir}/{source}.md"
+        with open(markdown_file, "w", encoding="utf-8") as f:
+            f.write(docs[0].page_content)
+        log_success(f"Saved {source} to {markdown_file}")
+        successful_urls.append(source)
+    elapsed = time.perf_counter() - start
+
     # Report summary
     log_header("Processing Summary")
+    log_info(f"Crawled {len(URLS_CONFIG)} urls in {elapsed:.1f}s")
     log_success(f"Successfully processed: {len(successful_urls)} URLs")
     if successful_urls:
         for source in successful_urls:
             log_success(f"  ✓ {source}")
-    
+
     if failed_urls:
         log_warning(f"Failed to process: {len(failed_urls)} URLs")
         for source, url, error in failed_urls:
@@ -107,3 +224,10 @@ if __name__ == "__main__":
             log_error(f"    Error: {error[:150]}")
     else:
         log_success("All URLs processed successfully!")
+
+
+if __name__ == "__main__":
+    # Create the markdown directory if it doesn't exist
+    markdown_dir = "data/qa_data/markdown"
+    os.makedirs(markdown_dir, exist_ok=True)
+    asyncio.run(_save_markdown(markdown_dir))
@@ -0,0 +1,143 @@
+"""
+Prometheus metrics for the chat pipeline, exposed at GET /metrics.
+
+Each stage of an answer records into a histogram, so a slow answer can be
+broken down. The stages are: the whole request (by endpoint and by how it
+was served), admission queue wait, LLM calls and time to first token, tool
+calls, embeddings, retrieval, checkpointer reads/writes, and SSE frame
+flushes.
+
+Recording is one labels() lookup plus observe() (about 5 microseconds; see
+benchmarks/bench_metrics_overhead.py), which is small next to stages that
+take milliseconds. With METRICS_ENABLED=false every metric is a no-op.
+
+With several uvicorn workers each process has its own metrics. Set
+PROMETHEUS_MULTIPROC_DIR to an empty, writable directory before starting
+the server (the Docker image CMD does); /metrics then aggregates all
+workers. The directory is created on import if it does not exist yet.
+"""
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Seconds; from a cached embedding lookup up to a long multi-tool answer
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40)
+
+
+class _NoopMetric:
+    """Stand-in for a metric when METRICS_ENABLED is false."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, amount):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+    def set(self, value):
+        pass
+
+
+if METRICS_ENABLED:
+    # Multiprocess metrics write their files as soon as they are defined (label-less ones on import)
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+    from prometheus_client import Counter, Gauge, Histogram
+else:
+    def Counter(*args, **kwargs):
+        return _NoopMetric()
+
+    def Gauge(*args, **kwargs):
+        return _NoopMetric()
+
+    def Histogram(*args, **kwargs):
+        return _NoopMetric()
+
+
+# ========== REQUESTS ==============
+# endpoint: invoke / stream / batch; path: cache / router / agent / single_flight
+REQUEST_SECONDS = Histogram(
+    "chatbot_request_seconds", "Time to answer a chat request",
+    ["endpoint", "path"], buckets=LATENCY_BUCKETS,
+)
+STREAM_FIRST_TOKEN_SECONDS = Histogram(
+    "chatbot_stream_first_token_seconds", "Time from request to the first answer token of a stream",
+    ["path"], buckets=LATENCY_BUCKETS,
+)
+REQUEST_ERRORS = Counter("chatbot_request_errors_total", "Chat requests that failed", ["endpoint"])
+
+# ========== ADMISSION ==============
+# Gauges are summed over live workers in multiprocess mode; priority: stream / invoke / batch
+ADMISSION_IN_FLIGHT = Gauge(
+    "chatbot_admission_in_flight", "Admitted chat requests in flight", multiprocess_mode="livesum",
+)
+ADMISSION_QUEUE_DEPTH = Gauge(
+    "chatbot_admission_queue_depth", "Chat requests waiting for admission", ["priority"], multiprocess_mode="livesum",
+)
+ADMISSION_WAIT_SECONDS = Histogram(
+    "chatbot_admission_wait_seconds", "Time a chat request waited for admission", ["priority"], buckets=LATENCY_BUCKETS,
+)
+# reason: per_uuid / queue_full / evicted / timeout
+ADMISSION_REJECTIONS = Counter(
+    "chatbot_admission_rejections_total", "Chat requests rejected with 429", ["priority", "reason"],
+)
+
+# ========== LLM ==============
+LLM_CALL_SECONDS = Histogram(
+    "chatbot_llm_call_seconds", "Duration of one chat model call", ["model"], buckets=LATENCY_BUCKETS,
+)
+LLM_TTFT_SECONDS = Histogram(
+    "chatbot_llm_ttft_seconds", "Time to first token of a streamed chat model call", ["model"], buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter("chatbot_llm_tokens_total", "Tokens used by chat model calls", ["model", "kind"])
+
+# ========== TOOLS / RETRIEVAL ==============
+# status: success / error / timeout
+TOOL_SECONDS = Histogram(
+    "chatbot_tool_seconds", "Duration of one tool call", ["tool", "status"], buckets=LATENCY_BUCKETS,
+)
+# stage: embed / hybrid_search (Atlas $vectorSearch + $search in one aggregate) /
+# vector_search / fulltext_search (local backend) / filter
+RETRIEVAL_SECONDS = Histogram(
+    "chatbot_retrieval_seconds", "Duration of a retrieval stage", ["collection", "stage"], buckets=LATENCY_BUCKETS,
+)
+# tier: redis (cache lookup) / api (embedding request)
+EMBEDDING_SECONDS = Histogram(
+    "chatbot_embedding_seconds", "Duration of an embedding cache lookup or API call", ["tier"], buckets=LATENCY_BUCKETS,
+)
+# result: lru_hit / redis_hit / miss
+EMBEDDING_TEXTS = Counter("chatbot_embedding_texts_total", "Texts embedded, by cache result", ["result"])
+
+# ========== CHECKPOINTER / STREAMING ==============
+# operation: aget_tuple / aput / aput_writes
+CHECKPOINT_SECONDS = Histogram(
+    "chatbot_checkpoint_seconds", "Duration of a Redis checkpointer operation", ["operation"], buckets=LATENCY_BUCKETS,
+)
+SSE_FLUSH_SECONDS = Histogram(
+    "chatbot_sse_flush_seconds", "Time to hand one SSE frame to the client connection", buckets=LATENCY_BUCKETS,
+)
+SSE_FRAMES = Counter("chatbot_sse_frames_total", "SSE frames sent", ["event"])
+
+
+def render_metrics():
+    """
+    Render all metrics in the Prometheus text format.
+
+    Returns:
+        Tuple of (body bytes, content type)
+    """
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, REGISTRY, generate_latest
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import multiprocess
+
+        # Aggregate the files written by every worker process
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
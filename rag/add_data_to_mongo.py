@@ -1,34 +1,90 @@
-""" This file loads the data from the data source through web crawling and add the data to MongoDB"""
+""" This file loads the data from the data source through web crawling and add the data to MongoDB
+
+Ingestion is incremental: every chunk/product has a stable ID and content hash,
+so only new or changed documents are embedded and upserted, and stale ones are
+deleted. Run with --dry-run to print the diff without writing anything.
+"""
 from data.qa_data.website_to_docs import FireCrawlWebsiteToDocs
 from data.qa_data.data_sources import URLS_CONFIG
 from data.product_data.product_data import PRODUCT_DATA
 from data.product_data.data_to_docs import transform_product
-from rag.mongo_db_utils.add_data import add_documents
 from rag.mongo_db_utils.create_index import create_index
+from rag.mongo_db_utils.sync_data import (
+    sync_documents,
+    qa_chunk_id,
+    product_doc_id,
+    has_changes,
+    merge_reports,
+    log_sync_report,
+)
 from rag.mongo_db_utils.vector_store_utils import get_vector_store
+from rag.redis_utils import bump_corpus_version
+from logger import log_info, log_error, log_warning
 from dotenv import load_dotenv
+import argparse
+import asyncio
 import os
 load_dotenv()
 
 QA_COLLECTION_NAME = os.getenv("QA_COLLECTION_NAME")
 PRODUCT_COLLECTION_NAME = os.getenv("PRODUCT_COLLECTION_NAME")
 
-qa_vectorstore = get_vector_store(QA_COLLECTION_NAME)
-product_vectorstore = get_vector_store(PRODUCT_COLLECTION_NAME)
 
-def qa_data_processing():
+async def aqa_data_processing(dry_run: bool = False):
     data = URLS_CONFIG
+    qa_vectorstore = get_vector_store(QA_COLLECTION_NAME)
     firecrawl = FireCrawlWebsiteToDocs()
-    create_index(QA_COLLECTION_NAME)
-    for source, url in data.items():
-        docs = firecrawl.load_url_to_splitted_docs(url, source)
-        add_documents(docs, qa_vectorstore)
+    if not dry_run:
+        create_index(QA_COLLECTION_NAME)
+
+    reports = []
+    failed_sources = []
+    # Pages are crawled concurrently; each one is synced (embedded + upserted) as soon as
+    # it arrives, in a worker thread so the remaining crawls keep running meanwhile
+    async for source, url, docs, error in firecrawl.astream_splitted_docs(data):
+        if error is not None or not docs:
+            # Keep the existing chunks of this source rather than deleting them
+            log_error(f"Failed to crawl {source} ({url}): {error or 'no content'}")
+            failed_sources.append(source)
+            continue
+        ids = [qa_chunk_id(doc) for doc in docs]
+        reports.append(await asyncio.to_thread(
+            sync_documents, docs, ids, qa_vectorstore, scope={"source": source}, dry_run=dry_run
+        ))
+
+    # Sources removed from URLS_CONFIG
+    if failed_sources:
+        log_warning(f"Skipping removed-source cleanup because {len(failed_sources)} sources failed")
+    else:
+        reports.append(sync_documents([], [], qa_vectorstore, scope={"source": {"$nin": list(data)}}, dry_run=dry_run))
+
+    report = merge_reports(reports)
+    log_sync_report("QA", report, dry_run)
+    return report
 
-def product_data_processing():
-    create_index(PRODUCT_COLLECTION_NAME)
+def qa_data_processing(dry_run: bool = False):
+    return asyncio.run(aqa_data_processing(dry_run=dry_run))
+
+def product_data_processing(dry_run: bool = False):
+    if not dry_run:
+        create_index(PRODUCT_COLLECTION_NAME)
     docs = transform_product(PRODUCT_DATA)
-    add_documents(docs, product_vectorstore)
+    ids = [product_doc_id(doc) for doc in docs]
+    report = sync_documents(docs, ids, get_vector_store(PRODUCT_COLLECTION_NAME), dry_run=dry_run)
+    log_sync_report("Product", report, dry_run)
+    return report
 
 if __name__ == "__main__":
-    qa_data_processing()
-    product_data_processing()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Incrementally sync QA and product data into MongoDB")
+    parser.add_argument("--dry-run", action="store_true", help="Print the diff without writing")
+    parser.add_argument("--only", choices=["qa", "product"], help="Sync only one collection")
+    args = parser.parse_args()
+
+    reports = []
+    if args.only in (None, "qa"):
+        reports.append(qa_data_processing(dry_run=args.dry_run))
+    if args.only in (None, "product"):
+        reports.append(product_data_processing(dry_run=args.dry_run))
+
+    if not args.dry_run and any(has_changes(report) for report in reports):
+        log_info(f"Corpus version bumped to {bump_corpus_version()}")
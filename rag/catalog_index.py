@@ -0,0 +1,222 @@
+"""
+In-process product catalog index for strict structured filtering.
+
+The product catalog is small and changes rarely, so filter_product_tool does not
+need a MongoDB round trip. This module keeps the transform_product output in
+memory with:
+- hash indexes on category, product_name and variants.size
+- sorted arrays over price_range.min / price_range.max for range queries
+
+Matching follows the MongoDB query built by filter_products exactly:
+products whose price_range bound is None never match a price filter, and any
+variant size (including "custom" by-weight variants) satisfies a size filter.
+
+The index is rebuilt when the corpus version (rag/redis_utils.py) changes and
+swapped in atomically; readers always see either the old or the new index.
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from typing import Dict, List, Optional
+from langchain_core.documents import Document
+from redis.exceptions import RedisError
+from dotenv import load_dotenv
+import asyncio
+import os
+import threading
+import time
+
+from rag.mongo_db_utils.vector_store_utils import get_collection
+from rag.redis_utils import get_corpus_version, aget_corpus_version
+from logger import log_info, log_warning
+
+load_dotenv()
+
+PRODUCT_COLLECTION_NAME = os.getenv("PRODUCT_COLLECTION_NAME")
+CATALOG_VERSION_CHECK_SECONDS = float(os.getenv("CATALOG_VERSION_CHECK_SECONDS", "30"))
+
+
+class CatalogIndex:
+    """
+    Immutable in-memory index over product documents.
+
+    Args:
+        products: Product dicts shaped like the MongoDB product documents
+                  (text, product_name, category, variants, price_range, ...)
+        version: Corpus version the index was built from
+    """
+
+    def __init__(self, products: List[Dict], version: int = 0):
+        self.products = products
+        self.version = version
+
+        by_category = defaultdict(list)
+        by_name = defaultdict(list)
+        by_size = defaultdict(list)
+        min_prices = []
+        max_prices = []
+
+        for product_id, product in enumerate(products):
+            by_category[product.get("category")].append(product_id)
+            by_name[product.get("product_name")].append(product_id)
+            for size in {variant.get("size") for variant in product.get("variants") or []}:
+                by_size[size].append(product_id)
+
+            price_range = product.get("price_range") or {}
+            if isinstance(price_range.get("min"), (int, float)):
+                min_prices.append((price_range["min"], product_id))
+            if isinstance(price_range.get("max"), (int, float)):
+                max_prices.append((price_range["max"], product_id))
+
+        self._by_category = dict(by_category)
+        self._by_name = dict(by_name)
+        self._by_size = dict(by_size)
+
+        min_prices.sort()
+        max_prices.sort()
+        self._min_values = [price for price, _ in min_prices]
+        self._min_ids = [product_id for _, product_id in min_prices]
+        self._max_values = [price for price, _ in max_prices]
+        self._max_ids = [product_id for _, product_id in max_prices]
+
+    @classmethod
+    def from_documents(cls, docs: List[Document], version: int = 0):
+        """Build the index from transform_product output."""
+        products = [{"text": doc.page_content, **doc.metadata} for doc in docs]
+        return cls(products, version)
+
+    def filter(
+        self,
+        category: Optional[str] = None,
+        product_name: Optional[str] = None,
+        price_min: Optional[int] = None,
+        price_max: Optional[int] = None,
+        size: Optional[str] = None,
+        limit: int = 100,
+    ) -> List[Dict]:
+        """
+        Return products matching all given constraints, in catalog order.
+
+        Args:
+            category, product_name, size: Exact matches (ignored when empty)
+            price_min: Keep products with price_range.min >= price_min
+            price_max: Keep products with price_range.max <= price_max
+            limit: Maximum number of products to return
+        """
+        candidates = []
+
+        if category:
+            candidates.append(self._by_category.get(category, []))
+        if product_name:
+            candidates.append(self._by_name.get(product_name, []))
+        if size:
+            candidates.append(self._by_size.get(size, []))
+        if price_min is not None:
+            candidates.append(self._min_ids[bisect_left(self._min_values, price_min):])
+        if price_max is not None:
+            candidates.append(self._max_ids[:bisect_right(self._max_values, price_max)])
+
+        if not candidates:
+            return self.products[:limit]
+
+        # Intersect starting from the most selective constraint
+        candidates.sort(key=len)
+        matched = set(candidates[0])
+        for other in candidates[1:]:
+            if not matched:
+                break
+            matched.intersection_update(other)
+
+        return [self.products[product_id] for product_id in sorted(matched)[:limit]]
+
+
+def _load_products() -> List[Dict]:
+    """
+    Load the ingested catalog from MongoDB, falling back to transform_product(PRODUCT_DATA).
+    """
+    try:
+        products = list(get_collection(PRODUCT_COLLECTION_NAME).find({}, {"embedding": 0, "_id": 0}))
+        if products:
+            return products
+        log_warning("Product collection is empty; building catalog index from PRODUCT_DATA")
+    except Exception as e:
+        log_warning(f"Could not load catalog from MongoDB ({e}); building from PRODUCT_DATA")
+
+    from data.product_data.product_data import PRODUCT_DATA
+    from data.product_data.data_to_docs import transform_product
+    return [{"text": doc.page_content, **doc.metadata} for doc in transform_product(PRODUCT_DATA)]
+
+
+# ========== SINGLETON INDEX ==============
+_catalog_index = None
+_last_version_check = 0.0
+_reload_lock = threading.Lock()
+
+
+def reload_catalog_index(version: Optional[int] = None) -> CatalogIndex:
+    """Rebuild the catalog index and swap it in atomically."""
+    global _catalog_index
+    with _reload_lock:
+        if version is None:
+            try:
+                version = get_corpus_version()
+            except RedisError:
+                version = 0
+        index = CatalogIndex(_load_products(), version)
+        _catalog_index = index
+    log_info(f"Catalog index loaded: {len(index.products)} products (version {version})")
+    return index
+
+
+def get_catalog_index() -> CatalogIndex:
+    """Get the catalog index, reloading it if the corpus version changed."""
+    global _last_version_check
+    if _catalog_index is None:
+        return reload_catalog_index()
+
+    now = time.monotonic()
+    if now - _last_version_check >= CATALOG_VERSION_CHECK_SECONDS:
+        _last_version_check = now
+        try:
+            version = get_corpus_version()
+        except RedisError:
+            return _catalog_index
+        if version != _catalog_index.version:
+            return reload_catalog_index(version)
+    return _catalog_index
+
+
+async def aget_catalog_index() -> CatalogIndex:
+    """Async variant of get_catalog_index; rebuilds run in a worker thread."""
+    global _last_version_check
+    if _catalog_index is None:
+        return await asyncio.to_thread(reload_catalog_index)
+
+    now = time.monotonic()
+    if now - _last_version_check >= CATALOG_VERSION_CHECK_SECONDS:
+        _last_version_check = now
+        try:
+            version = await aget_corpus_version()
+        except RedisError:
+            return _catalog_index
+        if version != _catalog_index.version:
+            return await asyncio.to_thread(reload_catalog_index, version)
+    return _catalog_index
+
+
+if __name__ == "__main__":
+    from data.product_data.product_data import PRODUCT_DATA
+    from data.product_data.data_to_docs import transform_product
+
+    index = CatalogIndex.from_documents(transform_product(PRODUCT_DATA))
+    queries = [
+        {"category": "羽絨被"},
+        {"size": "6*7", "price_max": 5000},
+        {"category": "蠶絲被", "price_min": 3000},
+        {"size": "custom"},
+    ]
+    for query in queries:
+        start = time.perf_counter()
+        for _ in range(10000):
+            results = index.filter(**query)
+        elapsed_us = (time.perf_counter() - start) / 10000 * 1e6
+        print(f"{query}: {len(results)} products, {elapsed_us:.1f} µs/query")
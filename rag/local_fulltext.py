@@ -0,0 +1,150 @@
+"""
+CJK-aware local full-text index and in-process hybrid retriever.
+
+Atlas $search with the default analyzer handles Traditional Chinese poorly
+(no word boundaries). This index tokenizes CJK runs into overlapping character
+bigrams (plus unigrams for single characters), keeps ASCII words and size
+tokens like "6*7" intact, and scores with BM25.
+
+LocalHybridRetriever fuses it with LocalVectorStore results using the same
+Reciprocal Rank Fusion as MongoDBAtlasHybridSearchRetriever:
+    score = 1 / (rank + penalty + 1)   summed over the vector and full-text lists
+so hybrid search runs in one process without the $unionWith aggregation.
+"""
+from langchain_core.callbacks.manager import CallbackManagerForRetrieverRun, AsyncCallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional
+import numpy as np
+import math
+import re
+import time
+
+from rag.local_vector_store import apply_post_filter
+from metrics import RETRIEVAL_SECONDS
+
+_TOKEN_PATTERN = re.compile(
+    "[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+"  # CJK runs
+    r"|[a-z0-9]+(?:[*./×][a-z0-9]+)*"  # words, numbers, sizes like 6*7, ratios like 97/3
+)
+_CJK_PATTERN = re.compile("[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]")
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into CJK character bigrams and ASCII word tokens."""
+    tokens = []
+    for match in _TOKEN_PATTERN.finditer(text.lower()):
+        run = match.group(0)
+        if _CJK_PATTERN.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run.replace("×", "*"))
+    return tokens
+
+
+class BM25Index:
+    """
+    Okapi BM25 over an inverted index of tokenize() terms.
+
+    Args:
+        texts: Documents to index (row order matches the vector snapshot)
+        k1: Term frequency saturation
+        b: Length normalization
+    """
+
+    def __init__(self, texts: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(texts)
+
+        postings = defaultdict(list)
+        lengths = np.zeros(self.size, dtype=np.float32)
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                postings[term].append((doc_id, tf))
+
+        avg_length = float(lengths.mean()) if self.size else 0.0
+        self._length_norm = k1 * (1 - b + b * lengths / avg_length) if avg_length else np.full(self.size, k1)
+        self._postings = {}
+        for term, entries in postings.items():
+            doc_ids = np.fromiter((doc_id for doc_id, _ in entries), dtype=np.int64, count=len(entries))
+            tfs = np.fromiter((tf for _, tf in entries), dtype=np.float32, count=len(entries))
+            idf = math.log(1 + (self.size - len(entries) + 0.5) / (len(entries) + 0.5))
+            self._postings[term] = (doc_ids, tfs, idf)
+
+    def search(self, query: str, k: int):
+        """
+        Return the top-k (doc indices, BM25 scores) for a query, best first.
+        Documents that share no term with the query are not returned.
+        """
+        scores = np.zeros(self.size, dtype=np.float32)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            doc_ids, tfs, idf = posting
+            scores[doc_ids] += idf * tfs * (self.k1 + 1) / (tfs + self._length_norm[doc_ids])
+
+        matched = np.flatnonzero(scores)
+        if matched.size == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        k = min(k, matched.size)
+        top = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return top, scores[top]
+
+
+class LocalHybridRetriever(BaseRetriever):
+    """
+    In-process hybrid search over a LocalVectorStore snapshot.
+
+    Mirrors MongoDBAtlasHybridSearchRetriever: top k from each list, RRF fusion,
+    sort by fused score, limit k, then apply the post_filter $match stages.
+    """
+
+    vectorstore: Any
+    k: int = 5
+    vector_penalty: float = 50
+    fulltext_penalty: float = 50
+    post_filter: Optional[List[Dict[str, Any]]] = None
+
+    def _search(self, query: str, query_vector: List[float]) -> List[Document]:
+        store = self.vectorstore
+        fused: Dict[int, Dict[str, Any]] = {}
+
+        start = time.perf_counter()
+        vector_indices, _ = store.top_k(query_vector, self.k)
+        vector_end = time.perf_counter()
+        RETRIEVAL_SECONDS.labels(collection=store.collection_name, stage="vector_search").observe(vector_end - start)
+        for rank, index in enumerate(vector_indices[0]):
+            fused[int(index)] = {
+                "vector_score": 1.0 / (rank + self.vector_penalty + 1),
+                "fulltext_score": 0.0,
+                "rank": rank,
+            }
+
+        text_indices, _ = store.fulltext_index.search(query, self.k)
+        RETRIEVAL_SECONDS.labels(collection=store.collection_name, stage="fulltext_search").observe(time.perf_counter() - vector_end)
+        for rank, index in enumerate(text_indices):
+            entry = fused.setdefault(int(index), {"vector_score": 0.0, "fulltext_score": 0.0})
+            entry["fulltext_score"] = 1.0 / (rank + self.fulltext_penalty + 1)
+            entry["rank"] = rank  # $mergeObjects keeps the full-text rank when both lists match
+
+        ranked = sorted(fused.items(), key=lambda item: -(item[1]["vector_score"] + item[1]["fulltext_score"]))
+        docs = [
+            store.to_document(index, score=scores["vector_score"] + scores["fulltext_score"], **scores)
+            for index, scores in ranked[:self.k]
+        ]
+        return apply_post_filter(docs, self.post_filter)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self._search(query, self.vectorstore.embeddings.embed_query(query))
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        return self._search(query, await self.vectorstore.embeddings.aembed_query(query))
@@ -0,0 +1,239 @@
+"""
+Local NumPy vector search backend (offline / edge alternative to Atlas $vectorSearch).
+
+A snapshot of a collection is stored under LOCAL_SNAPSHOT_DIR/<collection>/:
+- embeddings.npy: L2-normalized float32 or float16 matrix, memory-mapped on load
+- records.jsonl:  text + metadata for each row (same fields as the Mongo documents)
+- manifest.json:  row count, dimensions, dtype and export time
+
+Create a snapshot from Atlas with:
+    python -m rag.local_vector_store export <collection> [<collection> ...]
+"""
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from pathlib import Path
+import numpy as np
+import json
+import os
+import time
+
+from logger import log_success, log_info
+
+load_dotenv()
+
+LOCAL_SNAPSHOT_DIR = os.getenv("LOCAL_SNAPSHOT_DIR", "data/snapshots")
+LOCAL_SNAPSHOT_DTYPE = os.getenv("LOCAL_SNAPSHOT_DTYPE", "float32")
+
+SCORE_BLOCK_ROWS = 8192
+
+TEXT_KEY = "text"
+EMBEDDING_KEY = "embedding"
+
+
+# ========== METADATA FILTERS ==============
+def _resolve_path(doc: Dict, path: str) -> List[Any]:
+    """Resolve a dotted path the way MongoDB does, descending through arrays."""
+    values = [doc]
+    for part in path.split("."):
+        next_values = []
+        for value in values:
+            if isinstance(value, list):
+                next_values.extend(item[part] for item in value if isinstance(item, dict) and part in item)
+            elif isinstance(value, dict) and part in value:
+                next_values.append(value[part])
+        values = next_values
+    flattened = []
+    for value in values:
+        flattened.extend(value if isinstance(value, list) else [value])
+    return flattened
+
+
+_COMPARATORS = {
+    "$eq": lambda value, target: value == target,
+    "$ne": lambda value, target: value != target,
+    "$gt": lambda value, target: isinstance(value, (int, float)) and value > target,
+    "$gte": lambda value, target: isinstance(value, (int, float)) and value >= target,
+    "$lt": lambda value, target: isinstance(value, (int, float)) and value < target,
+    "$lte": lambda value, target: isinstance(value, (int, float)) and value <= target,
+    "$in": lambda value, target: value in target,
+}
+
+
+def match_filter(doc: Dict, query: Dict) -> bool:
+    """
+    Evaluate the subset of MQL used by our post filters against a document.
+
+    Supports $and, $or, field equality and $eq/$ne/$gt/$gte/$lt/$lte/$in on
+    dotted paths (matching any array element, like MongoDB).
+    """
+    for field, condition in query.items():
+        if field == "$and":
+            if not all(match_filter(doc, sub_query) for sub_query in condition):
+                return False
+            continue
+        if field == "$or":
+            if not any(match_filter(doc, sub_query) for sub_query in condition):
+                return False
+            continue
+
+        values = _resolve_path(doc, field)
+        if isinstance(condition, dict) and condition and all(op.startswith("$") for op in condition):
+            for op, target in condition.items():
+                if op == "$ne":
+                    if any(value == target for value in values):
+                        return False
+                elif not any(_COMPARATORS[op](value, target) for value in values):
+                    return False
+        elif condition not in values:
+            return False
+    return True
+
+
+def apply_post_filter(docs: List[Document], post_filter: Optional[List[Dict]]) -> List[Document]:
+    """Apply the $match stages of a post_filter pipeline to search results."""
+    if not post_filter:
+        return docs
+    for stage in post_filter:
+        if "$match" not in stage:
+            raise ValueError(f"Local backend only supports $match post filter stages, got {list(stage)}")
+        docs = [doc for doc in docs if match_filter({TEXT_KEY: doc.page_content, **doc.metadata}, stage["$match"])]
+    return docs
+
+
+# ========== SNAPSHOT STORE ==============
+class LocalVectorStore:
+    """
+    Memory-mapped snapshot of a collection with vectorized cosine top-k.
+
+    Args:
+        collection: Collection name (snapshot sub-directory)
+        embedding: Embedding model used for queries
+        snapshot_dir: Root directory of the snapshots
+    """
+
+    def __init__(self, collection: str, embedding: Embeddings, snapshot_dir: str = LOCAL_SNAPSHOT_DIR):
+        self.collection_name = collection
+        self.embeddings = embedding
+        path = Path(snapshot_dir) / collection
+
+        with open(path / "manifest.json", encoding="utf-8") as f:
+            self.manifest = json.load(f)
+        self.matrix = np.load(path / "embeddings.npy", mmap_mode="r")
+        with open(path / "records.jsonl", encoding="utf-8") as f:
+            self.records = [json.loads(line) for line in f]
+
+        if len(self.records) != self.matrix.shape[0]:
+            raise ValueError(f"Snapshot {path} is inconsistent: {len(self.records)} records vs {self.matrix.shape[0]} vectors")
+
+        self._fulltext_index = None
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def fulltext_index(self):
+        """BM25 index over the snapshot texts (built on first use)."""
+        if self._fulltext_index is None:
+            from rag.local_fulltext import BM25Index
+            self._fulltext_index = BM25Index([record[TEXT_KEY] for record in self.records])
+        return self._fulltext_index
+
+    def _scores(self, queries):
+        """Cosine scores for normalized queries; float16 snapshots are upcast block by block."""
+        if self.matrix.dtype == np.float32:
+            return queries @ self.matrix.T
+        scores = np.empty((queries.shape[0], self.matrix.shape[0]), dtype=np.float32)
+        for start in range(0, self.matrix.shape[0], SCORE_BLOCK_ROWS):
+            block = np.asarray(self.matrix[start:start + SCORE_BLOCK_ROWS], dtype=np.float32)
+            scores[:, start:start + block.shape[0]] = queries @ block.T
+        return scores
+
+    def top_k(self, query_vectors, k: int):
+        """
+        Batched cosine top-k.
+
+        Args:
+            query_vectors: Array of shape (n_queries, dim) or (dim,)
+            k: Number of neighbours per query
+
+        Returns:
+            Tuple of (indices, scores), each of shape (n_queries, k), best first
+        """
+        queries = np.atleast_2d(np.asarray(query_vectors, dtype=np.float32))
+        queries = queries / np.linalg.norm(queries, axis=1, keepdims=True).clip(min=1e-12)
+
+        scores = self._scores(queries)
+        k = min(k, scores.shape[1])
+        if k == 0:
+            empty = np.empty((queries.shape[0], 0))
+            return empty.astype(np.int64), empty
+
+        candidates = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        candidate_scores = np.take_along_axis(scores, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1, kind="stable")
+        return np.take_along_axis(candidates, order, axis=1), np.take_along_axis(candidate_scores, order, axis=1)
+
+    def to_document(self, index: int, **extra) -> Document:
+        record = self.records[index]
+        metadata = {key: value for key, value in record.items() if key != TEXT_KEY}
+        metadata.update(extra)
+        return Document(page_content=record[TEXT_KEY], metadata=metadata)
+
+    def vector_search(self, query_vector: List[float], k: int) -> List[Document]:
+        """Vector search returning documents with rank / vector_score metadata."""
+        indices, scores = self.top_k(query_vector, k)
+        return [
+            self.to_document(int(index), rank=rank, vector_score=float(score), score=float(score))
+            for rank, (index, score) in enumerate(zip(indices[0], scores[0]))
+        ]
+
+
+# ========== SNAPSHOT EXPORT ==============
+def export_snapshot(collection: str, snapshot_dir: str = LOCAL_SNAPSHOT_DIR, dtype: str = LOCAL_SNAPSHOT_DTYPE):
+    """
+    Export a MongoDB collection (text, metadata, embeddings) to a local snapshot.
+
+    Args:
+        collection: Collection name
+        snapshot_dir: Root directory for snapshots
+        dtype: "float32" or "float16" storage for the embedding matrix
+    """
+    from rag.mongo_db_utils.vector_store_utils import get_collection
+    from langchain_mongodb.utils import make_serializable
+
+    path = Path(snapshot_dir) / collection
+    path.mkdir(parents=True, exist_ok=True)
+
+    vectors = []
+    with open(path / "records.jsonl", "w", encoding="utf-8") as f:
+        for doc in get_collection(collection).find({}):
+            vectors.append(doc.pop(EMBEDDING_KEY))
+            make_serializable(doc)
+            f.write(json.dumps(doc, ensure_ascii=False) + "\n")
+
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    matrix /= np.linalg.norm(matrix, axis=1, keepdims=True).clip(min=1e-12)
+    np.save(path / "embeddings.npy", matrix.astype(dtype))
+
+    with open(path / "manifest.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "collection": collection,
+            "count": matrix.shape[0],
+            "dimensions": matrix.shape[1],
+            "dtype": dtype,
+            "exported_at": time.time(),
+        }, f, indent=2)
+
+    log_success(f"Exported {matrix.shape[0]} documents from {collection} to {path}")
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 3 or sys.argv[1] != "export":
+        log_info("Usage: python -m rag.local_vector_store export <collection> [<collection> ...]")
+        sys.exit(1)
+    for collection_name in sys.argv[2:]:
+        export_snapshot(collection_name)
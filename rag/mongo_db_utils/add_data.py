@@ -1,22 +1,128 @@
 from langchain_core.documents import Document
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import List, Optional
+from bson import ObjectId
+from pymongo import ReplaceOne
+import tiktoken
+import time
 import os
 
 from langchain_mongodb.vectorstores import MongoDBAtlasVectorSearch
+from langchain_mongodb.utils import str_to_oid
+
+from logger import log_info, log_success, log_warning
+
+# OpenAI embedding limits: 2048 inputs and 300k tokens per request
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "512"))
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "250000"))
+EMBEDDING_CONCURRENCY = int(os.getenv("EMBEDDING_CONCURRENCY", "4"))
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    # text-embedding-3-* tokenizer; None when the BPE file cannot be downloaded (offline)
+    try:
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        log_warning(f"tiktoken unavailable ({type(e).__name__}), estimating tokens from character count")
+        return None
+
+
+def count_tokens(texts: List[str]) -> List[int]:
+    """Token count per text (character count when tiktoken is unavailable, ~1 token per CJK character)."""
+    encoding = _get_encoding()
+    if encoding is None:
+        return [len(text) for text in texts]
+    return [len(tokens) for tokens in encoding.encode_batch(texts, disallowed_special=())]
+
+
+def make_batches(texts: List[str], batch_size: int, max_tokens: int):
+    """
+    Group text indices into batches bounded by both document count and token count.
+
+    Returns:
+        (batches, token_counts): list of index lists, and the token count of every text
+    """
+    token_counts = count_tokens(texts)
+    batches = []
+    batch = []
+    batch_tokens = 0
+    for index, tokens in enumerate(token_counts):
+        if batch and (len(batch) >= batch_size or batch_tokens + tokens > max_tokens):
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+        batch.append(index)
+        batch_tokens += tokens
+    if batch:
+        batches.append(batch)
+    return batches, token_counts
 
-from logger import log_success
 
-# Process all batches concurrently
 def add_documents(
     documents: List[Document],
-    vectorstore: MongoDBAtlasVectorSearch
+    vectorstore: MongoDBAtlasVectorSearch,
+    ids: Optional[List[str]] = None,
+    batch_size: int = EMBEDDING_BATCH_SIZE,
+    max_batch_tokens: int = EMBEDDING_BATCH_MAX_TOKENS,
+    concurrency: int = EMBEDDING_CONCURRENCY,
 ):
-    """Process documents in batches asynchronously.
-    
+    """Embed and write documents in batches, several batches in parallel.
+
+    Each batch is embedded in one request (bounded by batch_size documents and
+    max_batch_tokens tokens) and written with an unordered bulk_write of
+    upserts, so re-adding a document with the same ID replaces it.
+
     Args:
         documents: List of documents to add
-        batch_size: Number of documents per batch
         vectorstore: Vector store instance
+        ids: Optional stable IDs; existing documents with the same ID are replaced
+        batch_size: Maximum documents per embedding request
+        max_batch_tokens: Maximum tokens per embedding request
+        concurrency: Number of batches embedded/written at the same time
+
+    Returns:
+        Dict with documents, tokens, batches, seconds, docs_per_second and tokens_per_second
     """
-    vectorstore.add_documents(documents)
-    log_success(f"Added {len(documents)} documents to vector store")
+    if not documents:
+        return {"documents": 0, "tokens": 0, "batches": 0, "seconds": 0.0, "docs_per_second": 0.0, "tokens_per_second": 0.0}
+    if ids is None:
+        ids = [doc.id or str(ObjectId()) for doc in documents]
+
+    start = time.perf_counter()
+    texts = [doc.page_content for doc in documents]
+    batches, token_counts = make_batches(texts, batch_size, max_batch_tokens)
+    collection = vectorstore.collection
+    text_key = vectorstore._text_key
+    embedding_key = vectorstore._embedding_key
+
+    def process(batch):
+        embeddings = vectorstore.embeddings.embed_documents([texts[i] for i in batch])
+        operations = []
+        for i, embedding in zip(batch, embeddings, strict=True):
+            doc = {"_id": str_to_oid(ids[i]), text_key: texts[i], embedding_key: embedding, **documents[i].metadata}
+            operations.append(ReplaceOne({"_id": doc["_id"]}, doc, upsert=True))
+        collection.bulk_write(operations, ordered=False)
+        return len(batch)
+
+    log_info(f"Adding {len(documents)} documents in {len(batches)} batches (concurrency={concurrency})")
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        # list() re-raises the first batch failure
+        list(executor.map(process, batches))
+
+    elapsed = time.perf_counter() - start
+    total_tokens = sum(token_counts)
+    stats = {
+        "documents": len(documents),
+        "tokens": total_tokens,
+        "batches": len(batches),
+        "seconds": elapsed,
+        "docs_per_second": len(documents) / elapsed if elapsed else 0.0,
+        "tokens_per_second": total_tokens / elapsed if elapsed else 0.0,
+    }
+    log_success(
+        f"Added {len(documents)} documents to vector store in {elapsed:.2f}s "
+        f"({stats['docs_per_second']:.1f} docs/s, {stats['tokens_per_second']:.0f} tokens/s)"
+    )
+    return stats
@@ -0,0 +1,201 @@
+"""
+Cache-backed embeddings wrapper.
+
+Two tiers sit in front of the embedding API:
+1. In-process LRU (sub-millisecond for hot queries)
+2. Redis, shared across workers and ingestion runs
+
+Keys are built from the model name and a hash of the text, so the same product
+text is never embedded twice and repeated user queries skip the network.
+"""
+from langchain_core.embeddings import Embeddings
+from redis.exceptions import RedisError
+from collections import OrderedDict
+from array import array
+from typing import List, Optional
+from dotenv import load_dotenv
+import hashlib
+import os
+import threading
+import time
+
+from rag.redis_utils import get_redis_client, get_async_redis_client
+from logger import log_warning
+from metrics import EMBEDDING_SECONDS, EMBEDDING_TEXTS
+
+load_dotenv()
+
+EMBEDDING_CACHE_LRU_SIZE = int(os.getenv("EMBEDDING_CACHE_LRU_SIZE", "10000"))
+EMBEDDING_CACHE_REDIS_ENABLED = os.getenv("EMBEDDING_CACHE_REDIS_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_TTL_SECONDS = int(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", str(30 * 24 * 60 * 60)))
+# After a Redis error the shared tier is skipped for this long, then tried again
+EMBEDDING_CACHE_REDIS_BACKOFF_SECONDS = float(os.getenv("EMBEDDING_CACHE_REDIS_BACKOFF_SECONDS", "30"))
+
+
+def _to_bytes(vector: List[float]) -> bytes:
+    return array("f", vector).tobytes()
+
+
+def _from_bytes(raw: bytes) -> List[float]:
+    vector = array("f")
+    vector.frombytes(raw)
+    return vector.tolist()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper with an LRU tier and an optional Redis tier.
+
+    Batch calls look up every text in both tiers first and only send the
+    missing texts to the underlying model.
+
+    Args:
+        underlying: The embedding model that actually calls the API
+        model_name: Model name used as part of the cache key
+        lru_size: Maximum number of vectors kept in process
+        use_redis: Whether to use the shared Redis tier
+        ttl_seconds: Expiry of Redis entries
+        redis_backoff_seconds: How long the Redis tier is skipped after an error
+    """
+
+    def __init__(
+        self,
+        underlying: Embeddings,
+        model_name: str,
+        lru_size: int = EMBEDDING_CACHE_LRU_SIZE,
+        use_redis: bool = EMBEDDING_CACHE_REDIS_ENABLED,
+        ttl_seconds: int = EMBEDDING_CACHE_TTL_SECONDS,
+        redis_backoff_seconds: float = EMBEDDING_CACHE_REDIS_BACKOFF_SECONDS,
+    ):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.lru_size = lru_size
+        self.use_redis = use_redis
+        self.ttl_seconds = ttl_seconds
+        self.redis_backoff_seconds = redis_backoff_seconds
+        self._redis_retry_at = 0.0  # time.monotonic() before which the Redis tier is skipped
+        self._lru: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"lru_hits": 0, "redis_hits": 0, "misses": 0}
+
+    def _key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"emb:{self.model_name}:{digest}"
+
+    # ---------- LRU tier ----------
+    def _lru_get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+            return vector
+
+    def _lru_put(self, key: str, vector: List[float]):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _redis_available(self) -> bool:
+        return self.use_redis and time.monotonic() >= self._redis_retry_at
+
+    def _back_off_redis(self, error: Exception):
+        """Skip the Redis tier for redis_backoff_seconds (a transient error must not turn it off for good)."""
+        log_warning(f"Embedding cache Redis tier skipped for {self.redis_backoff_seconds:g} s: {error}")
+        self._redis_retry_at = time.monotonic() + self.redis_backoff_seconds
+
+    # ---------- Lookup helpers ----------
+    def _split_hits(self, texts: List[str]):
+        """Resolve texts from the LRU tier; return results and missing indices."""
+        keys = [self._key(text) for text in texts]
+        results: List[Optional[List[float]]] = [self._lru_get(key) for key in keys]
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        self.stats["lru_hits"] += len(texts) - len(missing)
+        EMBEDDING_TEXTS.labels(result="lru_hit").inc(len(texts) - len(missing))
+        return keys, results, missing
+
+    def _fill_from_redis(self, keys, results, missing, raw_values):
+        still_missing = []
+        for i, raw in zip(missing, raw_values):
+            if raw is None:
+                still_missing.append(i)
+                continue
+            vector = _from_bytes(raw)
+            results[i] = vector
+            self._lru_put(keys[i], vector)
+        self.stats["redis_hits"] += len(missing) - len(still_missing)
+        EMBEDDING_TEXTS.labels(result="redis_hit").inc(len(missing) - len(still_missing))
+        return still_missing
+
+    def _store(self, keys, results, missing, vectors):
+        for i, vector in zip(missing, vectors):
+            results[i] = vector
+            self._lru_put(keys[i], vector)
+        self.stats["misses"] += len(missing)
+        EMBEDDING_TEXTS.labels(result="miss").inc(len(missing))
+        return {keys[i]: _to_bytes(vector) for i, vector in zip(missing, vectors)}
+
+    # ---------- Sync API ----------
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, results, missing = self._split_hits(texts)
+
+        if missing and self._redis_available():
+            try:
+                start = time.perf_counter()
+                raw_values = get_redis_client().mget([keys[i] for i in missing])
+                EMBEDDING_SECONDS.labels(tier="redis").observe(time.perf_counter() - start)
+                missing = self._fill_from_redis(keys, results, missing, raw_values)
+            except RedisError as e:
+                self._back_off_redis(e)
+
+        if missing:
+            start = time.perf_counter()
+            vectors = self.underlying.embed_documents([texts[i] for i in missing])
+            EMBEDDING_SECONDS.labels(tier="api").observe(time.perf_counter() - start)
+            new_entries = self._store(keys, results, missing, vectors)
+            if self._redis_available():
+                try:
+                    with get_redis_client().pipeline(transaction=False) as pipe:
+                        for key, raw in new_entries.items():
+                            pipe.set(key, raw, ex=self.ttl_seconds)
+                        pipe.execute()
+                except RedisError as e:
+                    self._back_off_redis(e)
+
+        return results
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    # ---------- Async API ----------
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys, results, missing = self._split_hits(texts)
+
+        if missing and self._redis_available():
+            try:
+                start = time.perf_counter()
+                raw_values = await get_async_redis_client().mget([keys[i] for i in missing])
+                EMBEDDING_SECONDS.labels(tier="redis").observe(time.perf_counter() - start)
+                missing = self._fill_from_redis(keys, results, missing, raw_values)
+            except RedisError as e:
+                self._back_off_redis(e)
+
+        if missing:
+            start = time.perf_counter()
+            vectors = await self.underlying.aembed_documents([texts[i] for i in missing])
+            EMBEDDING_SECONDS.labels(tier="api").observe(time.perf_counter() - start)
+            new_entries = self._store(keys, results, missing, vectors)
+            if self._redis_available():
+                try:
+                    async with get_async_redis_client().pipeline(transaction=False) as pipe:
+                        for key, raw in new_entries.items():
+                            pipe.set(key, raw, ex=self.ttl_seconds)
+                        await pipe.execute()
+                except RedisError as e:
+                    self._back_off_redis(e)
+
+        return results
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
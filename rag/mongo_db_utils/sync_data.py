@@ -0,0 +1,132 @@
+"""
+Incremental, content-hashed synchronization of documents into a vector store.
+
+Every chunk/product gets a stable ID and a content hash stored alongside it.
+On each run we diff against what is already in the collection and only
+embed + upsert new or changed documents, and delete stale ones, instead of
+appending a full copy of everything.
+"""
+from langchain_core.documents import Document
+from langchain_mongodb.vectorstores import MongoDBAtlasVectorSearch
+from typing import Dict, List, Optional
+import hashlib
+import json
+
+from rag.mongo_db_utils.add_data import add_documents
+from logger import log_header, log_info, log_success, log_warning
+
+CONTENT_HASH_KEY = "content_hash"
+
+
+def content_hash(doc: Document) -> str:
+    """Hash of the document text and metadata (excluding the hash itself)."""
+    metadata = {k: v for k, v in doc.metadata.items() if k != CONTENT_HASH_KEY}
+    payload = doc.page_content + "\n" + json.dumps(metadata, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def qa_chunk_id(doc: Document) -> str:
+    """Stable ID for a website chunk: source + hash of the chunk text."""
+    digest = hashlib.sha256(f"{doc.metadata.get('source', '')}\n{doc.page_content}".encode("utf-8")).hexdigest()
+    return f"qa:{digest}"
+
+
+def product_doc_id(doc: Document) -> str:
+    """
+    Stable ID for a product: product_id + product_name.
+
+    product_id alone is not unique (variants such as 保暖型/舒適型 share it and some products have none).
+    """
+    key = f"{doc.metadata.get('product_id') or ''}|{doc.metadata['product_name']}"
+    return f"product:{hashlib.sha256(key.encode('utf-8')).hexdigest()}"
+
+
+def sync_documents(
+    documents: List[Document],
+    ids: List[str],
+    vectorstore: MongoDBAtlasVectorSearch,
+    scope: Optional[Dict] = None,
+    dry_run: bool = False,
+):
+    """
+    Upsert new/changed documents and delete stale ones within a scope.
+
+    Args:
+        documents: Desired state of the documents in the scope
+        ids: Stable ID for each document
+        vectorstore: Vector store instance
+        scope: MongoDB filter selecting the existing documents this run owns
+               (e.g. {"source": "品牌故事"}); None means the whole collection
+        dry_run: Only compute and return the diff
+
+    Returns:
+        Dict with "added", "updated", "unchanged" and "deleted" ID lists
+    """
+    collection = vectorstore.collection
+    existing = {
+        str(doc["_id"]): doc.get(CONTENT_HASH_KEY)
+        for doc in collection.find(scope or {}, {CONTENT_HASH_KEY: 1})
+    }
+
+    report = {"added": [], "updated": [], "unchanged": [], "deleted": []}
+    to_upsert = []
+    to_upsert_ids = []
+    seen = set()
+
+    for doc, doc_id in zip(documents, ids, strict=True):
+        if doc_id in seen:
+            # Identical chunk repeated on the same page: keep a single copy
+            continue
+        seen.add(doc_id)
+
+        digest = content_hash(doc)
+        if doc_id not in existing:
+            report["added"].append(doc_id)
+        elif existing[doc_id] != digest:
+            report["updated"].append(doc_id)
+        else:
+            report["unchanged"].append(doc_id)
+            continue
+
+        to_upsert.append(Document(page_content=doc.page_content, metadata={**doc.metadata, CONTENT_HASH_KEY: digest}))
+        to_upsert_ids.append(doc_id)
+
+    report["deleted"] = [doc_id for doc_id in existing if doc_id not in seen]
+
+    if dry_run:
+        return report
+
+    if to_upsert:
+        add_documents(to_upsert, vectorstore, ids=to_upsert_ids)
+    if report["deleted"]:
+        vectorstore.delete(ids=report["deleted"])
+        log_success(f"Deleted {len(report['deleted'])} stale documents")
+    return report
+
+
+def has_changes(report) -> bool:
+    """Whether a sync report changed anything in the collection."""
+    return bool(report["added"] or report["updated"] or report["deleted"])
+
+
+def merge_reports(reports):
+    """Combine several sync reports into one."""
+    merged = {"added": [], "updated": [], "unchanged": [], "deleted": []}
+    for report in reports:
+        for key in merged:
+            merged[key].extend(report[key])
+    return merged
+
+
+def log_sync_report(name: str, report, dry_run: bool = False):
+    """Print a diff summary for a sync run."""
+    log_header(f"{name} sync {'(dry run)' if dry_run else ''}".strip())
+    log_info(
+        f"added={len(report['added'])}  updated={len(report['updated'])}  "
+        f"unchanged={len(report['unchanged'])}  deleted={len(report['deleted'])}"
+    )
+    for label in ("added", "updated", "deleted"):
+        for doc_id in report[label][:20]:
+            log_info(f"  {label:<8} {doc_id}")
+        if len(report[label]) > 20:
+            log_warning(f"  ... {len(report[label]) - 20} more {label}")
@@ -1,9 +1,11 @@
 """
 Shared utilities for MongoDB Vector Store operations.
+
+Clients, the embedding model and vector stores are created on first use;
+langchain_openai / langchain_mongodb are imported there too, so importing
+this module needs neither network config nor the heavy LangChain integrations.
 """
-from langchain_openai import OpenAIEmbeddings
-from langchain_mongodb.vectorstores import MongoDBAtlasVectorSearch
-from pymongo import MongoClient
+from pymongo import MongoClient, AsyncMongoClient
 from dotenv import load_dotenv
 import os
 
@@ -15,12 +17,16 @@ MONGODB_URL = os.getenv("MONGODB_URL")
 DATABASE_NAME = os.getenv("DATABASE_NAME")
 QA_COLLECTION_NAME = os.getenv("QA_COLLECTION_NAME")
 ATLAS_VECTOR_SEARCH_INDEX_NAME = os.getenv("ATLAS_VECTOR_SEARCH_INDEX_NAME")
+# "atlas": MongoDB Atlas $vectorSearch, "local": memory-mapped NumPy snapshot (rag/local_vector_store.py)
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "atlas")
 
-# Embedding 設定
-_embedding_model = OpenAIEmbeddings(model="text-embedding-3-small")
+# Embedding 設定 (LRU + Redis 快取, 只有未命中的文字才會呼叫 OpenAI)
+EMBEDDING_MODEL_NAME = "text-embedding-3-small"
+_embedding_model = None
 
 # MongoDB 連接 (單例模式)
 _client = None
+_async_client = None
 _collection = None
 
 
@@ -32,6 +38,33 @@ def get_mongo_client():
     return _client
 
 
+def get_async_mongo_client():
+    """Get or create the asyncio MongoDB client (for non-blocking queries in the API process)."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncMongoClient(MONGODB_URL)
+    return _async_client
+
+
+def get_async_collection(collection: str):
+    """Get an async MongoDB collection instance."""
+    client = get_async_mongo_client()
+    return client[DATABASE_NAME][collection]
+
+
+def get_embedding_model():
+    """Get or create the shared embedding model instance."""
+    global _embedding_model
+    if _embedding_model is None:
+        from langchain_openai import OpenAIEmbeddings
+        from rag.mongo_db_utils.embedding_cache import CachedEmbeddings
+        _embedding_model = CachedEmbeddings(
+            OpenAIEmbeddings(model=EMBEDDING_MODEL_NAME),
+            model_name=EMBEDDING_MODEL_NAME,
+        )
+    return _embedding_model
+
+
 def get_collection(collection: str):
     """Get or create MongoDB collection instance."""
     client = get_mongo_client()
@@ -41,15 +74,32 @@ def get_collection(collection: str):
 def get_vector_store(collection: str):
     """
     Get or create MongoDBAtlasVectorSearch instance.
-    
+
+    Always the Atlas store, whatever VECTOR_BACKEND: ingestion and index
+    creation write to MongoDB. Retrieval goes through get_search_store.
+
     Returns:
         MongoDBAtlasVectorSearch: Configured vector store instance
     """
+    from langchain_mongodb.vectorstores import MongoDBAtlasVectorSearch
     collection = get_collection(collection=collection)
     return MongoDBAtlasVectorSearch(
         collection=collection,
-        embedding=_embedding_model,
+        embedding=get_embedding_model(),
         index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
         relevance_score_fn="cosine",
     )
 
+
+def get_search_store(collection: str):
+    """
+    Get the store retrieval reads from, as selected by VECTOR_BACKEND.
+
+    Returns:
+        LocalVectorStore (read-only snapshot) with VECTOR_BACKEND=local,
+        otherwise the MongoDBAtlasVectorSearch of get_vector_store
+    """
+    if VECTOR_BACKEND == "local":
+        from rag.local_vector_store import LocalVectorStore
+        return LocalVectorStore(collection, embedding=get_embedding_model())
+    return get_vector_store(collection)
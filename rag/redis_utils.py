@@ -0,0 +1,66 @@
+"""
+Shared Redis utilities for caches that sit in front of the RAG pipeline.
+"""
+import redis
+import redis.asyncio as aioredis
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+# Default assumes local development; Docker Compose will override with redis://redis:6379/0
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6383/0")
+
+# Keep cache lookups from hanging the request path when Redis is unreachable
+REDIS_CONN_KWARGS = {
+    "socket_timeout": 5,
+    "socket_connect_timeout": 5,
+}
+
+# 每次重新匯入資料 (re-ingest) 時遞增, 讓依賴資料內容的快取全部失效
+CORPUS_VERSION_KEY = "yichin:corpus_version"
+
+# Redis 連接 (單例模式)
+_redis_client = None
+_async_redis_client = None
+
+
+def get_redis_client():
+    """Get or create the synchronous Redis client (used by ingestion scripts)."""
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(REDIS_URL, **REDIS_CONN_KWARGS)
+    return _redis_client
+
+
+def get_async_redis_client():
+    """Get or create the asyncio Redis client (used inside the API process)."""
+    global _async_redis_client
+    if _async_redis_client is None:
+        _async_redis_client = aioredis.Redis.from_url(REDIS_URL, **REDIS_CONN_KWARGS)
+    return _async_redis_client
+
+
+def get_corpus_version() -> int:
+    """Return the current catalog/corpus version (0 if never bumped)."""
+    value = get_redis_client().get(CORPUS_VERSION_KEY)
+    return int(value) if value is not None else 0
+
+
+async def aget_corpus_version() -> int:
+    """Async variant of get_corpus_version."""
+    value = await get_async_redis_client().get(CORPUS_VERSION_KEY)
+    return int(value) if value is not None else 0
+
+
+def bump_corpus_version() -> int:
+    """
+    Increment the corpus version after a re-ingest.
+
+    Every cache keyed on the corpus version (e.g. the semantic answer cache)
+    stops serving entries written against the previous version.
+
+    Returns:
+        The new corpus version
+    """
+    return int(get_redis_client().incr(CORPUS_VERSION_KEY))
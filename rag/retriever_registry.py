@@ -0,0 +1,242 @@
+"""
+Registry of reusable hybrid search retrievers.
+
+Constructing MongoDBAtlasHybridSearchRetriever is not free: besides pydantic
+validation it lists the collection's search indexes (a network round trip) to
+decide whether to create the full-text index. The registry builds one retriever
+per (collection, parameters) once and only binds per-call post filters, and it
+keeps timing counters so construction and query cost can be compared. Async
+queries also record the embed and search stages in chatbot_retrieval_seconds.
+
+langchain_mongodb and the local retrievers (langchain_core.retrievers pulls in
+the LangSmith tracers) are imported when the first retriever is built, so
+importing rag.search_data stays cheap.
+"""
+from langchain_core.documents import Document
+from typing import Dict, List, Optional
+import json
+import threading
+import time
+
+from rag.mongo_db_utils.vector_store_utils import get_search_store, get_async_collection
+from metrics import RETRIEVAL_SECONDS
+
+DEFAULT_SEARCH_INDEX_NAME = "search_index"
+MAX_BOUND_RETRIEVERS = 256
+
+
+def build_hybrid_pipeline(retriever, query: str, query_vector: List[float]):
+    """
+    Build the same $vectorSearch + $search RRF aggregation that the
+    MongoDBAtlasHybridSearchRetriever runs, from an already computed query vector.
+    """
+    from langchain_mongodb.pipelines import (
+        combine_pipelines,
+        final_hybrid_stage,
+        reciprocal_rank_stage,
+        text_search_stage,
+        vector_search_stage,
+    )
+
+    store = retriever.vectorstore
+    pipeline = []
+
+    vector_pipeline = [
+        vector_search_stage(
+            query_vector=query_vector,
+            search_field=store._embedding_key,
+            index_name=store._index_name,
+            top_k=retriever.k,
+            filter=retriever.pre_filter,
+            oversampling_factor=retriever.oversampling_factor,
+        )
+    ]
+    vector_pipeline += reciprocal_rank_stage(score_field="vector_score", penalty=retriever.vector_penalty)
+    combine_pipelines(pipeline, vector_pipeline, store.collection.name)
+
+    text_pipeline = text_search_stage(
+        query=query,
+        search_field=store._text_key,
+        index_name=retriever.search_index_name,
+        limit=retriever.k,
+        filter=retriever.pre_filter,
+    )
+    text_pipeline.extend(reciprocal_rank_stage(score_field="fulltext_score", penalty=retriever.fulltext_penalty))
+    combine_pipelines(pipeline, text_pipeline, store.collection.name)
+
+    pipeline.extend(final_hybrid_stage(scores_fields=["vector_score", "fulltext_score"], limit=retriever.k))
+    pipeline.append({"$project": {store._embedding_key: 0}})
+
+    if retriever.post_filter is not None:
+        pipeline.extend(retriever.post_filter)
+
+    return pipeline
+
+
+class RetrieverRegistry:
+    """
+    Builds hybrid retrievers once per collection and parameter set.
+
+    Usage:
+        registry = get_retriever_registry()
+        docs = registry.invoke("qa_collection", query, k=5)
+        docs = await registry.ainvoke("product_collection", query, post_filter=[{"$match": {...}}])
+    """
+
+    def __init__(self):
+        self._stores = {}
+        self._retrievers = {}
+        self._bound = {}
+        self._lock = threading.Lock()
+        self._stats = {
+            "constructions": 0,
+            "construction_seconds": 0.0,
+            "binds": 0,
+            "queries": 0,
+            "query_seconds": 0.0,
+        }
+
+    def _get_store(self, collection: str):
+        store = self._stores.get(collection)
+        if store is None:
+            store = get_search_store(collection)
+            self._stores[collection] = store
+        return store
+
+    def get(
+        self,
+        collection: str,
+        k: int = 5,
+        fulltext_penalty: float = 50,
+        vector_penalty: float = 50,
+        search_index_name: str = DEFAULT_SEARCH_INDEX_NAME,
+        oversampling_factor: int = 10,
+    ):
+        """
+        Get (or build once) the base retriever for a collection and parameter set.
+
+        Returns a MongoDBAtlasHybridSearchRetriever, or a LocalHybridRetriever when
+        the collection is served from a local snapshot (VECTOR_BACKEND=local).
+        """
+        key = (collection, k, fulltext_penalty, vector_penalty, search_index_name, oversampling_factor)
+        retriever = self._retrievers.get(key)
+        if retriever is not None:
+            return retriever
+
+        with self._lock:
+            retriever = self._retrievers.get(key)
+            if retriever is None:
+                from rag.local_vector_store import LocalVectorStore
+                from rag.local_fulltext import LocalHybridRetriever
+
+                start = time.perf_counter()
+                store = self._get_store(collection)
+                if isinstance(store, LocalVectorStore):
+                    retriever = LocalHybridRetriever(
+                        vectorstore=store,
+                        k=k,
+                        fulltext_penalty=fulltext_penalty,
+                        vector_penalty=vector_penalty,
+                    )
+                else:
+                    from langchain_mongodb.retrievers import MongoDBAtlasHybridSearchRetriever
+                    retriever = MongoDBAtlasHybridSearchRetriever(
+                        vectorstore=store,
+                        search_index_name=search_index_name,
+                        k=k,
+                        oversampling_factor=oversampling_factor,
+                        fulltext_penalty=fulltext_penalty,
+                        vector_penalty=vector_penalty,
+                        auto_create_index=False,  # created by rag/mongo_db_utils/create_index.py
+                    )
+                self._stats["constructions"] += 1
+                self._stats["construction_seconds"] += time.perf_counter() - start
+                self._retrievers[key] = retriever
+        return retriever
+
+    def bind(self, retriever, post_filter: Optional[List[Dict]] = None):
+        """Return a copy of the retriever with a per-call post_filter (no re-validation)."""
+        if not post_filter:
+            return retriever
+
+        key = (id(retriever), json.dumps(post_filter, sort_keys=True, ensure_ascii=False))
+        bound = self._bound.get(key)
+        if bound is None:
+            bound = retriever.model_copy(update={"post_filter": post_filter})
+            self._stats["binds"] += 1
+            if len(self._bound) >= MAX_BOUND_RETRIEVERS:
+                self._bound.pop(next(iter(self._bound)))
+            self._bound[key] = bound
+        return bound
+
+    def _record_query(self, start: float):
+        self._stats["queries"] += 1
+        self._stats["query_seconds"] += time.perf_counter() - start
+
+    def invoke(self, collection: str, query: str, post_filter: Optional[List[Dict]] = None, **params) -> List[Document]:
+        """Run a hybrid search synchronously."""
+        retriever = self.bind(self.get(collection, **params), post_filter)
+        start = time.perf_counter()
+        try:
+            return retriever.invoke(query)
+        finally:
+            self._record_query(start)
+
+    async def ainvoke(self, collection: str, query: str, post_filter: Optional[List[Dict]] = None, **params) -> List[Document]:
+        """Run a hybrid search without blocking the event loop (aembed_query + async Mongo client)."""
+        from rag.local_fulltext import LocalHybridRetriever  # already loaded by get()
+
+        retriever = self.bind(self.get(collection, **params), post_filter)
+        store = retriever.vectorstore
+        start = time.perf_counter()
+        try:
+            if isinstance(retriever, LocalHybridRetriever):
+                return await retriever.ainvoke(query)
+            from langchain_mongodb.utils import make_serializable
+
+            embed_start = time.perf_counter()
+            query_vector = await store.embeddings.aembed_query(query)
+            search_start = time.perf_counter()
+            RETRIEVAL_SECONDS.labels(collection=collection, stage="embed").observe(search_start - embed_start)
+            pipeline = build_hybrid_pipeline(retriever, query, query_vector)
+
+            # $vectorSearch and $search run server-side in one $unionWith aggregate (one round trip)
+            cursor = await get_async_collection(store.collection.name).aggregate(pipeline)
+            docs = []
+            async for res in cursor:
+                text = res.pop(store._text_key)
+                make_serializable(res)
+                docs.append(Document(page_content=text, metadata=res))
+            RETRIEVAL_SECONDS.labels(collection=collection, stage="hybrid_search").observe(time.perf_counter() - search_start)
+            return docs
+        finally:
+            self._record_query(start)
+
+    def stats(self):
+        """
+        Construction vs query timing counters.
+
+        Returns:
+            Dict with totals and per-call averages in milliseconds
+        """
+        stats = dict(self._stats)
+        stats["cached_retrievers"] = len(self._retrievers)
+        stats["avg_construction_ms"] = (
+            stats["construction_seconds"] / stats["constructions"] * 1000 if stats["constructions"] else 0.0
+        )
+        stats["avg_query_ms"] = (
+            stats["query_seconds"] / stats["queries"] * 1000 if stats["queries"] else 0.0
+        )
+        return stats
+
+
+# ========== SINGLETON REGISTRY ==============
+_registry = None
+
+
+def get_retriever_registry():
+    """Get or create the shared retriever registry."""
+    global _registry
+    if _registry is None:
+        _registry = RetrieverRegistry()
+    return _registry
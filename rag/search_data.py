@@ -1,42 +1,32 @@
-from rag.mongo_db_utils.vector_store_utils import get_vector_store, get_collection
-from langchain_mongodb.retrievers import MongoDBAtlasHybridSearchRetriever
+from rag.mongo_db_utils.vector_store_utils import get_collection, get_async_collection
+from rag.retriever_registry import get_retriever_registry
+from rag.catalog_index import get_catalog_index, aget_catalog_index
+from langchain_core.documents import Document
+from functools import lru_cache
 import os
-from typing import Optional, Literal
+import time
+from typing import Optional, Literal, List
 import logger
 from dotenv import load_dotenv
 
 from data.product_data.product_data import PRODUCT_CATEGORIES, PRODUCT_NAME
+from metrics import RETRIEVAL_SECONDS
 
 load_dotenv()
 
 QA_COLLECTION_NAME = os.getenv("QA_COLLECTION_NAME")
 PRODUCT_COLLECTION_NAME = os.getenv("PRODUCT_COLLECTION_NAME")
-qa_store = get_vector_store(QA_COLLECTION_NAME)
-product_store = get_vector_store(PRODUCT_COLLECTION_NAME)
+# "memory": answer filter_products from the in-process catalog index, "mongo": query MongoDB
+CATALOG_BACKEND = os.getenv("CATALOG_BACKEND", "memory")
 
+SEARCH_INDEX_NAME = "search_index"
+FULLTEXT_PENALTY = 50
+VECTOR_PENALTY = 50
 
-def search_qa_data(query, k: int = 5):
-    """
-    Search QA collection using vector search.
-    
-    Args:
-        query: Search query string
-        k: Number of results to return
-        score_threshold: Minimum similarity score threshold
-    
-    Returns:
-        List of formatted search results
-    """
-    retriever = MongoDBAtlasHybridSearchRetriever(
-        vectorstore = qa_store,
-        search_index_name = "search_index",
-        top_k = k,
-        fulltext_penalty = 50,
-        vector_penalty = 50)
 
-    results = retriever.invoke(query)
-
-    # Format results into structured dictionaries
+# ========== SHARED HELPERS ==============
+def _format_qa_results(results: List[Document]):
+    """Format QA documents into structured dictionaries."""
     formatted_results = []
 
     for document in results:
@@ -64,29 +54,22 @@ def search_qa_data(query, k: int = 5):
     return formatted_results
 
 
-def filter_products(
-    category: Optional[Literal[PRODUCT_CATEGORIES]] = None,
-    product_name: Optional[Literal[PRODUCT_NAME]] = None,
+def _build_filter_query(
+    category: Optional[str] = None,
+    product_name: Optional[str] = None,
     price_min: Optional[int] = None,
     price_max: Optional[int] = None,
     size: Optional[str] = None,
-    limit: int = 100
 ):
-    """
-    Pure MongoDB filtering without vector search.
-    Returns ALL products matching the exact filter criteria.
-    """    
-    collection = get_collection(PRODUCT_COLLECTION_NAME)
-    
-    # Build MongoDB query filter
+    """Build the MongoDB query filter used by filter_products."""
     query_filter = {}
-    
+
     if category:
         query_filter["category"] = category
-    
+
     if product_name:
         query_filter["product_name"] = product_name
-    
+
     if price_min is not None or price_max is not None:
         price_filter = {}
         if price_min is not None:
@@ -95,15 +78,17 @@ def filter_products(
             price_filter["price_range.max"] = {"$lte": price_max}
         if price_filter:
             query_filter.update(price_filter)
-    
+
     if size:
         query_filter["variants.size"] = size
-    
-    # Query MongoDB directly
-    cursor = collection.find(query_filter).limit(limit)
-    
+
+    return query_filter
+
+
+def _format_filtered_products(docs):
+    """Format raw MongoDB product documents returned by a filter query."""
     formatted_results = []
-    for doc in cursor:
+    for doc in docs:
         ret = {
             "product_name": doc.get("product_name", ""),
             "description": doc.get("text", ""),
@@ -113,7 +98,7 @@ def filter_products(
             "score": 1.0,  # Pure filtering doesn't have similarity scores
         }
         formatted_results.append(ret)
-    
+
     if not formatted_results:
         formatted_results = [
             {
@@ -125,32 +110,32 @@ def filter_products(
                 "score": 0.0,
             }
         ]
-    
+
     return formatted_results
 
 
-def search_product_data(
-    query: str,
+@lru_cache(maxsize=256)
+def _build_post_filter(
     category: Optional[str] = None,
     product_name: Optional[str] = None,
     price_min: Optional[int] = None,
     price_max: Optional[int] = None,
-    size: Optional[str] = None
+    size: Optional[str] = None,
 ):
     """
-    Semantic vector search for products based on natural language queries.
-    
-    Use this for semantic queries about product features, attributes, or recommendations:
+    Build the $match post_filter pipeline for product hybrid search (None if no filters).
+
+    Memoized per filter combination; callers must not mutate the returned pipeline.
     """
     # Build filter conditions for metadata filtering
     filter_conditions = []
-    
+
     if category:
         filter_conditions.append({"category": category})
-    
+
     if product_name:
         filter_conditions.append({"product_name": product_name})
-    
+
     if price_min is not None or price_max is not None:
         price_filter = {}
         if price_min is not None:
@@ -159,28 +144,23 @@ def search_product_data(
             price_filter["price_range.max"] = {"$lte": price_max}
         if price_filter:
             filter_conditions.append(price_filter)
-    
+
     if size:
         filter_conditions.append({"variants.size": size})
-    
+
     # Build post_filter pipeline only if we have metadata filters
     # Note: No score_threshold for hybrid search (RRF uses rank-based scoring, not similarity scores)
     post_filter_pipeline = None
-    
+
     if filter_conditions:
         metadata_filter = {"$and": filter_conditions} if len(filter_conditions) > 1 else filter_conditions[0]
         post_filter_pipeline = [{"$match": metadata_filter}]
-    
-    retriever = MongoDBAtlasHybridSearchRetriever(
-        vectorstore = product_store,
-        search_index_name = "search_index",
-        top_k = 5,
-        fulltext_penalty = 50,
-        vector_penalty = 50,
-        post_filter=post_filter_pipeline)
 
-    results = retriever.invoke(query)
+    return post_filter_pipeline
 
+
+def _format_product_results(results: List[Document]):
+    """Format product documents returned by hybrid search."""
     formatted_results = []
     for document in results:
         ret = {
@@ -192,9 +172,9 @@ def search_product_data(
             "rank": document.metadata.get("rank", 0),
         }
         formatted_results.append(ret)
-    
+
     formatted_results.sort(key=lambda x: x["rank"])
-    
+
     if not formatted_results:
         formatted_results = [
             {
@@ -208,8 +188,165 @@ def search_product_data(
         ]
     return formatted_results
 
+
+# ========== SEARCH FUNCTIONS ==============
+def search_qa_data(query, k: int = 5):
+    """
+    Search QA collection using vector search.
+
+    Args:
+        query: Search query string
+        k: Number of results to return
+        score_threshold: Minimum similarity score threshold
+
+    Returns:
+        List of formatted search results
+    """
+    results = get_retriever_registry().invoke(
+        QA_COLLECTION_NAME,
+        query,
+        k=k,
+        fulltext_penalty=FULLTEXT_PENALTY,
+        vector_penalty=VECTOR_PENALTY,
+        search_index_name=SEARCH_INDEX_NAME)
+    return _format_qa_results(results)
+
+
+async def asearch_qa_data(query, k: int = 5):
+    """
+    Async version of search_qa_data.
+
+    Args:
+        query: Search query string
+        k: Number of results to return
+
+    Returns:
+        List of formatted search results
+    """
+    results = await get_retriever_registry().ainvoke(
+        QA_COLLECTION_NAME,
+        query,
+        k=k,
+        fulltext_penalty=FULLTEXT_PENALTY,
+        vector_penalty=VECTOR_PENALTY,
+        search_index_name=SEARCH_INDEX_NAME)
+    return _format_qa_results(results)
+
+
+def filter_products(
+    category: Optional[Literal[PRODUCT_CATEGORIES]] = None,
+    product_name: Optional[Literal[PRODUCT_NAME]] = None,
+    price_min: Optional[int] = None,
+    price_max: Optional[int] = None,
+    size: Optional[str] = None,
+    limit: int = 100
+):
+    """
+    Pure MongoDB filtering without vector search.
+    Returns ALL products matching the exact filter criteria.
+    """
+    start = time.perf_counter()
+    if CATALOG_BACKEND == "memory":
+        products = get_catalog_index().filter(category, product_name, price_min, price_max, size, limit)
+    else:
+        collection = get_collection(PRODUCT_COLLECTION_NAME)
+        query_filter = _build_filter_query(category, product_name, price_min, price_max, size)
+        # Query MongoDB directly
+        products = list(collection.find(query_filter).limit(limit))
+    RETRIEVAL_SECONDS.labels(collection=PRODUCT_COLLECTION_NAME, stage="filter").observe(time.perf_counter() - start)
+    return _format_filtered_products(products)
+
+
+async def afilter_products(
+    category: Optional[Literal[PRODUCT_CATEGORIES]] = None,
+    product_name: Optional[Literal[PRODUCT_NAME]] = None,
+    price_min: Optional[int] = None,
+    price_max: Optional[int] = None,
+    size: Optional[str] = None,
+    limit: int = 100
+):
+    """
+    Async version of filter_products (uses the async Mongo client).
+    """
+    start = time.perf_counter()
+    if CATALOG_BACKEND == "memory":
+        catalog_index = await aget_catalog_index()
+        products = catalog_index.filter(category, product_name, price_min, price_max, size, limit)
+    else:
+        collection = get_async_collection(PRODUCT_COLLECTION_NAME)
+        query_filter = _build_filter_query(category, product_name, price_min, price_max, size)
+        products = await collection.find(query_filter).limit(limit).to_list()
+    RETRIEVAL_SECONDS.labels(collection=PRODUCT_COLLECTION_NAME, stage="filter").observe(time.perf_counter() - start)
+    return _format_filtered_products(products)
+
+
+def search_product_data(
+    query: str,
+    category: Optional[str] = None,
+    product_name: Optional[str] = None,
+    price_min: Optional[int] = None,
+    price_max: Optional[int] = None,
+    size: Optional[str] = None
+):
+    """
+    Semantic vector search for products based on natural language queries.
+
+    Use this for semantic queries about product features, attributes, or recommendations:
+    """
+    post_filter_pipeline = _build_post_filter(category, product_name, price_min, price_max, size)
+
+    results = get_retriever_registry().invoke(
+        PRODUCT_COLLECTION_NAME,
+        query,
+        post_filter=post_filter_pipeline,
+        k=5,
+        fulltext_penalty=FULLTEXT_PENALTY,
+        vector_penalty=VECTOR_PENALTY,
+        search_index_name=SEARCH_INDEX_NAME)
+    return _format_product_results(results)
+
+
+async def asearch_product_data(
+    query: str,
+    category: Optional[str] = None,
+    product_name: Optional[str] = None,
+    price_min: Optional[int] = None,
+    price_max: Optional[int] = None,
+    size: Optional[str] = None
+):
+    """
+    Async version of search_product_data.
+    """
+    post_filter_pipeline = _build_post_filter(category, product_name, price_min, price_max, size)
+    results = await get_retriever_registry().ainvoke(
+        PRODUCT_COLLECTION_NAME,
+        query,
+        post_filter=post_filter_pipeline,
+        k=5,
+        fulltext_penalty=FULLTEXT_PENALTY,
+        vector_penalty=VECTOR_PENALTY,
+        search_index_name=SEARCH_INDEX_NAME)
+    return _format_product_results(results)
+
+
+def warm_up_retrievers():
+    """
+    Build the hybrid retrievers used by the search functions (vector store,
+    Mongo client) so the first query doesn't pay for construction.
+    """
+    registry = get_retriever_registry()
+    for collection in (QA_COLLECTION_NAME, PRODUCT_COLLECTION_NAME):
+        registry.get(
+            collection,
+            k=5,
+            fulltext_penalty=FULLTEXT_PENALTY,
+            vector_penalty=VECTOR_PENALTY,
+            search_index_name=SEARCH_INDEX_NAME)
+
+
 if __name__ == "__main__":
     # Check the accuracy of get_background_infos function
     query = "康適四孔棉抗菌被有哪些尺寸？"
     # print(search_data(query, score_threshold=0.7))
     print(search_product_data(query))
+    print(get_retriever_registry().stats())
@@ -0,0 +1 @@
+# Retrieval evaluation suite (labelled questions and parameter sweeps; not the ragas library)
@@ -0,0 +1,457 @@
+"""
+Retrieval quality vs latency evaluation and parameter sweep.
+
+Runs the labelled questions in ragas/retrieval_eval_set.jsonl (question ->
+expected FAQ sources or product names, plus the tool filters for
+filter-heavy product questions) for every configuration of the sweep grid
+and reports per question group (qa / product / product_filtered):
+- recall@k: share of the expected sources / products among the results
+- MRR: reciprocal rank of the first expected result
+- p50 / p95 search latency (query embedding excluded: it is the same for
+  every configuration and served from the embedding cache in production)
+- context: characters of retrieved text handed to the LLM
+
+Strategies:
+- hybrid: the production RRF fusion, swept over k, fulltext_penalty,
+  vector_penalty and (Atlas only) numCandidates = k * oversampling_factor
+- vector / fulltext: one side of the fusion only
+- filter: filter-first through the catalog index, for the questions with
+  category / size / price filters (the product tools run hybrid search with
+  a post filter for them)
+
+The cheapest configuration (least context, then lowest p50) whose recall and
+MRR are within --tolerance of the best is recommended per group.
+
+Backends:
+- local (default): LocalVectorStore snapshots in LOCAL_SNAPSHOT_DIR
+  (python -m rag.local_vector_store export ...). Query vectors are cached in
+  --query-vectors, so only the first run needs the OpenAI API
+- atlas: the $vectorSearch / $search aggregations against MongoDB Atlas
+- --synthetic: generated snapshots with hash embeddings (no API keys or
+  network; checks plumbing and latency, the quality numbers are not
+  representative)
+
+Usage:
+    python -m ragas.retrieval_eval
+    python -m ragas.retrieval_eval --synthetic
+    python -m ragas.retrieval_eval --backend atlas --oversampling 2 5 10 20
+    python -m ragas.retrieval_eval --k 3 5 --fulltext-penalty 10 50 --output logs/retrieval_sweep.json
+"""
+from langchain_core.documents import Document
+from dotenv import load_dotenv
+from itertools import product as grid
+from typing import Dict, List, Optional
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import time
+
+from logger import log_header, log_info, log_success, log_warning
+
+load_dotenv()
+
+EVAL_SET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "retrieval_eval_set.jsonl")
+DEFAULT_QUERY_VECTORS_PATH = "logs/retrieval_eval_query_vectors.json"
+STRATEGIES = ("hybrid", "vector", "fulltext", "filter")
+# Metadata field identifying a relevant document per collection
+KEY_FIELDS = {"qa": "source", "product": "product_name"}
+DEFAULT_OVERSAMPLING = 10  # RetrieverRegistry.get default
+
+
+def _percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def load_eval_set(path: str) -> List[Dict]:
+    """Load the labelled questions (one JSON object per line)."""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def group_of(item: Dict) -> str:
+    return f"{item['collection']}_filtered" if item.get("filters") else item["collection"]
+
+
+def production_config():
+    """The configuration rag/search_data.py currently uses."""
+    from rag.search_data import FULLTEXT_PENALTY, VECTOR_PENALTY
+    return {
+        "strategy": "hybrid",
+        "k": 5,
+        "fulltext_penalty": FULLTEXT_PENALTY,
+        "vector_penalty": VECTOR_PENALTY,
+        "oversampling": DEFAULT_OVERSAMPLING,
+    }
+
+
+def build_configs(args, backend: str) -> List[Dict]:
+    """Expand the sweep grid (oversampling only applies to Atlas, local search is exact)."""
+    oversampling = args.oversampling if backend == "atlas" else [None]
+    configs = []
+    for strategy in args.strategies:
+        if strategy == "hybrid":
+            for k, fulltext_penalty, vector_penalty, factor in grid(
+                args.k, args.fulltext_penalty, args.vector_penalty, oversampling
+            ):
+                configs.append({"strategy": strategy, "k": k, "fulltext_penalty": fulltext_penalty,
+                                "vector_penalty": vector_penalty, "oversampling": factor})
+        elif strategy == "vector":
+            for k, factor in grid(args.k, oversampling):
+                configs.append({"strategy": strategy, "k": k, "fulltext_penalty": None,
+                                "vector_penalty": None, "oversampling": factor})
+        elif strategy == "fulltext":
+            for k in args.k:
+                configs.append({"strategy": strategy, "k": k, "fulltext_penalty": None,
+                                "vector_penalty": None, "oversampling": None})
+        else:
+            configs.append({"strategy": strategy, "k": None, "fulltext_penalty": None,
+                            "vector_penalty": None, "oversampling": None})
+    return configs
+
+
+def config_label(config: Dict) -> str:
+    parts = [config["strategy"]]
+    for key, name in (("k", "k"), ("fulltext_penalty", "ft"), ("vector_penalty", "vec"), ("oversampling", "os")):
+        if config.get(key) is not None:
+            parts.append(f"{name}={config[key]:g}")
+    return " ".join(parts)
+
+
+# ========== QUERY VECTORS ==============
+def load_query_vectors(path: str, questions: List[str]) -> Dict[str, List[float]]:
+    """
+    Query embeddings from the cache file; missing questions are embedded and saved.
+
+    Args:
+        path: JSON cache file ({"model": ..., "vectors": {question: vector}})
+        questions: Questions of the evaluation set
+
+    Returns:
+        Dict mapping each question to its embedding
+    """
+    from rag.mongo_db_utils.vector_store_utils import EMBEDDING_MODEL_NAME, get_embedding_model
+
+    vectors = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached.get("model") == EMBEDDING_MODEL_NAME:
+            vectors = cached["vectors"]
+        else:
+            log_warning(f"Ignoring {path}: embedded with {cached.get('model')}, not {EMBEDDING_MODEL_NAME}")
+
+    missing = [question for question in dict.fromkeys(questions) if question not in vectors]
+    if missing:
+        log_info(f"Embedding {len(missing)} questions with {EMBEDDING_MODEL_NAME}")
+        vectors.update(zip(missing, get_embedding_model().embed_documents(missing)))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"model": EMBEDDING_MODEL_NAME, "vectors": vectors}, f, ensure_ascii=False)
+    return vectors
+
+
+# ========== BACKENDS ==============
+class LocalBackend:
+    """
+    Exact in-process search over LocalVectorStore snapshots (same code paths as VECTOR_BACKEND=local).
+
+    Args:
+        snapshot_dir: Root directory of the snapshots
+        collections: Collection name per group key ("qa", "product")
+    """
+
+    name = "local"
+
+    def __init__(self, snapshot_dir: str, collections: Dict[str, str]):
+        from rag.catalog_index import CatalogIndex
+        from rag.local_vector_store import LocalVectorStore
+
+        # Queries are embedded up front, so the stores need no embedding model
+        self.stores = {key: LocalVectorStore(name, embedding=None, snapshot_dir=snapshot_dir)
+                       for key, name in collections.items()}
+        for store in self.stores.values():
+            store.fulltext_index  # build BM25 outside the timed searches
+        self.catalog = CatalogIndex(self.stores["product"].records)
+
+    def searcher(self, collection: str, config: Dict, post_filter: Optional[List[Dict]]):
+        """Return search(query, query_vector) -> documents for one configuration."""
+        from rag.local_fulltext import LocalHybridRetriever
+        from rag.local_vector_store import apply_post_filter
+
+        store = self.stores[collection]
+        k = config["k"]
+        if config["strategy"] == "hybrid":
+            retriever = LocalHybridRetriever(
+                vectorstore=store,
+                k=k,
+                fulltext_penalty=config["fulltext_penalty"],
+                vector_penalty=config["vector_penalty"],
+                post_filter=post_filter,
+            )
+            return retriever._search
+        if config["strategy"] == "vector":
+            return lambda query, query_vector: apply_post_filter(store.vector_search(query_vector, k), post_filter)
+
+        def fulltext_search(query, query_vector):
+            indices, _ = store.fulltext_index.search(query, k)
+            docs = [store.to_document(int(index), rank=rank) for rank, index in enumerate(indices)]
+            return apply_post_filter(docs, post_filter)
+        return fulltext_search
+
+
+class AtlasBackend:
+    """
+    Synchronous aggregations against MongoDB Atlas, built like the production retrievers.
+
+    Args:
+        collections: Collection name per group key ("qa", "product")
+    """
+
+    name = "atlas"
+
+    def __init__(self, collections: Dict[str, str]):
+        from rag.catalog_index import get_catalog_index
+        from rag.retriever_registry import get_retriever_registry
+
+        self.collections = collections
+        self.registry = get_retriever_registry()
+        self.catalog = get_catalog_index()
+
+    def searcher(self, collection: str, config: Dict, post_filter: Optional[List[Dict]]):
+        """Return search(query, query_vector) -> documents for one configuration."""
+        from langchain_mongodb.pipelines import text_search_stage, vector_search_stage
+        from langchain_mongodb.utils import make_serializable
+        from rag.mongo_db_utils.vector_store_utils import get_collection
+        from rag.retriever_registry import build_hybrid_pipeline
+        from rag.search_data import FULLTEXT_PENALTY, SEARCH_INDEX_NAME, VECTOR_PENALTY
+
+        strategy, k = config["strategy"], config["k"]
+        retriever = self.registry.bind(self.registry.get(
+            self.collections[collection],
+            k=k,
+            fulltext_penalty=config["fulltext_penalty"] or FULLTEXT_PENALTY,
+            vector_penalty=config["vector_penalty"] or VECTOR_PENALTY,
+            search_index_name=SEARCH_INDEX_NAME,
+            oversampling_factor=config["oversampling"] or DEFAULT_OVERSAMPLING,
+        ), post_filter)
+        store = retriever.vectorstore
+        mongo_collection = get_collection(self.collections[collection])
+
+        def pipeline_for(query, query_vector):
+            if strategy == "hybrid":
+                return build_hybrid_pipeline(retriever, query, query_vector)
+            if strategy == "vector":
+                pipeline = [
+                    vector_search_stage(
+                        query_vector=query_vector,
+                        search_field=store._embedding_key,
+                        index_name=store._index_name,
+                        top_k=k,
+                        oversampling_factor=retriever.oversampling_factor,
+                    ),
+                    {"$project": {store._embedding_key: 0}},
+                ]
+            else:
+                pipeline = text_search_stage(query=query, search_field=store._text_key, index_name=SEARCH_INDEX_NAME, limit=k)
+                pipeline.append({"$project": {store._embedding_key: 0}})
+            return pipeline + (post_filter or [])
+
+        def search(query, query_vector):
+            docs = []
+            for res in mongo_collection.aggregate(pipeline_for(query, query_vector)):
+                text = res.pop(store._text_key)
+                make_serializable(res)
+                docs.append(Document(page_content=text, metadata=res))
+            return docs
+        return search
+
+
+def filter_searcher(catalog, filters: Dict):
+    """Filter-first search: every catalog product matching the question's filters."""
+    def search(query, query_vector):
+        products = catalog.filter(
+            filters.get("category"),
+            filters.get("product_name"),
+            filters.get("price_min"),
+            filters.get("price_max"),
+            filters.get("size"),
+        )
+        return [Document(page_content=product.get("text", ""), metadata=product) for product in products]
+    return search
+
+
+# ========== EVALUATION ==============
+def ranked_keys(docs: List[Document], key_field: str) -> List[str]:
+    """Distinct source / product names in result order (chunks of one page count once)."""
+    return list(dict.fromkeys(doc.metadata.get(key_field, "") for doc in docs))
+
+
+def evaluate(backend, config: Dict, items: List[Dict], vectors: Dict[str, List[float]], repeats: int) -> Dict:
+    """
+    Run one configuration over the items of a group.
+
+    Returns:
+        Dict with the configuration, recall, mrr, p50_ms, p95_ms and context_chars
+    """
+    from rag.search_data import _build_post_filter
+
+    latencies, recalls, reciprocal_ranks, context_chars = [], [], [], []
+    for item in items:
+        filters = item.get("filters") or {}
+        if config["strategy"] == "filter":
+            search = filter_searcher(backend.catalog, filters)
+        else:
+            search = backend.searcher(item["collection"], config, _build_post_filter(**filters) if filters else None)
+
+        question, query_vector = item["question"], vectors[item["question"]]
+        docs = search(question, query_vector)  # warm-up (connections, lazy indexes)
+        for _ in range(repeats):
+            start = time.perf_counter()
+            docs = search(question, query_vector)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        keys = ranked_keys(docs, KEY_FIELDS[item["collection"]])
+        expected = set(item["expected"])
+        recalls.append(len(expected.intersection(keys)) / len(expected))
+        reciprocal_ranks.append(next((1 / (rank + 1) for rank, key in enumerate(keys) if key in expected), 0.0))
+        context_chars.append(sum(len(doc.page_content) for doc in docs))
+
+    return {
+        **config,
+        "label": config_label(config),
+        "queries": len(items),
+        "recall": statistics.mean(recalls),
+        "mrr": statistics.mean(reciprocal_ranks),
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "context_chars": statistics.mean(context_chars),
+    }
+
+
+def recommend(rows: List[Dict], tolerance: float) -> Dict:
+    """Cheapest row (least context, then lowest p50) within tolerance of the best recall and MRR."""
+    best_recall = max(row["recall"] for row in rows)
+    best_mrr = max(row["mrr"] for row in rows)
+    candidates = [row for row in rows if row["recall"] >= best_recall - tolerance and row["mrr"] >= best_mrr - tolerance]
+    return min(candidates, key=lambda row: (row["context_chars"], row["p50_ms"]))
+
+
+def _same_config(row: Dict, config: Dict) -> bool:
+    return all(row[key] == config[key] or (key == "oversampling" and row[key] is None)
+               for key in ("strategy", "k", "fulltext_penalty", "vector_penalty", "oversampling"))
+
+
+def _report_row(row: Dict, marker: str = ""):
+    log_info(
+        f"{row['label']:<34} recall={row['recall']:.3f}  mrr={row['mrr']:.3f}  "
+        f"p50={row['p50_ms']:7.2f} ms  p95={row['p95_ms']:7.2f} ms  "
+        f"context={row['context_chars']:6.0f} chars{marker}"
+    )
+
+
+def report(results: Dict[str, List[Dict]], tolerance: float, top: int) -> Dict[str, Dict]:
+    """Print the best configurations per group and return the recommendation per group."""
+    current = production_config()
+    recommendations = {}
+    for group, rows in results.items():
+        log_header(f"{group} ({rows[0]['queries']} questions)")
+        ordered = sorted(rows, key=lambda row: (-row["recall"], -row["mrr"], row["context_chars"], row["p50_ms"]))
+        for row in ordered[:top]:
+            _report_row(row)
+
+        baseline = next((row for row in rows if _same_config(row, current)), None)
+        if baseline is not None:
+            log_info("current:")
+            _report_row(baseline, "  (rag/search_data.py)")
+
+        choice = recommend(rows, tolerance)
+        recommendations[group] = choice
+        log_success(
+            f"recommended: {choice['label']} (recall={choice['recall']:.3f}, mrr={choice['mrr']:.3f}, "
+            f"context={choice['context_chars']:.0f} chars, p50={choice['p50_ms']:.2f} ms)"
+        )
+    return recommendations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("local", "atlas"), default="local")
+    parser.add_argument("--synthetic", action="store_true",
+                        help="Generated snapshots with hash embeddings (fully offline, local backend)")
+    parser.add_argument("--eval-set", default=EVAL_SET_PATH, help="Labelled questions (JSON lines)")
+    parser.add_argument("--snapshot-dir", default=None, help="Local snapshot directory (default: LOCAL_SNAPSHOT_DIR)")
+    parser.add_argument("--qa-collection", default=os.getenv("QA_COLLECTION_NAME", "qa_collection"))
+    parser.add_argument("--product-collection", default=os.getenv("PRODUCT_COLLECTION_NAME", "product_collection"))
+    parser.add_argument("--query-vectors", default=DEFAULT_QUERY_VECTORS_PATH, help="Query embedding cache")
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument("--k", type=int, nargs="+", default=[3, 5, 8])
+    parser.add_argument("--fulltext-penalty", type=float, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--vector-penalty", type=float, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--oversampling", type=int, nargs="+", default=[DEFAULT_OVERSAMPLING],
+                        help="Atlas numCandidates = k * oversampling")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed searches per question and configuration")
+    parser.add_argument("--tolerance", type=float, default=0.02, help="Allowed recall / MRR loss vs the best")
+    parser.add_argument("--top", type=int, default=10, help="Configurations listed per group")
+    parser.add_argument("--output", help="Write all results as JSON")
+    args = parser.parse_args()
+
+    items = load_eval_set(args.eval_set)
+    questions = [item["question"] for item in items]
+
+    if args.synthetic:
+        from benchmarks.offline_stack import (
+            HashEmbeddings, PRODUCT_COLLECTION, QA_COLLECTION, product_records, qa_records, write_snapshot,
+        )
+        embeddings = HashEmbeddings()
+        snapshot_dir = tempfile.mkdtemp(prefix="retrieval_eval_")
+        write_snapshot(snapshot_dir, QA_COLLECTION, qa_records(), embeddings)
+        write_snapshot(snapshot_dir, PRODUCT_COLLECTION, product_records(), embeddings)
+        vectors = dict(zip(questions, embeddings.embed_documents(questions)))
+        backend = LocalBackend(snapshot_dir, {"qa": QA_COLLECTION, "product": PRODUCT_COLLECTION})
+        log_warning("Synthetic snapshots with hash embeddings: latency and plumbing only, quality is not representative")
+    else:
+        collections = {"qa": args.qa_collection, "product": args.product_collection}
+        vectors = load_query_vectors(args.query_vectors, questions)
+        if args.backend == "atlas":
+            backend = AtlasBackend(collections)
+        else:
+            from rag.local_vector_store import LOCAL_SNAPSHOT_DIR
+            backend = LocalBackend(args.snapshot_dir or LOCAL_SNAPSHOT_DIR, collections)
+    if backend.name == "local" and len(args.oversampling) > 1:
+        log_warning("--oversampling only applies to the Atlas backend (local search is exact)")
+
+    groups = {}
+    for item in items:
+        groups.setdefault(group_of(item), []).append(item)
+
+    configs = build_configs(args, backend.name)
+    log_info(f"{len(items)} questions, {len(configs)} configurations, backend={backend.name}")
+    results = {}
+    for group, group_items in groups.items():
+        for config in configs:
+            # Filter-first only answers questions that come with filters
+            if config["strategy"] == "filter" and group != "product_filtered":
+                continue
+            results.setdefault(group, []).append(evaluate(backend, config, group_items, vectors, args.repeats))
+
+    recommendations = report(results, args.tolerance, args.top)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({
+                "backend": backend.name,
+                "synthetic": args.synthetic,
+                "eval_set": args.eval_set,
+                "tolerance": args.tolerance,
+                "results": results,
+                "recommendations": recommendations,
+            }, f, ensure_ascii=False, indent=2)
+        log_success(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Import the repo's top-level packages (agent, rag, benchmarks, ...) when run as plain `pytest`
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
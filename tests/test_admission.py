@@ -0,0 +1,192 @@
+"""
+Admission control (agent/admission.py): priority order, load shedding and slot accounting.
+"""
+import asyncio
+
+import pytest
+
+from agent.admission import AdmissionController, AdmissionRejected
+
+
+async def _settle():
+    """Let queued tasks run up to their next await."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_waiters_are_admitted_stream_then_invoke_then_batch():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_per_uuid=10, queue_size=10, queue_timeout=5)
+        order = []
+
+        async def request(uuid, kind):
+            async with controller.admit(uuid, kind):
+                order.append(kind)
+
+        holder = await controller.acquire("holder", "invoke")
+        tasks = []
+        for uuid, kind in [("b1", "batch"), ("i1", "invoke"), ("s1", "stream"), ("b2", "batch"), ("s2", "stream")]:
+            tasks.append(asyncio.create_task(request(uuid, kind)))
+            await _settle()
+        assert controller.stats()["queued"] == {"stream": 2, "invoke": 1, "batch": 2}
+
+        holder.release()
+        await asyncio.gather(*tasks)
+        return order, controller.stats()
+
+    order, stats = asyncio.run(scenario())
+    assert order == ["stream", "stream", "invoke", "batch", "batch"]
+    assert stats["in_flight"] == 0
+    assert stats["admitted"] == 6
+
+
+def test_full_queue_rejects_equal_or_lower_priority():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_per_uuid=10, queue_size=1, queue_timeout=5)
+        holder = await controller.acquire("holder", "invoke")
+        waiter = asyncio.create_task(controller.acquire("waiter", "invoke"))
+        await _settle()
+
+        reasons = []
+        for kind in ("invoke", "batch"):
+            with pytest.raises(AdmissionRejected) as rejected:
+                await controller.acquire(f"late-{kind}", kind)
+            reasons.append(rejected.value.reason)
+            assert rejected.value.retry_after >= 1
+
+        holder.release()
+        (await waiter).release()
+        return reasons, controller.stats()
+
+    reasons, stats = asyncio.run(scenario())
+    assert reasons == ["queue_full", "queue_full"]
+    assert stats["rejected_queue_full"] == 2
+    assert stats["in_flight"] == 0
+
+
+def test_full_queue_evicts_lower_priority_waiter():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_per_uuid=10, queue_size=1, queue_timeout=5)
+        holder = await controller.acquire("holder", "invoke")
+        batch = asyncio.create_task(controller.acquire("batch-user", "batch"))
+        await _settle()
+        stream = asyncio.create_task(controller.acquire("stream-user", "stream"))
+        await _settle()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await batch
+        # The evicted waiter no longer counts against its conversation
+        assert "batch-user" not in controller._per_uuid
+
+        holder.release()
+        (await stream).release()
+        return rejected.value.reason, controller.stats()
+
+    reason, stats = asyncio.run(scenario())
+    assert reason == "evicted"
+    assert stats["rejected_evicted"] == 1
+    assert stats["queued"] == {"stream": 0, "invoke": 0, "batch": 0}
+    assert stats["in_flight"] == 0
+
+
+def test_waiter_is_shed_after_queue_timeout():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_per_uuid=10, queue_size=10, queue_timeout=0.05)
+        holder = await controller.acquire("holder", "invoke")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("waiter", "stream")
+        stats = controller.stats()
+        holder.release()
+        return rejected.value.reason, stats, controller
+
+    reason, stats, controller = asyncio.run(scenario())
+    assert reason == "timeout"
+    assert stats["rejected_timeout"] == 1
+    assert stats["queued"]["stream"] == 0
+    assert not controller._per_uuid
+    assert controller.stats()["in_flight"] == 0
+
+
+def test_cancel_after_handover_passes_the_slot_on():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_per_uuid=10, queue_size=10, queue_timeout=5)
+        holder = await controller.acquire("holder", "invoke")
+        first = asyncio.create_task(controller.acquire("first", "stream"))
+        second = asyncio.create_task(controller.acquire("second", "invoke"))
+        await _settle()
+
+        # The slot goes to `first`, which is cancelled before it gets to run
+        holder.release()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        ticket = await second
+        in_flight_while_held = controller.stats()["in_flight"]
+        ticket.release()
+        return in_flight_while_held, controller
+
+    in_flight_while_held, controller = asyncio.run(scenario())
+    assert in_flight_while_held == 1
+    assert controller.stats()["in_flight"] == 0
+    assert not controller._per_uuid
+
+
+def test_cancel_after_handover_without_waiters_frees_the_slot():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_per_uuid=10, queue_size=10, queue_timeout=5)
+        holder = await controller.acquire("holder", "invoke")
+        waiter = asyncio.create_task(controller.acquire("waiter", "stream"))
+        await _settle()
+
+        holder.release()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        return controller
+
+    controller = asyncio.run(scenario())
+    assert controller.stats()["in_flight"] == 0
+    assert not controller._per_uuid
+
+
+def test_per_uuid_cap_counts_running_and_waiting_requests():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=1, max_per_uuid=2, queue_size=10, queue_timeout=5)
+        running = await controller.acquire("same", "invoke")
+        waiting = asyncio.create_task(controller.acquire("same", "invoke"))
+        await _settle()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("same", "stream")
+        other = asyncio.create_task(controller.acquire("other", "invoke"))
+        await _settle()
+
+        running.release()
+        (await waiting).release()
+        (await other).release()
+        # Released conversations can send again
+        async with controller.admit("same", "invoke"):
+            pass
+        return rejected.value.reason, controller.stats()
+
+    reason, stats = asyncio.run(scenario())
+    assert reason == "per_uuid"
+    assert stats["rejected_per_uuid"] == 1
+    assert stats["in_flight"] == 0
+
+
+def test_ticket_release_is_idempotent():
+    async def scenario():
+        controller = AdmissionController(max_in_flight=2, max_per_uuid=2, queue_size=10, queue_timeout=5)
+        ticket = await controller.acquire("uuid", "invoke")
+        other = await controller.acquire("uuid", "invoke")
+        ticket.release()
+        ticket.release()
+        return controller, other
+
+    controller, other = asyncio.run(scenario())
+    assert controller.stats()["in_flight"] == 1
+    assert controller._per_uuid["uuid"] == 1
+    other.release()
+    assert controller.stats()["in_flight"] == 0
@@ -0,0 +1,171 @@
+"""
+In-process catalog index (rag/catalog_index.py) vs the MongoDB filter it replaces.
+
+The reference is the MQL query filter_products sends to MongoDB
+(rag.search_data._build_filter_query), evaluated with MongoDB semantics by
+rag.local_vector_store.match_filter: a None or missing price never matches a
+range, and any variant size matches a size filter.
+"""
+import asyncio
+import itertools
+
+import pytest
+from redis.exceptions import RedisError
+
+from benchmarks.offline_stack import product_records
+from rag import catalog_index
+from rag.catalog_index import CatalogIndex
+from rag.local_vector_store import match_filter
+from rag.search_data import _build_filter_query
+
+
+def _product(name, category, price_range, sizes):
+    return {
+        "text": name,
+        "product_name": name,
+        "category": category,
+        "price_range": price_range,
+        "variants": [{"size": size, "price": None} for size in sizes],
+    }
+
+
+# Boundary cases: equal prices, min == max, None / missing bounds, custom sizes
+EDGE_PRODUCTS = [
+    _product("A", "羽絨被", {"min": 3000, "max": 6000}, ["5*7", "6*7"]),
+    _product("B", "羽絨被", {"min": 3000, "max": 3000}, ["6*7"]),
+    _product("C", "蠶絲被", {"min": 2999, "max": 6001}, ["6*7", "7*8"]),
+    _product("D", "蠶絲被", {"min": None, "max": None}, ["6*7"]),
+    _product("E", "化纖被", {"min": 1500, "max": None}, ["3*4"]),
+    _product("F", "化纖被", {}, ["custom"]),
+    _product("G", "童被", None, ["3*4"]),
+    _product("H", "羽絨被", {"min": 6000, "max": 6000}, []),
+]
+
+
+def _mongo_filter(products, **filters):
+    query = _build_filter_query(**filters)
+    return [product["product_name"] for product in products if match_filter(product, query)]
+
+
+def _index_filter(index, **filters):
+    return [product["product_name"] for product in index.filter(**filters)]
+
+
+@pytest.mark.parametrize("filters, expected", [
+    ({"price_min": 3000}, ["A", "B", "H"]),
+    ({"price_max": 6000}, ["A", "B", "H"]),
+    ({"price_min": 3000, "price_max": 3000}, ["B"]),
+    ({"price_min": 6000, "price_max": 6000}, ["H"]),
+    ({"price_min": 2999}, ["A", "B", "C", "H"]),
+    ({"price_max": 6001}, ["A", "B", "C", "H"]),
+    ({"price_min": 1500}, ["A", "B", "C", "E", "H"]),
+    ({"price_max": 10**6}, ["A", "B", "C", "H"]),
+    ({"price_min": 6001}, []),
+    ({"size": "6*7"}, ["A", "B", "C", "D"]),
+    ({"size": "custom"}, ["F"]),
+    ({"category": "化纖被", "size": "3*4"}, ["E"]),
+    ({"category": "羽絨被", "price_min": 3000, "price_max": 5000}, ["B"]),
+    ({"category": "蠶絲被", "price_max": 7000}, ["C"]),
+    ({"product_name": "D", "size": "6*7"}, ["D"]),
+    ({"product_name": "D", "price_min": 0}, []),
+    ({"category": "不存在"}, []),
+])
+def test_edge_cases_match_mongo_filter(filters, expected):
+    index = CatalogIndex(EDGE_PRODUCTS)
+    assert _index_filter(index, **filters) == expected
+    assert _mongo_filter(EDGE_PRODUCTS, **filters) == expected
+
+
+def test_no_filters_returns_the_catalog_up_to_limit():
+    index = CatalogIndex(EDGE_PRODUCTS)
+    assert _index_filter(index) == [product["product_name"] for product in EDGE_PRODUCTS]
+    assert _index_filter(index, limit=3) == ["A", "B", "C"]
+    assert _index_filter(index, category="羽絨被", limit=2) == ["A", "B"]
+
+
+def test_full_catalog_matches_mongo_filter_for_all_combinations():
+    products = product_records()
+    index = CatalogIndex(products)
+    categories = [None] + sorted({product["category"] for product in products})
+    sizes = [None, "3*4", "6*7", "7*8", "custom"]
+    bounds = [None, 1780, 3000, 4480, 9900]
+
+    for category, size, price_min, price_max in itertools.product(categories, sizes, bounds, bounds):
+        filters = {"category": category, "size": size, "price_min": price_min, "price_max": price_max}
+        assert _index_filter(index, **filters) == _mongo_filter(products, **filters), filters
+
+    for name in {product["product_name"] for product in products}:
+        assert _index_filter(index, product_name=name) == _mongo_filter(products, product_name=name)
+
+
+def test_products_without_prices_never_match_a_price_filter():
+    products = product_records()
+    unpriced = {product["product_name"] for product in products if product["price_range"].get("min") is None}
+    assert unpriced, "fixture catalog should contain products without a listed price"
+
+    index = CatalogIndex(products)
+    for filters in ({"price_min": 0}, {"price_max": 10**9}, {"price_min": 0, "price_max": 10**9}):
+        assert not unpriced & set(_index_filter(index, **filters))
+    assert unpriced <= set(_index_filter(index))
+
+
+# ========== RELOAD ON VERSION BUMP ==============
+@pytest.fixture
+def catalog_source(monkeypatch):
+    """Module singleton backed by a mutable product list and corpus version."""
+    source = {"products": EDGE_PRODUCTS[:2], "version": 1, "redis_down": False, "loads": 0}
+
+    def load_products():
+        source["loads"] += 1
+        return list(source["products"])
+
+    def corpus_version():
+        if source["redis_down"]:
+            raise RedisError("connection refused")
+        return source["version"]
+
+    async def acorpus_version():
+        return corpus_version()
+
+    monkeypatch.setattr(catalog_index, "_load_products", load_products)
+    monkeypatch.setattr(catalog_index, "get_corpus_version", corpus_version)
+    monkeypatch.setattr(catalog_index, "aget_corpus_version", acorpus_version)
+    monkeypatch.setattr(catalog_index, "CATALOG_VERSION_CHECK_SECONDS", 0)
+    monkeypatch.setattr(catalog_index, "_catalog_index", None)
+    monkeypatch.setattr(catalog_index, "_last_version_check", 0.0)
+    return source
+
+
+def test_index_reloads_on_corpus_version_bump(catalog_source):
+    first = catalog_index.get_catalog_index()
+    assert (first.version, _index_filter(first)) == (1, ["A", "B"])
+    assert catalog_index.get_catalog_index() is first
+
+    catalog_source["products"] = EDGE_PRODUCTS[2:4]
+    catalog_source["version"] = 2
+    second = catalog_index.get_catalog_index()
+
+    assert second is not first
+    assert (second.version, _index_filter(second)) == (2, ["C", "D"])
+    # Readers holding the old index keep a consistent view
+    assert _index_filter(first) == ["A", "B"]
+    assert catalog_source["loads"] == 2
+
+
+def test_async_index_reloads_on_corpus_version_bump(catalog_source):
+    first = asyncio.run(catalog_index.aget_catalog_index())
+    catalog_source["products"] = EDGE_PRODUCTS[4:6]
+    catalog_source["version"] = 5
+    second = asyncio.run(catalog_index.aget_catalog_index())
+
+    assert (first.version, second.version) == (1, 5)
+    assert _index_filter(second) == ["E", "F"]
+
+
+def test_redis_outage_keeps_the_current_index(catalog_source):
+    first = catalog_index.get_catalog_index()
+    catalog_source["redis_down"] = True
+    catalog_source["version"] = 2
+
+    assert catalog_index.get_catalog_index() is first
+    assert catalog_source["loads"] == 1
@@ -0,0 +1,135 @@
+"""
+Local intent router (agent/router/intent_router.py): filter extraction, confidence and the fast path.
+"""
+import asyncio
+
+import pytest
+
+from agent.router import intent_router
+from agent.router.intent_router import IntentRouter
+
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentRouter(threshold=0.8, mode="on", log_path="")
+
+
+@pytest.mark.parametrize("question, filters", [
+    ("羽絨被有哪些", {"category": "羽絨被"}),
+    ("6*7 的蠶絲被價格", {"category": "蠶絲被", "size": "6*7"}),
+    ("６ｘ７的蠶絲被價格", {"category": "蠶絲被", "size": "6*7"}),
+    ("3*4 的羽絨被價格", {"category": "羽絨被", "size": "3*4"}),
+    ("5000元以下的化纖被有哪些", {"category": "化纖被", "price_max": 5000}),
+    ("不超過3000元的化纖被有哪些", {"category": "化纖被", "price_max": 3000}),
+    ("6000以上的羽絨被有哪些", {"category": "羽絨被", "price_min": 6000}),
+    ("康適木棉蠶絲被多少錢", {"product_name": "康適木棉蠶絲被"}),
+])
+def test_catalog_lookups_are_confident(router, question, filters):
+    decision = router.classify(question)
+    assert decision["filters"] == filters
+    assert decision["confidence"] >= router.threshold
+    assert decision["reason"] == "catalog_lookup"
+
+
+def test_price_range_without_lookup_phrase_is_penalized(router):
+    decision = router.classify("3000到6000元的羽絨被")
+    assert decision["filters"] == {"category": "羽絨被", "price_min": 3000, "price_max": 6000}
+    assert decision["confidence"] == pytest.approx(0.75)
+
+
+@pytest.mark.parametrize("question", [
+    "非羽絨被有哪些",
+    "不要羽絨被 有哪些",
+    "不是羽絨被的有哪些",
+    "除了羽絨被以外有哪些",
+    "羽絨被以外的有哪些",
+    "沒有羽絨被的款式有哪些",
+    "6*7 但不是蠶絲被的價格",
+])
+def test_negated_questions_are_not_catalog_lookups(router, question):
+    decision = router.classify(question)
+    assert decision == {"filters": None, "confidence": 0.0, "reason": "negation"}
+
+
+@pytest.mark.parametrize("question, reason", [
+    ("羽絨被和蠶絲被有哪些", "multiple_category"),
+    ("6*7 5*7 蠶絲被", "multiple_size"),
+    ("9*9 羽絨被價格", "unknown_size"),
+    ("福大手工蠶絲被多少錢", "ambiguous_product"),
+    ("你們的門市在哪裡", "no_catalog_entity"),
+])
+def test_questions_outside_one_filter_query_are_rejected(router, question, reason):
+    decision = router.classify(question)
+    assert decision["filters"] is None
+    assert decision["reason"] == reason
+
+
+def test_free_text_lowers_confidence(router):
+    decision = router.classify("羽絨被怎麼洗")
+    assert decision["reason"] == "unexplained_text"
+    assert decision["confidence"] < router.threshold
+
+
+def _fake_filter(products):
+    calls = []
+
+    async def afilter_products(**filters):
+        calls.append(filters)
+        return products
+
+    return afilter_products, calls
+
+
+PRODUCTS = [{
+    "product_name": "DeLuxe 95/5立體鵝絨被",
+    "category": "羽絨被",
+    "variants": [{"size": "6*7", "price": 12800}, {"size": "7*8", "price": 14800}],
+    "score": 1,
+}]
+
+
+def test_confident_decision_is_served_from_the_filter(router, monkeypatch):
+    afilter_products, calls = _fake_filter(PRODUCTS)
+    monkeypatch.setattr(intent_router, "afilter_products", afilter_products)
+
+    decision = asyncio.run(router.adecide("6*7 的羽絨被價格"))
+
+    assert calls == [{"category": "羽絨被", "size": "6*7", "limit": 100}]
+    assert router.should_serve(decision)
+    assert "DeLuxe 95/5立體鵝絨被" in decision["answer"]
+    assert "12,800 元" in decision["answer"]
+    # Other sizes of the product are left out of a size lookup
+    assert "14,800" not in decision["answer"]
+
+
+def test_negated_decision_never_reaches_the_filter(router, monkeypatch):
+    afilter_products, calls = _fake_filter(PRODUCTS)
+    monkeypatch.setattr(intent_router, "afilter_products", afilter_products)
+
+    decision = asyncio.run(router.adecide("非羽絨被有哪些"))
+
+    assert calls == []
+    assert not decision["confident"]
+    assert not router.should_serve(decision)
+
+
+def test_empty_filter_result_falls_back_to_the_agent(router, monkeypatch):
+    afilter_products, _ = _fake_filter([])
+    monkeypatch.setattr(intent_router, "afilter_products", afilter_products)
+
+    decision = asyncio.run(router.adecide("羽絨被有哪些"))
+
+    assert decision["confident"]
+    assert decision["answer"] is None
+    assert not router.should_serve(decision)
+
+
+def test_shadow_mode_never_serves(monkeypatch):
+    afilter_products, _ = _fake_filter(PRODUCTS)
+    monkeypatch.setattr(intent_router, "afilter_products", afilter_products)
+    shadow = IntentRouter(threshold=0.8, mode="shadow", log_path="")
+
+    decision = asyncio.run(shadow.adecide("羽絨被有哪些"))
+
+    assert decision["answer"] is not None
+    assert not shadow.should_serve(decision)
@@ -0,0 +1,247 @@
+"""
+Ranking and filtering of the local retrieval backend (rag/local_vector_store.py, rag/local_fulltext.py).
+
+Snapshots are written with the offline stand-ins of benchmarks/offline_stack.py
+(deterministic hash embeddings), so no API keys or network are needed.
+"""
+import json
+import shutil
+
+import numpy as np
+import pytest
+
+from benchmarks.offline_stack import HashEmbeddings, product_records, qa_records, write_snapshot
+from rag import local_vector_store
+from rag.catalog_index import CatalogIndex
+from rag.local_fulltext import LocalHybridRetriever
+from rag.local_vector_store import LocalVectorStore, apply_post_filter, match_filter
+from rag.mongo_db_utils import vector_store_utils
+from rag.search_data import _build_post_filter
+
+TEXTS = ["羽絨被保暖", "蠶絲被透氣", "羽絨被保暖", "枕頭高度怎麼挑", "羽絨被保暖", "宿舍寢具怎麼選"]
+
+
+@pytest.fixture(scope="module")
+def embeddings():
+    return HashEmbeddings()
+
+
+@pytest.fixture
+def small_store(tmp_path, embeddings):
+    write_snapshot(tmp_path, "small", [{"text": text, "row": i} for i, text in enumerate(TEXTS)], embeddings)
+    return LocalVectorStore("small", embeddings, snapshot_dir=tmp_path)
+
+
+@pytest.fixture(scope="module")
+def product_store(tmp_path_factory, embeddings):
+    snapshot_dir = tmp_path_factory.mktemp("snapshots")
+    write_snapshot(snapshot_dir, "products", product_records(), embeddings)
+    return LocalVectorStore("products", embeddings, snapshot_dir=snapshot_dir)
+
+
+# ========== TOP-K ==============
+def test_top_k_orders_by_cosine_score(product_store, embeddings):
+    query = embeddings.embed_query("DACRON 七孔抗菌被")
+    indices, scores = product_store.top_k(query, 10)
+
+    assert indices.shape == scores.shape == (1, 10)
+    assert np.all(np.diff(scores[0]) <= 0)
+    # The scores are the exact cosine similarities of the returned rows
+    expected = np.asarray(product_store.matrix, dtype=np.float32)[indices[0]] @ np.asarray(query, dtype=np.float32)
+    np.testing.assert_allclose(scores[0], expected, rtol=1e-5)
+    # And no row outside the top k scores higher than the k-th one
+    all_scores = np.asarray(product_store.matrix, dtype=np.float32) @ np.asarray(query, dtype=np.float32)
+    assert np.sort(all_scores)[::-1][9] == pytest.approx(scores[0][-1], rel=1e-5)
+
+
+def test_top_k_exact_match_ranks_first(product_store, embeddings):
+    record = product_store.records[7]
+    indices, scores = product_store.top_k(embeddings.embed_query(record["text"]), 3)
+    assert indices[0][0] == 7
+    assert scores[0][0] == pytest.approx(1.0, abs=1e-5)
+
+
+def test_top_k_ties_are_adjacent_with_equal_scores(small_store, embeddings):
+    indices, scores = small_store.top_k(embeddings.embed_query("羽絨被保暖"), len(TEXTS))
+
+    duplicates = {0, 2, 4}
+    assert set(indices[0][:3]) == duplicates
+    assert scores[0][0] == scores[0][1] == scores[0][2]
+    assert scores[0][3] < scores[0][2]
+
+
+def test_top_k_cut_through_a_tie_returns_tied_rows(small_store, embeddings):
+    indices, scores = small_store.top_k(embeddings.embed_query("羽絨被保暖"), 2)
+    assert set(indices[0]) <= {0, 2, 4}
+    assert scores[0][0] == scores[0][1]
+
+
+def test_top_k_clamps_k_and_handles_batches(small_store, embeddings):
+    queries = embeddings.embed_documents(["羽絨被保暖", "枕頭高度怎麼挑"])
+
+    indices, _ = small_store.top_k(queries, 100)
+    assert indices.shape == (2, len(TEXTS))
+    for row, query in enumerate(queries):
+        single, _ = small_store.top_k(query, 100)
+        assert set(single[0]) == set(indices[row])
+
+    empty, empty_scores = small_store.top_k(queries[0], 0)
+    assert empty.shape == empty_scores.shape == (1, 0)
+
+
+def test_vector_search_documents_carry_rank_and_score(small_store, embeddings):
+    docs = small_store.vector_search(embeddings.embed_query("枕頭高度怎麼挑"), 3)
+    assert docs[0].metadata["row"] == 3
+    assert [doc.metadata["rank"] for doc in docs] == [0, 1, 2]
+    assert docs[0].metadata["score"] >= docs[1].metadata["score"] >= docs[2].metadata["score"]
+
+
+def test_hybrid_ranks_documents_found_by_both_lists_first(small_store, embeddings):
+    retriever = LocalHybridRetriever(vectorstore=small_store, k=3)
+    docs = retriever._search("枕頭高度怎麼挑", embeddings.embed_query("枕頭高度怎麼挑"))
+
+    assert docs[0].metadata["row"] == 3
+    assert docs[0].metadata["vector_score"] > 0 and docs[0].metadata["fulltext_score"] > 0
+    fused = [doc.metadata["score"] for doc in docs]
+    assert fused == sorted(fused, reverse=True)
+
+
+# ========== POST FILTERS ==============
+FILTER_CASES = [
+    {"category": "羽絨被"},
+    {"category": "童被"},
+    {"product_name": "福大手工蠶絲被"},
+    {"size": "6*7"},
+    {"category": "化纖被", "size": "7*8"},
+    {"category": "化纖被", "price_max": 3000},
+    {"category": "羽絨被", "price_min": 5000},
+    {"price_min": 2000, "price_max": 6000, "size": "5*7"},
+    {"category": "羽絨被", "size": "3*4"},
+]
+
+
+@pytest.mark.parametrize("filters", FILTER_CASES, ids=lambda filters: json.dumps(filters, ensure_ascii=False))
+def test_post_filter_matches_catalog_filter(product_store, filters):
+    """apply_post_filter on _build_post_filter output keeps exactly the products the catalog index returns."""
+    docs = [product_store.to_document(i) for i in range(len(product_store))]
+    kept = apply_post_filter(docs, _build_post_filter(**filters))
+
+    catalog = CatalogIndex(product_store.records).filter(
+        filters.get("category"), filters.get("product_name"), filters.get("price_min"),
+        filters.get("price_max"), filters.get("size"),
+    )
+    assert sorted(doc.metadata["product_name"] for doc in kept) == sorted(product["product_name"] for product in catalog)
+
+
+def test_post_filter_semantics_on_product_fields(product_store):
+    docs = [product_store.to_document(i) for i in range(len(product_store))]
+
+    for doc in apply_post_filter(docs, _build_post_filter(size="6*7")):
+        assert "6*7" in [variant["size"] for variant in doc.metadata["variants"]]
+    for doc in apply_post_filter(docs, _build_post_filter(price_min=3000, price_max=9000)):
+        assert doc.metadata["price_range"]["min"] >= 3000
+        assert doc.metadata["price_range"]["max"] <= 9000
+
+
+def test_apply_post_filter_without_filters_keeps_everything(small_store):
+    docs = [small_store.to_document(i) for i in range(len(small_store))]
+    assert _build_post_filter() is None
+    assert apply_post_filter(docs, None) == docs
+    assert apply_post_filter(docs, []) == docs
+
+
+def test_apply_post_filter_rejects_non_match_stages(small_store):
+    docs = [small_store.to_document(0)]
+    with pytest.raises(ValueError):
+        apply_post_filter(docs, [{"$limit": 1}])
+
+
+def test_match_filter_operators():
+    doc = {"category": "羽絨被", "price_range": {"min": 4000, "max": 12000}, "variants": [{"size": "6*7"}, {"size": "7*8"}]}
+
+    assert match_filter(doc, {"variants.size": "7*8"})
+    assert not match_filter(doc, {"variants.size": "3*4"})
+    assert match_filter(doc, {"price_range.min": {"$gte": 4000, "$lt": 5000}})
+    assert not match_filter(doc, {"price_range.max": {"$lte": 10000}})
+    assert match_filter(doc, {"category": {"$in": ["羽絨被", "蠶絲被"]}})
+    assert not match_filter(doc, {"category": {"$ne": "羽絨被"}})
+    assert match_filter(doc, {"$or": [{"category": "蠶絲被"}, {"variants.size": "6*7"}]})
+    assert not match_filter(doc, {"$and": [{"category": "羽絨被"}, {"variants.size": "3*4"}]})
+    # Missing fields never match a comparison
+    assert not match_filter(doc, {"price_range.avg": {"$gte": 0}})
+
+
+# ========== FLOAT16 SNAPSHOTS ==============
+@pytest.fixture(scope="module")
+def parity_stores(tmp_path_factory, embeddings):
+    """The same QA + product snapshot stored as float32 and as float16."""
+    float32_dir = tmp_path_factory.mktemp("float32")
+    write_snapshot(float32_dir, "corpus", qa_records() + product_records(), embeddings)
+
+    float16_dir = tmp_path_factory.mktemp("float16")
+    shutil.copytree(float32_dir / "corpus", float16_dir / "corpus")
+    matrix = np.load(float16_dir / "corpus" / "embeddings.npy")
+    np.save(float16_dir / "corpus" / "embeddings.npy", matrix.astype(np.float16))
+
+    return (
+        LocalVectorStore("corpus", embeddings, snapshot_dir=float32_dir),
+        LocalVectorStore("corpus", embeddings, snapshot_dir=float16_dir),
+    )
+
+
+PARITY_QUERIES = ["蠶絲被怎麼洗", "6*7 羽絨被多少錢", "宿舍寢具怎麼選", "枕頭高度怎麼挑", "DACRON 七孔被", "品牌故事"]
+
+
+def test_float16_snapshot_matches_float32_ranking(parity_stores, embeddings):
+    full, half = parity_stores
+    assert half.matrix.dtype == np.float16
+    exact = np.asarray(full.matrix, dtype=np.float32)
+
+    for query in PARITY_QUERIES:
+        query_vector = embeddings.embed_query(query)
+        full_indices, full_scores = full.top_k(query_vector, 5)
+        half_indices, half_scores = half.top_k(query_vector, 5)
+
+        np.testing.assert_allclose(half_scores, full_scores, atol=2e-3)
+        # Rows may only swap where float32 scores differ by less than float16 precision
+        np.testing.assert_allclose(exact[half_indices[0]] @ np.asarray(query_vector, dtype=np.float32),
+                                   full_scores[0], atol=2e-3)
+        if full_scores[0][0] - full_scores[0][1] > 2e-3:
+            assert half_indices[0][0] == full_indices[0][0]
+
+
+def test_float16_block_scoring_matches_single_block(parity_stores, embeddings, monkeypatch):
+    _, half = parity_stores
+    query_vectors = embeddings.embed_documents(PARITY_QUERIES)
+    indices, scores = half.top_k(query_vectors, 5)
+
+    # Force many upcast blocks, including a ragged last one
+    monkeypatch.setattr(local_vector_store, "SCORE_BLOCK_ROWS", 7)
+    block_indices, block_scores = half.top_k(query_vectors, 5)
+
+    np.testing.assert_array_equal(block_indices, indices)
+    np.testing.assert_allclose(block_scores, scores, rtol=1e-6)
+
+
+# ========== STORE SELECTION ==============
+@pytest.fixture
+def local_backend(monkeypatch, tmp_path, embeddings):
+    """VECTOR_BACKEND=local with a snapshot of "products" in tmp_path."""
+    write_snapshot(tmp_path, "products", product_records(), embeddings)
+    monkeypatch.setattr(vector_store_utils, "VECTOR_BACKEND", "local")
+    monkeypatch.setattr(vector_store_utils, "DATABASE_NAME", "test_db")
+    monkeypatch.setattr(vector_store_utils, "get_embedding_model", lambda: embeddings)
+    monkeypatch.setattr(LocalVectorStore.__init__, "__defaults__", (str(tmp_path),))
+
+
+def test_search_store_follows_vector_backend(local_backend):
+    assert isinstance(vector_store_utils.get_search_store("products"), LocalVectorStore)
+
+
+def test_write_paths_keep_the_atlas_store_with_local_backend(local_backend):
+    from langchain_mongodb.vectorstores import MongoDBAtlasVectorSearch
+
+    # Ingestion (sync_documents / add_documents) and index creation need the writable Atlas store
+    store = vector_store_utils.get_vector_store("products")
+    assert isinstance(store, MongoDBAtlasVectorSearch)
+    assert hasattr(store, "add_documents") and hasattr(store, "create_vector_search_index")
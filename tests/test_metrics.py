@@ -0,0 +1,20 @@
+"""
+Metrics setup (metrics.py).
+"""
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_creates_missing_multiprocess_dir(tmp_path):
+    # Fresh interpreter: prometheus_client reads PROMETHEUS_MULTIPROC_DIR when metrics are defined
+    multiproc_dir = tmp_path / "prometheus_metrics"
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(multiproc_dir), "METRICS_ENABLED": "true"}
+    code = "import metrics; metrics.ADMISSION_IN_FLIGHT.set(1); print(metrics.render_metrics()[0].decode())"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+
+    assert result.returncode == 0, result.stderr
+    assert "chatbot_admission_in_flight 1.0" in result.stdout
+    assert any(name.startswith("gauge_livesum_") for name in os.listdir(multiproc_dir))
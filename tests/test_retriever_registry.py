@@ -0,0 +1,80 @@
+"""
+Hybrid search pipeline of the retriever registry (rag/retriever_registry.py).
+
+RetrieverRegistry.ainvoke rebuilds the MongoDBAtlasHybridSearchRetriever
+aggregation itself (from private attributes of the vector store) so it can
+embed asynchronously. These tests compare it with the pipeline the retriever
+sends on its own, so a langchain-mongodb upgrade cannot make them drift apart
+silently. No MongoDB server is needed: the collection only records pipelines.
+"""
+import pytest
+from pymongo import MongoClient
+from pymongo.collection import Collection
+
+from benchmarks.offline_stack import HashEmbeddings
+from rag.retriever_registry import RetrieverRegistry, build_hybrid_pipeline
+
+
+class RecordingCollection(Collection):
+    """A pymongo collection whose aggregate() records the pipeline and returns nothing."""
+
+    def aggregate(self, pipeline, *args, **kwargs):
+        self.__dict__.setdefault("pipelines", []).append(pipeline)
+        return iter([])
+
+
+@pytest.fixture(scope="module")
+def embeddings():
+    return HashEmbeddings()
+
+
+@pytest.fixture
+def collection():
+    client = MongoClient("mongodb://localhost:1", connect=False, serverSelectionTimeoutMS=100)
+    yield RecordingCollection(client["test_db"], "product_collection")
+    client.close()
+
+
+def _retriever(collection, embeddings, **params):
+    from langchain_mongodb.retrievers import MongoDBAtlasHybridSearchRetriever
+    from langchain_mongodb.vectorstores import MongoDBAtlasVectorSearch
+
+    store = MongoDBAtlasVectorSearch(
+        collection=collection, embedding=embeddings, index_name="vector_index", relevance_score_fn="cosine",
+    )
+    # Same construction as RetrieverRegistry.get
+    return MongoDBAtlasHybridSearchRetriever(
+        vectorstore=store,
+        search_index_name=params.get("search_index_name", "search_index"),
+        k=params.get("k", 5),
+        oversampling_factor=params.get("oversampling_factor", 10),
+        fulltext_penalty=params.get("fulltext_penalty", 50),
+        vector_penalty=params.get("vector_penalty", 50),
+        auto_create_index=False,
+    )
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"k": 3, "fulltext_penalty": 10, "vector_penalty": 80},
+    {"k": 8, "oversampling_factor": 20, "search_index_name": "product_search_index"},
+])
+@pytest.mark.parametrize("post_filter", [
+    None,
+    [{"$match": {"category": "羽絨被"}}],
+    [{"$match": {"$and": [{"price_range.min": {"$gte": 3000}}, {"variants.size": "6*7"}]}}],
+])
+def test_built_pipeline_matches_the_retriever_pipeline(collection, embeddings, params, post_filter):
+    retriever = RetrieverRegistry().bind(_retriever(collection, embeddings, **params), post_filter)
+    query = "6*7 羽絨被推薦"
+
+    retriever.invoke(query)
+    built = build_hybrid_pipeline(retriever, query, embeddings.embed_query(query))
+
+    assert built == collection.pipelines[-1]
+
+
+def test_store_attributes_used_by_ainvoke_exist(collection, embeddings):
+    store = _retriever(collection, embeddings).vectorstore
+    # ainvoke reads the text field of each result with store._text_key
+    assert (store._text_key, store._embedding_key, store._index_name) == ("text", "embedding", "vector_index")
@@ -0,0 +1,50 @@
+"""
+Catalog filtering entry points of rag/search_data.py.
+"""
+import asyncio
+
+import pytest
+
+from benchmarks.offline_stack import product_records
+from rag import search_data
+from rag.catalog_index import CatalogIndex
+
+
+class RecordingHistogram:
+    def __init__(self):
+        self.observations = []
+
+    def labels(self, **labels):
+        self._labels = labels
+        return self
+
+    def observe(self, value):
+        self.observations.append((self._labels, value))
+
+
+@pytest.fixture
+def memory_catalog(monkeypatch):
+    index = CatalogIndex(product_records())
+
+    async def aget_catalog_index():
+        return index
+
+    histogram = RecordingHistogram()
+    monkeypatch.setattr(search_data, "CATALOG_BACKEND", "memory")
+    monkeypatch.setattr(search_data, "get_catalog_index", lambda: index)
+    monkeypatch.setattr(search_data, "aget_catalog_index", aget_catalog_index)
+    monkeypatch.setattr(search_data, "RETRIEVAL_SECONDS", histogram)
+    return histogram
+
+
+def test_sync_and_async_filters_record_the_same_metric(memory_catalog):
+    filters = {"category": "羽絨被", "size": "6*7"}
+
+    sync_results = search_data.filter_products(**filters)
+    async_results = asyncio.run(search_data.afilter_products(**filters))
+
+    assert sync_results == async_results
+    assert len(memory_catalog.observations) == 2
+    sync_labels, async_labels = (labels for labels, _ in memory_catalog.observations)
+    assert sync_labels == async_labels
+    assert sync_labels["stage"] == "filter"
@@ -0,0 +1,171 @@
+"""
+Semantic answer cache (agent/cache/semantic_cache.py) against an in-memory stand-in for redis-stack.
+"""
+import asyncio
+import time
+from array import array
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from agent.cache import semantic_cache
+from agent.cache.semantic_cache import SemanticCache, question_constraints
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+
+class FakeSearch:
+    """KNN 1 over the stored hashes (all entries are the current version here)."""
+
+    def __init__(self, redis):
+        self.redis = redis
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+    async def search(self, query, query_params):
+        vector = np.frombuffer(query_params["vec"], dtype=np.float32)
+        docs = []
+        for key, entry in self.redis.hashes.items():
+            stored = np.frombuffer(entry["embedding"], dtype=np.float32)
+            similarity = float(vector @ stored / (np.linalg.norm(vector) * np.linalg.norm(stored)))
+            docs.append(SimpleNamespace(id=key, question=entry["question"], answer=entry["answer"], distance=str(1 - similarity)))
+        docs.sort(key=lambda doc: float(doc.distance))
+        return SimpleNamespace(docs=docs[:1])
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.ttls = {}
+        self.zset = {}
+        self.counters = {}
+
+    def pipeline(self, transaction=False):
+        return FakePipeline(self)
+
+    def ft(self, name):
+        return FakeSearch(self)
+
+    async def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    async def hset(self, key, mapping):
+        self.hashes[key] = dict(mapping)
+
+    async def expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    async def zadd(self, key, mapping):
+        self.zset.update(mapping)
+
+    async def zcard(self, key):
+        return len(self.zset)
+
+    async def zrange(self, key, start, end):
+        return list(self.zset)
+
+    async def zremrangebyscore(self, key, low, high):
+        for member in [member for member, score in self.zset.items() if score <= high]:
+            del self.zset[member]
+
+    async def hincrby(self, key, field, amount):
+        self.counters[field] = self.counters.get(field, 0) + amount
+
+    async def hgetall(self, key):
+        return dict(self.counters)
+
+
+class SameEmbedding:
+    """Every question embeds to the same vector: worst case for near-duplicate questions."""
+
+    async def aembed_query(self, text):
+        return [1.0, 0.5, 0.25]
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    redis = FakeRedis()
+
+    async def corpus_version():
+        return 3
+
+    monkeypatch.setattr(semantic_cache, "get_async_redis_client", lambda: redis)
+    monkeypatch.setattr(semantic_cache, "aget_corpus_version", corpus_version)
+    monkeypatch.setattr(semantic_cache, "get_embedding_model", lambda: SameEmbedding())
+    return redis
+
+
+def test_question_constraints():
+    assert question_constraints("6*7 的蠶絲被價格") != question_constraints("5*7 的蠶絲被價格")
+    assert question_constraints("6*7 的蠶絲被價格") == question_constraints("６ｘ７ 蠶絲被多少錢")
+    assert question_constraints("3000以下的羽絨被") != question_constraints("3000以上的羽絨被")
+    assert question_constraints("3000到5000元的羽絨被") == question_constraints("5000至3000的羽絨被")
+    assert question_constraints("羽絨被怎麼洗") == question_constraints("羽絨被要怎麼清洗")
+
+
+def test_semantic_hit_requires_the_same_constraints(fake_redis):
+    async def scenario():
+        cache = SemanticCache(threshold=0.95, ttl_seconds=100, max_entries=10)
+        await cache.store("6*7 的蠶絲被價格", "6*7 是 8,800 元")
+        return (
+            await cache.lookup("5*7 的蠶絲被價格"),
+            await cache.lookup("6*7 蠶絲被多少錢"),
+        )
+
+    other_size, same_size = asyncio.run(scenario())
+    assert other_size is None
+    assert same_size == "6*7 是 8,800 元"
+    assert fake_redis.counters["constraint_mismatches"] == 1
+    assert fake_redis.counters["semantic_hits"] == 1
+
+
+def test_hits_refresh_ttl_and_lru(fake_redis):
+    async def scenario():
+        cache = SemanticCache(threshold=0.95, ttl_seconds=100, max_entries=10)
+        await cache.store("羽絨被怎麼洗", "送洗")
+        key = next(iter(fake_redis.hashes))
+        fake_redis.ttls[key] = 1
+        fake_redis.zset[key] = time.time() - 50
+
+        assert await cache.lookup("羽絨被怎麼洗") == "送洗"
+        return key
+
+    key = asyncio.run(scenario())
+    assert fake_redis.ttls[key] == 100
+    assert fake_redis.zset[key] == pytest.approx(time.time(), abs=5)
+
+
+def test_embedding_failure_is_a_miss(fake_redis, monkeypatch):
+    class FailingEmbedding:
+        async def aembed_query(self, text):
+            raise RuntimeError("embedding API down")
+
+    monkeypatch.setattr(semantic_cache, "get_embedding_model", lambda: FailingEmbedding())
+    cache = SemanticCache(threshold=0.95, ttl_seconds=100, max_entries=10)
+    assert asyncio.run(cache.lookup("羽絨被怎麼洗")) is None
+    asyncio.run(cache.store("羽絨被怎麼洗", "送洗"))
+    assert fake_redis.hashes == {}
+
+
+def test_embedding_bytes_are_float32(fake_redis):
+    asyncio.run(SemanticCache(ttl_seconds=100).store("羽絨被怎麼洗", "送洗"))
+    entry = next(iter(fake_redis.hashes.values()))
+    assert array("f", entry["embedding"]).tolist() == [1.0, 0.5, 0.25]
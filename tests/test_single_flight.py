@@ -0,0 +1,216 @@
+"""
+Single-flight coalescing (agent/cache/single_flight.py): shared results, shared streams and key cleanup.
+"""
+import asyncio
+
+import pytest
+
+from agent.cache.single_flight import SingleFlight
+
+
+async def _settle():
+    """Let queued tasks and done callbacks run."""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_followers_share_the_leader_result():
+    async def scenario():
+        flights = SingleFlight("test")
+        release = asyncio.Event()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await release.wait()
+            return "answer"
+
+        callers = [asyncio.create_task(flights.do("question", work)) for _ in range(4)]
+        await _settle()
+        assert flights.stats()["in_flight"] == 1
+        release.set()
+        return await asyncio.gather(*callers), calls, flights.stats()
+
+    results, calls, stats = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert [leader for leader, _ in results] == [True, False, False, False]
+    assert all(result == "answer" for _, result in results)
+    assert stats == {"leaders": 1, "followers": 3, "in_flight": 0, "coalesced_rate": 0.75}
+
+
+def test_different_keys_do_not_coalesce():
+    async def scenario():
+        flights = SingleFlight("test")
+
+        async def work(value):
+            await asyncio.sleep(0)
+            return value
+
+        return await asyncio.gather(flights.do("a", lambda: work("a")), flights.do("b", lambda: work("b")))
+
+    assert asyncio.run(scenario()) == [(True, "a"), (True, "b")]
+
+
+def test_leader_exception_reaches_followers():
+    async def scenario():
+        flights = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            raise ValueError("llm failed")
+
+        callers = [asyncio.create_task(flights.do("question", work)) for _ in range(3)]
+        await _settle()
+        release.set()
+        return await asyncio.gather(*callers, return_exceptions=True), flights
+
+    results, flights = asyncio.run(scenario())
+    assert all(isinstance(result, ValueError) and str(result) == "llm failed" for result in results)
+    assert flights.stats()["in_flight"] == 0
+
+
+def test_key_is_forgotten_after_completion():
+    async def scenario():
+        flights = SingleFlight("test")
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return len(calls)
+
+        first = await flights.do("question", work)
+        await _settle()
+        second = await flights.do("question", work)
+        return first, second, flights.stats()
+
+    first, second, stats = asyncio.run(scenario())
+    # Nothing is cached: the second call starts fresh work
+    assert first == (True, 1)
+    assert second == (True, 2)
+    assert stats["in_flight"] == 0
+
+
+def test_cancelled_caller_does_not_cancel_shared_work():
+    async def scenario():
+        flights = SingleFlight("test")
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "answer"
+
+        leader = asyncio.create_task(flights.do("question", work))
+        follower = asyncio.create_task(flights.do("question", work))
+        await _settle()
+        leader.cancel()
+        await _settle()
+        release.set()
+        result = await follower
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        await _settle()
+        return result, flights.stats()
+
+    result, stats = asyncio.run(scenario())
+    assert result == (False, "answer")
+    assert stats["in_flight"] == 0
+
+
+def test_key_is_forgotten_after_cancellation():
+    async def scenario():
+        flights = SingleFlight("test")
+
+        async def work():
+            await asyncio.Event().wait()
+
+        caller = asyncio.create_task(flights.do("question", work))
+        await _settle()
+        flights._flights["question"].cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        await _settle()
+        return flights.stats()
+
+    assert asyncio.run(scenario())["in_flight"] == 0
+
+
+async def _tokens(tokens, step: asyncio.Event):
+    """Yield one token per step.set()."""
+    for token in tokens:
+        await step.wait()
+        step.clear()
+        yield token
+
+
+async def _drain(events):
+    return [event async for event in events]
+
+
+def test_late_joiner_gets_the_full_token_sequence():
+    async def scenario():
+        flights = SingleFlight("test")
+        step = asyncio.Event()
+        tokens = ["蠶", "絲", "被", "可以", "手洗"]
+
+        leader, events = flights.stream("question", lambda: _tokens(tokens, step))
+        first = asyncio.create_task(_drain(events))
+        for _ in range(3):
+            step.set()
+            await _settle()
+
+        joined, late_events = flights.stream("question", lambda: _tokens(["never"], step))
+        late = asyncio.create_task(_drain(late_events))
+        for _ in range(2):
+            step.set()
+            await _settle()
+        return leader, joined, await first, await late, tokens, flights.stats()
+
+    leader, joined, first, late, tokens, stats = asyncio.run(scenario())
+    assert (leader, joined) == (True, False)
+    assert first == tokens
+    assert late == tokens
+    assert stats["in_flight"] == 0
+
+
+def test_stream_error_reaches_every_subscriber_after_the_events_so_far():
+    async def scenario():
+        flights = SingleFlight("test")
+
+        async def failing():
+            yield "partial"
+            await asyncio.sleep(0)
+            raise ValueError("stream failed")
+
+        _, events = flights.stream("question", failing)
+        _, joined_events = flights.stream("question", failing)
+        outcomes = []
+        for subscriber in (events, joined_events):
+            received = []
+            with pytest.raises(ValueError):
+                async for event in subscriber:
+                    received.append(event)
+            outcomes.append(received)
+        await _settle()
+        return outcomes, flights.stats()
+
+    outcomes, stats = asyncio.run(scenario())
+    assert outcomes == [["partial"], ["partial"]]
+    assert stats["in_flight"] == 0
+
+
+def test_cancelled_stream_is_forgotten_and_subscribers_fail():
+    async def scenario():
+        flights = SingleFlight("test")
+        step = asyncio.Event()
+
+        _, events = flights.stream("question", lambda: _tokens(["a", "b"], step))
+        subscriber = asyncio.create_task(_drain(events))
+        await _settle()
+        flights._flights["question"].task.cancel()
+        await _settle()
+        with pytest.raises(RuntimeError):
+            await subscriber
+        return flights.stats()
+
+    assert asyncio.run(scenario())["in_flight"] == 0
@@ -0,0 +1,108 @@
+"""
+SSE token coalescing (api/streaming.py).
+"""
+import asyncio
+import json
+import time
+
+from api.streaming import coalesce_tokens, sse_stream
+
+
+async def _collect(events, **kwargs):
+    """Coalesced events with the time each was yielded, relative to the start."""
+    start = time.monotonic()
+    return [(event, time.monotonic() - start) async for event in coalesce_tokens(events, **kwargs)]
+
+
+def test_stalled_producer_gets_partial_buffer_flushed_by_the_window():
+    async def producer():
+        yield "token", "您"
+        yield "token", "好"
+        yield "token", "，"
+        # The model stalls with "好，" buffered
+        await asyncio.sleep(0.5)
+        yield "token", "請問"
+
+    frames = asyncio.run(_collect(producer(), window_ms=30, max_bytes=1024))
+
+    assert [event for event, _ in frames] == [("token", "您"), ("token", "好，"), ("token", "請問")]
+    flushed_at = frames[1][1]
+    assert flushed_at < 0.25, f"buffered tokens were held for {flushed_at:.3f} s"
+    assert frames[2][1] >= 0.5
+
+
+def test_max_bytes_flushes_without_waiting():
+    async def producer():
+        yield "token", "a"
+        for _ in range(6):
+            yield "token", "羽絨"
+        await asyncio.sleep(0.2)
+
+    frames = asyncio.run(_collect(producer(), window_ms=10_000, max_bytes=12))
+
+    # Each 羽絨 is 6 UTF-8 bytes: flush every second one, immediately
+    assert [event for event, _ in frames] == [("token", "a")] + [("token", "羽絨羽絨")] * 3
+    assert all(at < 0.1 for _, at in frames)
+
+
+def test_non_token_events_flush_and_restart_the_segment():
+    async def producer():
+        yield "token", "查"
+        yield "token", "一下"
+        yield "tool_start", {"tool": "search_product_tool"}
+        yield "tool_end", {"tool": "search_product_tool"}
+        yield "token", "有"
+        yield "token", "三款"
+
+    frames = asyncio.run(_collect(producer(), window_ms=10_000))
+
+    assert [event for event, _ in frames] == [
+        ("token", "查"),
+        ("token", "一下"),
+        ("tool_start", {"tool": "search_product_tool"}),
+        ("tool_end", {"tool": "search_product_tool"}),
+        ("token", "有"),
+        ("token", "三款"),
+    ]
+
+
+def test_closing_the_stream_while_a_read_is_pending_stops_the_producer():
+    stopped = []
+
+    async def producer():
+        try:
+            yield "token", "a"
+            yield "token", "b"
+            await asyncio.sleep(10)
+            yield "token", "never"
+        finally:
+            stopped.append(True)
+
+    async def scenario():
+        coalesced = coalesce_tokens(producer(), window_ms=10)
+        received = [await coalesced.__anext__(), await coalesced.__anext__()]
+        # The client disconnects while the next chunk is being awaited
+        await coalesced.aclose()
+        await asyncio.sleep(0)
+        return received
+
+    assert asyncio.run(scenario()) == [("token", "a"), ("token", "b")]
+    assert stopped == [True]
+
+
+def test_sse_stream_frames_coalesced_tokens():
+    async def producer():
+        yield "token", "您"
+        yield "token", "好"
+        yield "token", "！"
+
+    async def scenario():
+        return [frame async for frame in sse_stream(producer(), "uuid-1", mode="window", window_ms=10_000)]
+
+    frames = asyncio.run(scenario())
+    payloads = [json.loads(frame.split("data: ", 1)[1]) for frame in frames]
+    assert payloads == [
+        {"token": "您", "uuid": "uuid-1"},
+        {"token": "好！", "uuid": "uuid-1"},
+        {"done": True, "uuid": "uuid-1"},
+    ]
@@ -0,0 +1,181 @@
+"""
+History trimming (agent/memory/trim_message.py): minimal state deltas and memoized token counts.
+"""
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from langgraph.graph.message import REMOVE_ALL_MESSAGES, RemoveMessage, add_messages
+
+from agent.memory import trim_message
+from agent.memory.trim_message import message_tokens, trim_delta, trim_history
+
+
+def _conversation(turns: int):
+    """System prompt + `turns` turns of question, tool call, tool result and answer, all with IDs."""
+    messages = [SystemMessage(content="你是寢具客服", id="system")]
+    for turn in range(turns):
+        call_id = f"call_{turn}"
+        messages += [
+            HumanMessage(content=f"第 {turn} 個問題：羽絨被怎麼洗？", id=f"human_{turn}"),
+            AIMessage(content="", tool_calls=[{"name": "lookup", "args": {"query": f"q{turn}"}, "id": call_id}], id=f"call_ai_{turn}"),
+            ToolMessage(content="資料" * 50, tool_call_id=call_id, id=f"tool_{turn}"),
+            AIMessage(content="答" * 40, id=f"answer_{turn}"),
+        ]
+    return messages
+
+
+def _apply(messages, delta):
+    """State after the add_messages reducer applies the middleware's update."""
+    return messages if delta is None else add_messages(messages, delta["messages"])
+
+
+def _ids(messages):
+    return [message.id for message in messages]
+
+
+# ========== MINIMAL DELTA ==============
+def test_under_budget_is_no_update():
+    messages = _conversation(3)
+    assert trim_history(messages, max_tokens=10**6) == messages
+    assert trim_delta(messages, trim_history(messages, max_tokens=10**6)) is None
+
+
+def test_trimming_old_turns_only_removes_them():
+    messages = _conversation(6)
+    budget = sum(message_tokens(message) for message in messages[:1] + messages[-8:])
+    kept = trim_history(messages, max_tokens=budget)
+
+    assert _ids(kept) == ["system"] + _ids(messages[-8:])
+    delta = trim_delta(messages, kept)
+    # Only removals of the evicted messages: no full rewrite, no kept message re-sent
+    assert all(isinstance(update, RemoveMessage) for update in delta["messages"])
+    assert [update.id for update in delta["messages"]] == _ids(messages[1:-8])
+    assert _ids(_apply(messages, delta)) == _ids(kept)
+
+
+def test_each_step_only_removes_newly_evicted_messages():
+    messages = _conversation(4)
+    budget = sum(message_tokens(message) for message in messages[:1] + messages[-8:])
+    messages = _apply(messages, trim_delta(messages, trim_history(messages, max_tokens=budget)))
+
+    # One more turn: the next oldest turn is evicted, nothing else
+    messages = messages + _conversation(5)[-4:]
+    delta = trim_delta(messages, trim_history(messages, max_tokens=budget))
+    assert [update.id for update in delta["messages"]] == ["human_2", "call_ai_2", "tool_2", "answer_2"]
+
+
+def test_current_turn_over_budget_keeps_the_whole_turn():
+    messages = _conversation(3)
+    kept = trim_history(messages, max_tokens=5)
+
+    assert _ids(kept) == _ids(messages[-4:])
+    assert [update.id for update in trim_delta(messages, kept)["messages"]] == _ids(messages[:-4])
+
+
+# ========== FULL REWRITE FALLBACK ==============
+def _is_full_rewrite(delta, kept):
+    first, *rest = delta["messages"]
+    return isinstance(first, RemoveMessage) and first.id == REMOVE_ALL_MESSAGES and rest == kept
+
+
+@pytest.mark.parametrize("reorder", [
+    lambda messages: [messages[0], messages[3], messages[2]],  # swapped
+    lambda messages: messages[1:] + messages[:1],  # system prompt moved to the end
+    lambda messages: list(reversed(messages)),  # same length, different order
+])
+def test_reordered_messages_fall_back_to_full_rewrite(reorder):
+    messages = _conversation(2)
+    kept = reorder(messages)
+
+    delta = trim_delta(messages, kept)
+
+    assert _is_full_rewrite(delta, kept)
+    assert _ids(_apply(messages, delta)) == _ids(kept)
+
+
+def test_new_or_id_less_messages_fall_back_to_full_rewrite():
+    messages = _conversation(2)
+
+    new = messages[:1] + [HumanMessage(content="摘要", id="summary")] + messages[-4:]
+    assert _is_full_rewrite(trim_delta(messages, new), new)
+
+    without_ids = [message.model_copy(update={"id": None}) for message in messages]
+    assert _is_full_rewrite(trim_delta(without_ids, without_ids[-4:]), without_ids[-4:])
+
+
+# ========== MEMOIZED TOKEN COUNTS ==============
+@pytest.fixture
+def counted(monkeypatch):
+    """Records every message that is actually tokenized."""
+    calls = []
+    count = trim_message._count_message_tokens
+
+    def counting(message):
+        calls.append(message.id)
+        return count(message)
+
+    monkeypatch.setattr(trim_message, "_count_message_tokens", counting)
+    return calls
+
+
+def test_counts_are_memoized_per_message(counted):
+    messages = _conversation(3)
+    budget = sum(message_tokens(message) for message in messages[-4:]) + 1
+    assert counted == _ids(messages[-4:])
+
+    counted.clear()
+    trim_history(messages, max_tokens=budget)
+    assert sorted(counted) == sorted(_ids(messages[:-4]))
+
+    counted.clear()
+    trim_history(messages, max_tokens=budget)
+    assert counted == []
+
+    # The next step only tokenizes the messages added since
+    messages = messages + _conversation(4)[-4:]
+    trim_history(messages, max_tokens=budget)
+    assert sorted(counted) == sorted(["human_3", "call_ai_3", "tool_3", "answer_3"])
+
+
+def test_memoized_count_survives_serialization(counted):
+    message = AIMessage(content="答" * 40, id="answer")
+    tokens = message_tokens(message)
+
+    restored = AIMessage.model_validate(message.model_dump())
+    counted.clear()
+    assert message_tokens(restored) == tokens
+    assert counted == []
+
+
+def test_count_is_refreshed_after_content_edit(counted):
+    message = AIMessage(content="短", id="answer")
+    short = message_tokens(message)
+
+    message.content = "很長的回答" * 100
+    assert message_tokens(message) > short
+    assert message_tokens(message) == trim_message._count_message_tokens(message)
+    assert counted.count("answer") == 3  # short, edited, and the direct reference count
+
+
+def test_copy_with_new_content_does_not_reuse_the_count():
+    message = HumanMessage(content="羽絨被", id="human")
+    short = message_tokens(message)
+
+    # model_copy keeps response_metadata (and so the memoized count) from the original
+    edited = message.model_copy(update={"content": "羽絨被和蠶絲被哪個比較保暖，價格差多少？" * 10})
+    assert message_tokens(edited) > short
+    assert message_tokens(message) == short
+
+
+def test_tool_call_edits_refresh_the_count():
+    message = AIMessage(content="", tool_calls=[{"name": "lookup", "args": {"query": "a"}, "id": "call"}], id="ai")
+    short = message_tokens(message)
+
+    message.tool_calls[0]["args"]["query"] = "羽絨被 6*7 價格" * 20
+    assert message_tokens(message) > short
+
+
+def test_counts_from_older_format_are_recomputed(counted):
+    message = HumanMessage(content="羽絨被", id="human")
+    message.response_metadata[trim_message._token_count_key()] = 999
+
+    assert message_tokens(message) == trim_message._count_message_tokens(message) != 999
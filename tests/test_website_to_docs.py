@@ -0,0 +1,111 @@
+"""
+Concurrent FireCrawl crawl (data/qa_data/website_to_docs.py) against the local stub server.
+"""
+import asyncio
+import socket
+import threading
+import time
+
+import httpx
+import pytest
+import uvicorn
+
+from data.qa_data.firecrawl_stub import create_app
+from data.qa_data.website_to_docs import FireCrawlWebsiteToDocs
+
+URLS = {f"page_{i}": f"https://example.com/page/{i}" for i in range(8)}
+
+
+@pytest.fixture
+def stub_server():
+    """Start the FireCrawl stub with the given options; returns (api_url, stats getter)."""
+    servers = []
+
+    def start(**options):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        app = create_app(**options)
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="error"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        deadline = time.monotonic() + 10
+        while not server.started:
+            assert time.monotonic() < deadline, "stub server did not start"
+            time.sleep(0.01)
+        servers.append((server, thread))
+        api_url = f"http://127.0.0.1:{port}"
+        return api_url, lambda: httpx.get(f"{api_url}/stats").json()
+
+    yield start
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+def _crawl(crawler, urls=URLS):
+    async def run():
+        return [result async for result in crawler.astream_docs(urls)]
+
+    start = time.perf_counter()
+    results = asyncio.run(run())
+    return results, time.perf_counter() - start
+
+
+def test_crawl_respects_concurrency_and_rate_limit(stub_server):
+    # A bucket of 2 tokens refilled at 2/s sends at most 4 requests in any 1 s window
+    api_url, stats = stub_server(latency=0.05, max_requests_per_second=5)
+    crawler = FireCrawlWebsiteToDocs(api_url=api_url, concurrency=2, rate_per_second=2, max_retries=0)
+    urls = dict(list(URLS.items())[:6])
+
+    results, elapsed = _crawl(crawler, urls)
+
+    assert sorted(source for source, _, _, _ in results) == sorted(urls)
+    assert all(error is None and docs for _, _, docs, error in results)
+    assert {docs[0].metadata["url"] for _, _, docs, _ in results} == set(urls.values())
+    server_stats = stats()
+    assert server_stats["rate_limited"] == 0
+    assert server_stats["requests"] == len(urls)
+    assert server_stats["peak_in_flight"] <= 2
+    # A burst of 2 then 2 requests per second
+    assert elapsed >= (len(urls) - 2) / 2 * 0.9
+
+
+@pytest.mark.parametrize("failure_status", [500, 502])
+def test_failures_are_retried_by_the_crawler_only_and_reported(stub_server, failure_status):
+    api_url, stats = stub_server(latency=0.0, failure_rate=1.0, failure_status=failure_status)
+    crawler = FireCrawlWebsiteToDocs(api_url=api_url, concurrency=4, rate_per_second=100, max_retries=2, backoff_seconds=0.01)
+    urls = dict(list(URLS.items())[:3])
+
+    results, _ = _crawl(crawler, urls)
+
+    assert sorted(source for source, _, _, _ in results) == sorted(urls)
+    for source, url, docs, error in results:
+        assert docs == []
+        assert error is not None and getattr(error, "status_code", None) == failure_status
+    # max_retries + 1 attempts per url, no extra attempts inside the SDK
+    assert stats()["requests"] == len(urls) * (crawler.max_retries + 1)
+
+
+def test_non_transient_errors_are_not_retried(stub_server):
+    api_url, stats = stub_server(latency=0.0, failure_rate=1.0, failure_status=400)
+    crawler = FireCrawlWebsiteToDocs(api_url=api_url, concurrency=4, rate_per_second=100, max_retries=3, backoff_seconds=0.01)
+
+    results, _ = _crawl(crawler, {"page_0": URLS["page_0"]})
+
+    assert results[0][3] is not None
+    assert stats()["requests"] == 1
+
+
+def test_rate_limited_requests_are_retried_until_they_succeed(stub_server):
+    api_url, stats = stub_server(latency=0.0, max_requests_per_second=2)
+    # Crawler paced faster than the server allows: 429s are retried with backoff
+    crawler = FireCrawlWebsiteToDocs(api_url=api_url, concurrency=4, rate_per_second=50, max_retries=6, backoff_seconds=0.2)
+    urls = dict(list(URLS.items())[:4])
+
+    results, _ = _crawl(crawler, urls)
+
+    assert all(error is None and docs for _, _, docs, error in results)
+    server_stats = stats()
+    assert server_stats["rate_limited"] > 0
+    assert server_stats["requests"] == len(urls) + server_stats["rate_limited"]